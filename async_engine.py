@@ -0,0 +1,106 @@
+import asyncio
+import functools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional
+
+
+class _UploadLane:
+    """アップロード用の同時実行枠。ThreadPoolExecutor.submit と同じ形で呼べる"""
+
+    def __init__(self, engine: "AsyncEngine"):
+        self._engine = engine
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        return self._engine.run(self._engine.call_upload(func, *args, **kwargs))
+
+
+class AsyncEngine:
+    """
+    Sheets / Drive の I/O を1本のイベントループスレッド上の coroutine として実行する。
+    - gspread / googleapiclient はブロッキングなので、HTTP 呼び出しは少数スレッドのプール
+      （max_workers + upload_concurrency）で実行する
+    - 送信・シート確認などは max_concurrency、アップロードは upload_concurrency の別々の枠で制限する
+      （大きなファイルのアップロードが続いても送信の枠は空いている）
+    - 送信のように結果待ちが主な処理は、スレッドを占有せずループ上で待つ
+    Tk など他スレッドからは run() / submit() / uploads.submit() で投入し、concurrent.futures.Future を受け取る。
+    """
+
+    def __init__(self, max_workers: int = 4, max_concurrency: int = 4, upload_concurrency: int = 2):
+        self._max_workers = max(1, int(max_workers))
+        self._max_concurrency = max(1, int(max_concurrency))
+        self._upload_concurrency = max(1, int(upload_concurrency))
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._upload_semaphore: Optional[asyncio.Semaphore] = None
+        self.uploads = _UploadLane(self)
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers + self._upload_concurrency, thread_name_prefix="io"
+            )
+            self._thread = threading.Thread(target=self._run_loop, name="async-engine", daemon=True)
+            self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        loop.set_default_executor(self._executor)
+        self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        self._upload_semaphore = asyncio.Semaphore(self._upload_concurrency)
+        self._loop = loop
+        self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    def run(self, coro: Awaitable) -> Future:
+        """coroutine をループに投入する（どのスレッドからでも呼べる）"""
+        if self._loop is None:
+            self.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def submit(self, func: Callable, *args, **kwargs) -> Future:
+        """
+        ThreadPoolExecutor.submit と同じ形で呼べるようにしたもの。
+        ブロッキング関数は同時実行数の制限付きで I/O プールに、coroutine 関数はループ上で実行する。
+        """
+        if asyncio.iscoroutinefunction(func):
+            return self.run(func(*args, **kwargs))
+        return self.run(self.call(func, *args, **kwargs))
+
+    async def call(self, func: Callable, *args, **kwargs):
+        """ループ上の coroutine から、ブロッキング関数を I/O プールで実行して待つ"""
+        async with self._semaphore:
+            return await self._loop.run_in_executor(
+                None, functools.partial(func, *args, **kwargs)
+            )
+
+    async def call_upload(self, func: Callable, *args, **kwargs):
+        """call() と同じだが、アップロード用の枠で同時実行数を制限する"""
+        async with self._upload_semaphore:
+            return await self._loop.run_in_executor(
+                None, functools.partial(func, *args, **kwargs)
+            )
+
+    def thread_count(self) -> int:
+        """エンジンが使っているスレッド数（ループ＋生成済みの I/O スレッド）"""
+        if self._thread is None:
+            return 0
+        return 1 + len(getattr(self._executor, "_threads", ()))
+
+    def stop(self, timeout: float = 5.0):
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=False)
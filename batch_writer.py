@@ -0,0 +1,95 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Tuple
+
+
+class BatchWriter:
+    """
+    短時間に連続した書き込みをまとめて1回の append にする。
+    - window 秒待つか max_rows 件溜まった時点で flush_func(rows) を呼ぶ
+    - submit() は行ごとの Future を返し、呼び出し側はその行の成否(bool)を受け取れる
+    """
+
+    def __init__(self, flush_func: Callable[[List[list]], bool], window: float = 0.2, max_rows: int = 50):
+        self._flush_func = flush_func
+        self._window = max(0.0, float(window))
+        self._max_rows = max(1, int(max_rows))
+        self._cond = threading.Condition()
+        self._pending: List[Tuple[list, Future]] = []
+        self._thread = None
+
+        self._stats_lock = threading.Lock()
+        self._stats: Dict[str, float] = {
+            "batches": 0,
+            "rows": 0,
+            "failed_batches": 0,
+            "last_batch_size": 0,
+            "max_batch_size": 0,
+            "last_flush_seconds": 0.0,
+            "max_flush_seconds": 0.0,
+            "total_flush_seconds": 0.0,
+        }
+
+    def submit(self, row: list) -> Future:
+        future: Future = Future()
+        with self._cond:
+            self._pending.append((row, future))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+
+                # 最初の1件が来てから window 秒（または max_rows 件）まで待って集める
+                deadline = time.monotonic() + self._window
+                while len(self._pending) < self._max_rows:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+
+                batch = self._pending[: self._max_rows]
+                del self._pending[: self._max_rows]
+
+            self._flush(batch)
+
+    def _flush(self, batch: List[Tuple[list, Future]]):
+        rows = [row for row, _ in batch]
+        started = time.perf_counter()
+        try:
+            ok = bool(self._flush_func(rows))
+        except Exception as e:
+            print(f"Batch flush failed: {e}")
+            ok = False
+        elapsed = time.perf_counter() - started
+
+        with self._stats_lock:
+            s = self._stats
+            s["batches"] += 1
+            s["rows"] += len(rows)
+            if not ok:
+                s["failed_batches"] += 1
+            s["last_batch_size"] = len(rows)
+            s["max_batch_size"] = max(s["max_batch_size"], len(rows))
+            s["last_flush_seconds"] = elapsed
+            s["max_flush_seconds"] = max(s["max_flush_seconds"], elapsed)
+            s["total_flush_seconds"] += elapsed
+
+        for _, future in batch:
+            future.set_result(ok)
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            s = dict(self._stats)
+        s["avg_batch_size"] = s["rows"] / s["batches"] if s["batches"] else 0.0
+        s["avg_flush_seconds"] = (
+            s["total_flush_seconds"] / s["batches"] if s["batches"] else 0.0
+        )
+        return s
@@ -0,0 +1,159 @@
+"""
+現行のスレッドモデルと AsyncEngine を、Google API の代わりに sleep で遅延を再現して比較する。
+
+    python benchmarks/bench_async_engine.py [--submits 300] [--uploads 12] [--latency 0.08]
+
+- 現行: 送信ごとにスレッドを立てて BatchWriter の結果を待つ / アップロードは専用プール
+- shared: エンジンで、アップロードも送信と同じ枠（engine.submit）で実行する（以前の構成）
+- エンジン: 送信はイベントループ上で結果を待つ / アップロードは専用の枠（engine.uploads）で同時数を制限
+スループット（行/秒・アップロード/秒）、実行中の最大スレッド数と、
+送信（UI と同じく submit で投入）が実行され始めるまでの待ち時間の p99 を出力する。
+"""
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_engine import AsyncEngine  # noqa: E402
+from batch_writer import BatchWriter  # noqa: E402
+
+
+class ThreadSampler:
+    """実行中のスレッド数を一定間隔で記録し、最大値を返す"""
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            # サンプラー自身は数えない
+            self.peak = max(self.peak, threading.active_count() - 1)
+            time.sleep(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def fake_append(latency):
+    def flush(rows):
+        time.sleep(latency)
+        return True
+
+    return flush
+
+
+def fake_upload(latency):
+    time.sleep(latency)
+    return "https://drive.google.com/file/d/fake/view"
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def run_threads(args):
+    writer = BatchWriter(fake_append(args.latency), window=0.2, max_rows=50)
+    pool = ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="upload")
+    done = []
+
+    dispatch = []
+
+    def on_submit(text, queued_at):
+        dispatch.append(time.perf_counter() - queued_at)
+        done.append(writer.submit(["ts", text]).result())
+
+    with ThreadSampler() as sampler:
+        started = time.perf_counter()
+        uploads = [pool.submit(fake_upload, args.upload_latency) for _ in range(args.uploads)]
+        threads = []
+        for i in range(args.submits):
+            t = threading.Thread(target=on_submit, args=(f"row {i}", time.perf_counter()), daemon=True)
+            t.start()
+            threads.append(t)
+            time.sleep(args.interval)
+        for t in threads:
+            t.join()
+        wait(uploads)
+        elapsed = time.perf_counter() - started
+    pool.shutdown()
+    return elapsed, sampler.peak, sum(done), dispatch
+
+
+def run_engine(args, shared=False):
+    writer = BatchWriter(fake_append(args.latency), window=0.2, max_rows=50)
+    if shared:
+        engine = AsyncEngine(max_workers=args.concurrency + 1, max_concurrency=args.concurrency + 1)
+        upload_executor = engine
+    else:
+        engine = AsyncEngine(max_workers=2, max_concurrency=2, upload_concurrency=args.concurrency)
+        upload_executor = engine.uploads
+    engine.start()
+    dispatch = []
+
+    async def append_async(text):
+        return await asyncio.wrap_future(writer.submit(["ts", text]))
+
+    def on_submit(text, queued_at):
+        # main.on_submit と同じく、結果はループ上で待ってすぐ返す
+        dispatch.append(time.perf_counter() - queued_at)
+        return engine.run(append_async(text))
+
+    with ThreadSampler() as sampler:
+        started = time.perf_counter()
+        uploads = [upload_executor.submit(fake_upload, args.upload_latency) for _ in range(args.uploads)]
+        submits = []
+        for i in range(args.submits):
+            submits.append(engine.submit(on_submit, f"row {i}", time.perf_counter()))
+            time.sleep(args.interval)
+        rows = [f.result() for f in submits]
+        wait(rows + uploads)
+        elapsed = time.perf_counter() - started
+    engine.stop()
+    return elapsed, sampler.peak, sum(f.result() for f in rows), dispatch
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--submits", type=int, default=300)
+    parser.add_argument("--interval", type=float, default=0.002, help="送信間隔(秒)")
+    parser.add_argument("--uploads", type=int, default=12)
+    parser.add_argument("--concurrency", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.08, help="append 1回の遅延(秒)")
+    parser.add_argument("--upload-latency", type=float, default=0.15, help="アップロード1件の遅延(秒)")
+    args = parser.parse_args()
+
+    print(f"{'model':8} | {'elapsed [s]':>11} | {'rows/s':>8} | {'uploads/s':>9} | {'peak threads':>12} | "
+          f"{'submit wait p99':>15}")
+    runners = (
+        ("threads", run_threads),
+        ("shared", lambda a: run_engine(a, shared=True)),
+        ("engine", run_engine),
+    )
+    for name, runner in runners:
+        elapsed, peak, ok_rows, dispatch = runner(args)
+        print(
+            f"{name:8} | {elapsed:11.2f} | {ok_rows / elapsed:8.1f} | "
+            f"{args.uploads / elapsed:9.1f} | {peak:12d} | {percentile(dispatch, 99) * 1000:13.1f}ms"
+        )
+
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""
+疑似 Google サーバー（fake_google_server.py）に対して SheetManager をそのまま動かし、
+実際の Google に接続せずに送信・再送・アップロードの性能を計測する。
+
+    python benchmarks/bench_e2e.py [--latency 0.05] [--error-rate 0.02] [--json result.json]
+
+計測項目:
+- submit→row: append_log を呼んでから疑似サーバーに行が届くまでの遅延（p50/p90/p99/max）
+- drain: オフラインキューに溜まった行（--sheets のシートに振り分け）を process_queue で送り切るまでのスループット（行/秒）
+- upload: upload_file_to_drive のスループット（MB/s）
+- rate limit: クォータエラー（429）で待ってから再試行した回数（--quota-per-minute / --rate-limit-rate と組み合わせる）
+設定・トークン・キューは一時ディレクトリに作るので、手元の settings.json やキューには影響しない。
+--json で結果を保存し、変更前後の比較に使う。
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+sys.path.insert(0, HERE)
+
+from fake_google_server import FakeGoogleServer, FakeGoogleState  # noqa: E402
+
+SPREADSHEET_ID = "fake-spreadsheet"
+FOLDER_ID = "fake-folder"
+
+
+def prepare_home(endpoint: str, args) -> str:
+    """一時ディレクトリに settings.json と（期限の長い）偽の token.json を作る"""
+    home = tempfile.mkdtemp(prefix="supanikki-bench-")
+    settings = {
+        "spreadsheet_id": SPREADSHEET_ID,
+        "credentials_file": "credentials.json",
+        "drive_folder_id": FOLDER_ID,
+        "hotkey": "<ctrl>+<alt>+j",
+        "sheet_name": "Sheet1",
+        "api_endpoint": endpoint,
+        "upload_chunk_size_mb": args.chunk_mb,
+        "upload_dedup": False,
+        "prewarm": False,
+        "http_read_timeout": args.read_timeout,
+        "sheets_quota_per_minute": args.client_quota,
+        "drive_quota_per_minute": max(args.client_quota, 1000),
+    }
+    with open(os.path.join(home, "settings.json"), "w", encoding="utf-8") as f:
+        json.dump(settings, f, indent=2)
+
+    expiry = datetime.datetime.utcnow() + datetime.timedelta(days=1)
+    token = {
+        "token": "fake-access-token",
+        "refresh_token": "fake-refresh-token",
+        "token_uri": "https://oauth2.googleapis.com/token",
+        "client_id": "fake-client",
+        "client_secret": "fake-secret",
+        "scopes": [
+            "https://www.googleapis.com/auth/spreadsheets",
+            "https://www.googleapis.com/auth/drive",
+        ],
+        "expiry": expiry.strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+    }
+    with open(os.path.join(home, "token.json"), "w", encoding="utf-8") as f:
+        json.dump(token, f)
+    return home
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def bench_submit_latency(sm, state, args) -> dict:
+    """送信ごとにスレッドを立てる（アプリと同じ）形で append_log を呼ぶ"""
+    submitted = {}
+    threads = []
+    started = time.perf_counter()
+    for i in range(args.submits):
+        text = f"bench-submit-{i}"
+        submitted[text] = time.perf_counter()
+        t = threading.Thread(target=sm.append_log, args=(text,), daemon=True)
+        t.start()
+        threads.append(t)
+        time.sleep(args.interval)
+    for t in threads:
+        t.join()
+
+    # 失敗してオフラインキュー経由で届く行も待つ
+    deadline = time.time() + args.wait
+    while time.time() < deadline:
+        with state.lock:
+            arrived = {row[2][1]: row[3] for row in state.row_times if row[2][1] in submitted}
+        if len(arrived) >= len(submitted):
+            break
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+
+    latencies = [(arrived[text] - t0) * 1000 for text, t0 in submitted.items() if text in arrived]
+    return {
+        "rows": len(submitted),
+        "arrived": len(latencies),
+        "p50_ms": percentile(latencies, 50),
+        "p90_ms": percentile(latencies, 90),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": max(latencies) if latencies else float("nan"),
+        "mean_ms": statistics.fmean(latencies) if latencies else float("nan"),
+        "rows_per_s": len(latencies) / elapsed,
+        "batches": sm.batch_writer.stats().get("batches"),
+    }
+
+
+def bench_drain(sm, args) -> dict:
+    # 送信側の SyncWorker と競合しないよう、直接 process_queue を呼ぶ
+    titles = [t.strip() for t in args.sheets.split(",") if t.strip()]
+    for i in range(args.backlog):
+        sm.queue.add(f"bench-backlog-{i}", "2026-01-01 00:00:00", titles[i % len(titles)])
+    started = time.perf_counter()
+    attempts = 0
+    while not sm.queue.is_empty() and attempts < 20:
+        attempts += 1
+        sm.process_queue()
+    elapsed = time.perf_counter() - started
+    sent = args.backlog - sm.queue.size()
+    return {
+        "rows": args.backlog,
+        "sent": sent,
+        "seconds": elapsed,
+        "rows_per_s": sent / elapsed if elapsed else float("nan"),
+        "process_queue_calls": attempts,
+    }
+
+
+def bench_upload(sm, home, args) -> dict:
+    path = os.path.join(home, "bench_upload.bin")
+    with open(path, "wb") as f:
+        f.write(os.urandom(int(args.upload_mb * 1024 * 1024)))
+    size_mb = os.path.getsize(path) / (1024 * 1024)
+    started = time.perf_counter()
+    link = sm.upload_file_to_drive(path)
+    elapsed = time.perf_counter() - started
+    return {
+        "size_mb": size_mb,
+        "chunk_mb": args.chunk_mb,
+        "seconds": elapsed,
+        "mb_per_s": size_mb / elapsed if elapsed else float("nan"),
+        "ok": bool(link),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.05, help="疑似サーバーの1リクエストあたりの遅延(秒)")
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503 を返す確率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="429 を返す確率")
+    parser.add_argument("--quota-per-minute", type=int, default=0)
+    parser.add_argument(
+        "--client-quota", type=float, default=6000,
+        help="SheetManager 側のトークンバケットの Sheets 上限（回/分）。既定はスループット計測を妨げない値",
+    )
+    parser.add_argument("--submits", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.005, help="送信間隔(秒)")
+    parser.add_argument("--backlog", type=int, default=2000)
+    parser.add_argument("--sheets", default="Sheet1,Sheet2,Sheet3", help="疑似スプレッドシートのシート名（カンマ区切り）")
+    parser.add_argument("--upload-mb", type=float, default=32)
+    parser.add_argument("--chunk-mb", type=int, default=8)
+    parser.add_argument("--read-timeout", type=float, default=30)
+    parser.add_argument("--wait", type=float, default=60, help="失敗した行の再送を待つ最大秒数")
+    parser.add_argument("--json", help="結果を保存するファイル")
+    args = parser.parse_args()
+
+    state = FakeGoogleState(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        quota_per_minute=args.quota_per_minute,
+        sheet_titles=[t.strip() for t in args.sheets.split(",") if t.strip()],
+    )
+    with FakeGoogleServer(state) as server:
+        home = prepare_home(server.endpoint, args)
+        os.environ["SUPANIKKI_HOME"] = home
+        from metrics import metrics
+        from sheet_manager import SheetManager
+
+        sm = SheetManager()
+        if not sm.connect_sheet():
+            print("Failed to connect to the fake server")
+            return 1
+
+        results = {
+            "args": vars(args),
+            "submit": bench_submit_latency(sm, state, args),
+            "drain": bench_drain(sm, args),
+            "upload": bench_upload(sm, home, args),
+            "requests": dict(state.requests),
+            "rate_limit": {
+                "counters": {
+                    k: v for k, v in metrics.snapshot()["counters"].items() if k.startswith("ratelimit.")
+                },
+                "buckets": sm.rate_limiter.stats(),
+            },
+        }
+
+    s, d, u = results["submit"], results["drain"], results["upload"]
+    print()
+    print(f"submit→row : {s['arrived']}/{s['rows']} rows in {s['batches']} batches | "
+          f"p50 {s['p50_ms']:.1f} ms | p90 {s['p90_ms']:.1f} ms | p99 {s['p99_ms']:.1f} ms | "
+          f"max {s['max_ms']:.1f} ms")
+    print(f"drain      : {d['sent']}/{d['rows']} rows in {d['seconds']:.2f} s | {d['rows_per_s']:.0f} rows/s")
+    print(f"upload     : {u['size_mb']:.1f} MB in {u['seconds']:.2f} s | {u['mb_per_s']:.1f} MB/s "
+          f"(chunk {u['chunk_mb']} MB)")
+    print(f"requests   : {results['requests']}")
+    print(f"rate limit : {results['rate_limit']['counters'] or 'no throttling'}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"Saved results to {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
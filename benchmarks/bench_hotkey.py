@@ -0,0 +1,187 @@
+"""
+ホットキー判定（hotkey_listener.py）に合成した押下/解放イベントを大量に送り、取りこぼしと遅延を数える。
+
+    python benchmarks/bench_hotkey.py [--presses 5000] [--drop-rate 0.02] [--seed 1]
+    python benchmarks/bench_hotkey.py --real [--presses 500]
+
+合成モード（既定）: ホットキーの合間に通常の入力（Shift を使う大文字を含む）を挟み、
+--drop-rate の確率で修飾キーの解放イベントを落として「押したまま」になる状況を再現する。
+時刻はシミュレーション上の時計で進めるので、実時間はかからない。
+- no-reconcile: 押したままのキーを放置する（以前の GlobalHotKeys と同じ判定）
+- timing      : 押下からの経過時間で押したままのキーを取り除く（Windows 以外の既定）
+- probe       : 実際の修飾キーの状態に合わせる（Windows の GetAsyncKeyState 相当）
+--real: pynput の Controller で実際のキー入力を送り、常駐リスナーが拾えたかを数える（X サーバーか Windows が必要）。
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hotkey_listener import MODIFIERS, HotkeyListener, HotkeyMatcher, parse_hotkey  # noqa: E402
+
+HOTKEY = "ctrl+alt+j"
+LETTERS = "abcdefghiklmnopqrstuvwxyz"
+
+
+def percentile(values, p):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+class Keyboard:
+    """実際に押されているキー（probe モードで参照する）と、シミュレーション上の時計"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.held = set()
+
+    def clock(self):
+        return self.now
+
+    def probe(self):
+        return {k for k in self.held if k in MODIFIERS}
+
+
+def run_simulated(mode, args):
+    rng = random.Random(args.seed)
+    kb = Keyboard()
+    listener = HotkeyListener()
+    if mode == "no-reconcile":
+        listener.matcher = HotkeyMatcher(
+            stale_key_seconds=float("inf"), stale_modifier_seconds=float("inf"), clock=kb.clock
+        )
+    elif mode == "timing":
+        listener.matcher = HotkeyMatcher(clock=kb.clock)
+    else:
+        listener.matcher = HotkeyMatcher(modifier_probe=kb.probe, clock=kb.clock)
+
+    fired = []
+    done = threading.Event()
+    pending = {}
+
+    def on_hotkey():
+        fired.append(time.perf_counter() - pending.pop("t0", time.perf_counter()))
+        done.set()
+
+    listener.set_bindings({HOTKEY: on_hotkey})
+    combo = parse_hotkey(HOTKEY)
+
+    def press(key):
+        kb.held.add(key)
+        listener.on_key(key, True)
+        kb.now += 0.01
+
+    def release(key, droppable=False):
+        kb.held.discard(key)
+        if droppable and rng.random() < args.drop_rate:
+            kb.now += 0.01
+            return  # 解放イベントを取りこぼした
+        listener.on_key(key, False)
+        kb.now += 0.01
+
+    misses = 0
+    for _ in range(args.presses):
+        # 通常の入力（Shift を使う大文字を含む）
+        for _ in range(rng.randint(0, 12)):
+            ch = rng.choice(LETTERS)
+            if rng.random() < 0.2:
+                press("shift")
+                press(ch)
+                release(ch)
+                release("shift", droppable=True)
+            else:
+                press(ch)
+                release(ch)
+            kb.now += rng.uniform(0.05, 0.3)
+        kb.now += rng.uniform(0.3, 8.0)
+
+        # ホットキー
+        done.clear()
+        press("ctrl")
+        press("alt")
+        pending["t0"] = time.perf_counter()
+        press("j")
+        # 押されているキーが組み合わせと一致しなければコールバックは来ないので、待たずに取りこぼしとする
+        if listener.matcher.pressed != combo or not done.wait(1.0):
+            misses += 1
+            pending.pop("t0", None)
+        release("j")
+        release("alt", droppable=True)
+        release("ctrl", droppable=True)
+        kb.now += rng.uniform(0.3, 3.0)
+
+    listener.stop()
+    return misses, fired, listener.matcher.reconciled
+
+
+def run_real(args):
+    from pynput.keyboard import Controller, Key
+
+    listener = HotkeyListener()
+    done = threading.Event()
+    pending = {}
+    fired = []
+
+    def on_hotkey():
+        fired.append(time.perf_counter() - pending.pop("t0", time.perf_counter()))
+        done.set()
+
+    listener.set_bindings({HOTKEY: on_hotkey})
+    listener.start()
+    time.sleep(0.5)
+    controller = Controller()
+    misses = 0
+    for _ in range(args.presses):
+        done.clear()
+        with controller.pressed(Key.ctrl, Key.alt):
+            pending["t0"] = time.perf_counter()
+            controller.press("j")
+            controller.release("j")
+        if not done.wait(1.0):
+            misses += 1
+            pending.pop("t0", None)
+        time.sleep(args.pause)
+    listener.stop()
+    return misses, fired, listener.matcher.reconciled
+
+
+def report(name, presses, misses, fired, reconciled):
+    latencies = [t * 1000 for t in fired]
+    print(
+        f"{name:12} | {presses:7d} | {misses:6d} | {reconciled:10d} | "
+        f"{percentile(latencies, 50):8.3f}ms | {percentile(latencies, 99):8.3f}ms | "
+        f"{(max(latencies) if latencies else float('nan')):8.3f}ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--presses", type=int, default=5000)
+    parser.add_argument("--drop-rate", type=float, default=0.02, help="修飾キーの解放イベントを落とす確率")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--real", action="store_true", help="pynput で実際のキー入力を送る")
+    parser.add_argument("--pause", type=float, default=0.02, help="--real での押下間隔(秒)")
+    args = parser.parse_args()
+
+    print(f"{'mode':12} | {'presses':>7} | {'misses':>6} | {'reconciled':>10} | "
+          f"{'p50':>10} | {'p99':>10} | {'max':>10}")
+    if args.real:
+        report("real", args.presses, *run_real(args))
+        return
+    for mode in ("no-reconcile", "timing", "probe"):
+        misses, fired, reconciled = run_simulated(mode, args)
+        report(mode, args.presses, misses, fired, reconciled)
+    if fired:
+        print(f"dispatch latency mean: {statistics.fmean(fired) * 1000:.3f} ms (last mode)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+入力欄の高さ計算を、以前の方式（全文を取得して改行を数える）と InputLayout で比較する。
+X サーバーが無い環境では Xvfb を起動して計測する（customtkinter / tkinterdnd2 が必要）。
+
+    python benchmarks/bench_layout.py [--lines 10000] [--keystrokes 300]
+
+- paste   : --lines 行のテキストを一度に貼り付けて、高さが反映されるまで
+- typing  : 貼り付けた後の末尾に1文字ずつ --keystrokes 回入力したときの、1打鍵あたりの処理時間
+- wrapped : 改行の無い長い1行（折り返しで複数行になる）を入力したときの行数と処理時間
+geometry の呼び出し回数も出力する（InputLayout は行数が変わらなければ呼ばない）。
+"""
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+
+class LegacyLayout:
+    """以前の InputWindow._adjust_height と同じ計算（比較用）"""
+
+    def __init__(self, window):
+        self.window = window
+        self.geometry_updates = 0
+        self.lines = 1
+
+    def request(self):
+        w = self.window
+        content = w.entry.get("0.0", "end-1c")
+        line_count = max(1, content.count("\n") + 1)
+        target = w._min_height + (line_count - 1) * 30
+        target = max(w._min_height, min(w._max_height, target))
+        if int(w.entry.cget("height")) != int(target):
+            w.entry.configure(height=target)
+        history_height = 0
+        if w.history_frame.grid_info():
+            text = w.history_label.cget("text")
+            if text:
+                history_height = (text.count("\n") + 1) * 30 + 20
+        height = max(w.height, min(600, int(target) + 40 + history_height))
+        w.root.geometry(f"{w.width}x{height}+{w.root.winfo_x()}+{w.root.winfo_y()}")
+        self.geometry_updates += 1
+        self.lines = line_count
+
+
+def ensure_display():
+    """DISPLAY が無ければ Xvfb を起動する。起動したプロセスを返す"""
+    if os.environ.get("DISPLAY"):
+        return None
+    if not shutil.which("Xvfb"):
+        sys.exit("DISPLAY is not set and Xvfb was not found. Install Xvfb or run under an X server.")
+    display = ":98"
+    proc = subprocess.Popen(
+        ["Xvfb", display, "-screen", "0", "1920x1080x24", "-nolisten", "tcp"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    os.environ["DISPLAY"] = display
+    time.sleep(1.0)
+    return proc
+
+
+def settle(root):
+    """予約された after / idle を処理し終えるまで回す"""
+    root.update()
+    time.sleep(0.02)
+    root.update()
+
+
+def run(window, layout, args):
+    root = window.root
+    text = getattr(window.entry, "_textbox", window.entry)
+    # 計測中は InputWindow 自身の <<Modified>> による再計算を止め、比較対象だけを呼ぶ
+    window._adjust_height = lambda: None
+    result = {}
+
+    window.entry.delete("1.0", "end")
+    settle(root)
+    updates = layout.geometry_updates
+    pasted = "\n".join(f"line {i} " + "x" * 40 for i in range(args.lines))
+    started = time.perf_counter()
+    text.insert("end", pasted)
+    layout.request()
+    settle(root)
+    result["paste_ms"] = (time.perf_counter() - started) * 1000
+
+    samples = []
+    for _ in range(args.keystrokes):
+        started = time.perf_counter()
+        text.insert("end", "a")
+        layout.request()
+        root.update_idletasks()
+        samples.append((time.perf_counter() - started) * 1000)
+    settle(root)
+    result["typing_p50_ms"] = statistics.median(samples)
+    result["typing_max_ms"] = max(samples)
+    result["geometry_updates"] = layout.geometry_updates - updates
+
+    window.entry.delete("1.0", "end")
+    settle(root)
+    started = time.perf_counter()
+    text.insert("end", "折り返しの確認 " * 60)
+    layout.request()
+    settle(root)
+    result["wrapped_ms"] = (time.perf_counter() - started) * 1000
+    result["wrapped_lines"] = layout.lines
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=10000)
+    parser.add_argument("--keystrokes", type=int, default=300)
+    args = parser.parse_args()
+
+    xvfb = ensure_display()
+    try:
+        from ui import InputWindow
+
+        window = InputWindow(submit_callback=lambda text: None)
+        window.root.deiconify()
+        window.is_visible = True
+        settle(window.root)
+
+        print(f"{'layout':8} | {'paste':>9} | {'typing p50':>10} | {'typing max':>10} | "
+              f"{'geometry':>8} | {'wrapped':>9} | {'wrapped lines':>13}")
+        for name, layout in (("legacy", LegacyLayout(window)), ("layout", window._layout)):
+            r = run(window, layout, args)
+            print(
+                f"{name:8} | {r['paste_ms']:7.1f}ms | {r['typing_p50_ms']:8.2f}ms | "
+                f"{r['typing_max_ms']:8.2f}ms | {r['geometry_updates']:8d} | "
+                f"{r['wrapped_ms']:7.1f}ms | {r['wrapped_lines']:13d}"
+            )
+        window.root.destroy()
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+
+if __name__ == "__main__":
+    main()
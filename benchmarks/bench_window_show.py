@@ -0,0 +1,171 @@
+"""
+ホットキー押下 → ウィンドウ表示 → 入力欄フォーカスまでの時間を、通常モードと instant_show で比較する。
+X サーバーが無い環境では Xvfb を起動して計測する（customtkinter / tkinterdnd2 が必要）。
+
+    python benchmarks/bench_window_show.py [--iterations 50] [--busy 0]
+
+- hotkey→mapped: 別スレッドから thread_safe_toggle() を呼んでから、ウィンドウが画面内で表示状態になるまで
+- hotkey→focus : 同じく入力欄が FocusIn を受け取るまで
+--busy N を指定すると、N 本のスレッドで CPU を使い続けて負荷の高い状態を再現する。
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+
+class FakeHistory:
+    def __init__(self):
+        self.items = [f"benchmark entry {i}" for i in range(3)]
+
+    def get_latest(self, count=5):
+        return self.items[:count]
+
+    def suggest(self, query, limit=5):
+        return []
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def burn(stop):
+    while not stop.is_set():
+        sum(i * i for i in range(10000))
+
+
+def run_child(args):
+    """1つのモードを計測して JSON を標準出力に書く（Tk のルートは1プロセス1つにする）"""
+    from ui import InputWindow
+
+    window = InputWindow(
+        submit_callback=lambda text: None,
+        history_manager=FakeHistory(),
+        sheet_name_provider=lambda: "Sheet1",
+        instant_show=args.mode == "instant",
+    )
+    root = window.root
+    textbox = getattr(window.entry, "_textbox", window.entry)
+
+    state = {"t0": None, "mapped": None, "focus": None}
+    done = threading.Event()
+
+    def on_visible(event=None):
+        if state["t0"] is None or state["mapped"] is not None:
+            return
+        if root.winfo_viewable() and root.winfo_x() > -1000:
+            state["mapped"] = time.perf_counter()
+            if state["focus"] is not None:
+                done.set()
+
+    def on_focus(event=None):
+        if state["t0"] is None or state["focus"] is not None:
+            return
+        state["focus"] = time.perf_counter()
+        if state["mapped"] is not None:
+            done.set()
+
+    root.bind("<Map>", on_visible, add="+")
+    root.bind("<Configure>", on_visible, add="+")
+    textbox.bind("<FocusIn>", on_focus, add="+")
+
+    stop = threading.Event()
+    for _ in range(args.busy):
+        threading.Thread(target=burn, args=(stop,), daemon=True).start()
+
+    results = {"mapped_ms": [], "focus_ms": []}
+
+    def driver():
+        # 起動直後の描画（instant_show の待機準備を含む）を待つ
+        time.sleep(1.0)
+        for _ in range(args.iterations):
+            state.update(t0=time.perf_counter(), mapped=None, focus=None)
+            done.clear()
+            # main.toggle_window と同じく、ホットキーのスレッドから Tk に依頼する
+            window.thread_safe_toggle()
+            if done.wait(5.0):
+                results["mapped_ms"].append((state["mapped"] - state["t0"]) * 1000)
+                results["focus_ms"].append((state["focus"] - state["t0"]) * 1000)
+            state["t0"] = None
+            window.thread_safe_toggle()
+            time.sleep(args.pause)
+        stop.set()
+        root.after(0, root.quit)
+
+    threading.Thread(target=driver, daemon=True).start()
+    window.start_mainloop()
+    print(json.dumps(results))
+
+
+def ensure_display():
+    """DISPLAY が無ければ Xvfb を起動する。起動したプロセスを返す"""
+    if os.environ.get("DISPLAY"):
+        return None
+    if not shutil.which("Xvfb"):
+        sys.exit("DISPLAY is not set and Xvfb was not found. Install Xvfb or run under an X server.")
+    display = ":97"
+    proc = subprocess.Popen(
+        ["Xvfb", display, "-screen", "0", "1920x1080x24", "-nolisten", "tcp"],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    os.environ["DISPLAY"] = display
+    time.sleep(1.0)
+    return proc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--pause", type=float, default=0.3, help="非表示にしてから次に表示するまでの秒数")
+    parser.add_argument("--busy", type=int, default=0, help="CPU を使い続けるスレッド数")
+    parser.add_argument("--mode", choices=["normal", "instant"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_child(args)
+        return
+
+    xvfb = ensure_display()
+    try:
+        print(f"{'mode':8} | {'n':>3} | {'mapped p50':>10} | {'mapped p90':>10} | {'focus p50':>9} | {'focus p90':>9} | {'focus max':>9}")
+        for mode in ("normal", "instant"):
+            out = subprocess.run(
+                [
+                    sys.executable, os.path.abspath(__file__),
+                    "--mode", mode,
+                    "--iterations", str(args.iterations),
+                    "--pause", str(args.pause),
+                    "--busy", str(args.busy),
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+            )
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            mapped, focus = result["mapped_ms"], result["focus_ms"]
+            if not mapped:
+                print(f"{mode:8} | no samples (window did not become visible)")
+                continue
+            print(
+                f"{mode:8} | {len(mapped):3d} | {statistics.median(mapped):8.1f}ms | "
+                f"{percentile(mapped, 90):8.1f}ms | {statistics.median(focus):7.1f}ms | "
+                f"{percentile(focus, 90):7.1f}ms | {max(focus):7.1f}ms"
+            )
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+
+if __name__ == "__main__":
+    main()
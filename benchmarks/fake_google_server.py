@@ -0,0 +1,434 @@
+"""
+Google Sheets / Drive API の代わりに使うローカルの疑似サーバー（計測用）。
+
+    python benchmarks/fake_google_server.py --port 8765 --latency 0.05 --error-rate 0.02
+
+settings.json に "api_endpoint": "http://127.0.0.1:8765" を設定すると、アプリの通信がこのサーバーへ向く。
+対応しているエンドポイント:
+- Sheets: spreadsheets/{id} の取得、values/{range} の取得、values/{range}:append、:batchUpdate の appendCells
+- Drive: files/{id} の取得、再開可能アップロード（uploadType=resumable）での files.create
+遅延（latency + jitter）、5xx/429/タイムアウトの注入、1分あたりのクォータを設定できる。
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlparse
+
+FOLDER_MIME = "application/vnd.google-apps.folder"
+
+
+class FakeGoogleState:
+    """疑似サーバーの内容（スプレッドシートと Drive のファイル）と、障害注入の設定"""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout_seconds: float = 90.0,
+        quota_per_minute: int = 0,
+        sheet_titles: Optional[List[str]] = None,
+        folder_id: str = "fake-folder",
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.quota_per_minute = quota_per_minute
+        self.lock = threading.Lock()
+        self.sheet_titles = list(sheet_titles or ["Sheet1"])
+        # spreadsheet_id → {title: [[row], ...]}
+        self.spreadsheets: Dict[str, Dict[str, List[list]]] = {}
+        # (spreadsheet_id, title, row) の受信時刻（perf_counter）。送信→反映の遅延計測用
+        self.row_times: List[tuple] = []
+        self.files: Dict[str, dict] = {
+            folder_id: {"id": folder_id, "name": "fake folder", "mimeType": FOLDER_MIME, "trashed": False}
+        }
+        self.uploads: Dict[str, dict] = {}
+        self.requests: Dict[str, int] = {}
+        self._quota_window_start = time.monotonic()
+        self._quota_used = 0
+
+    def sheets(self, spreadsheet_id: str) -> Dict[str, List[list]]:
+        return self.spreadsheets.setdefault(
+            spreadsheet_id, {title: [] for title in self.sheet_titles}
+        )
+
+    def count(self, kind: str):
+        with self.lock:
+            self.requests[kind] = self.requests.get(kind, 0) + 1
+
+    def take_quota(self) -> bool:
+        """1分あたりのリクエスト数の上限を超えたら False"""
+        if not self.quota_per_minute:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            if now - self._quota_window_start >= 60:
+                self._quota_window_start = now
+                self._quota_used = 0
+            if self._quota_used >= self.quota_per_minute:
+                return False
+            self._quota_used += 1
+            return True
+
+    def quota_reset_in(self) -> float:
+        with self.lock:
+            return max(0.0, 60 - (time.monotonic() - self._quota_window_start))
+
+
+class FakeGoogleHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeGoogle/1.0"
+
+    # ---- 共通 ----
+
+    @property
+    def state(self) -> FakeGoogleState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        pass
+
+    def _body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status: int, message: str, reason: str, headers: Optional[dict] = None):
+        status_text = {429: "RESOURCE_EXHAUSTED", 404: "NOT_FOUND", 400: "INVALID_ARGUMENT"}.get(
+            status, "UNAVAILABLE"
+        )
+        self._send_json(
+            status,
+            {
+                "error": {
+                    "code": status,
+                    "message": message,
+                    "status": status_text,
+                    "errors": [{"message": message, "reason": reason}],
+                }
+            },
+            headers,
+        )
+
+    def _inject(self) -> bool:
+        """遅延と障害を注入する。応答を返し終えた（以降の処理不要）なら True"""
+        state = self.state
+        delay = state.latency + (random.uniform(0, state.jitter) if state.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+
+        roll = random.random()
+        if roll < state.timeout_rate:
+            # 応答せずに待たせてから切断する（クライアントの読み込みタイムアウト用）
+            time.sleep(state.timeout_seconds)
+            self.close_connection = True
+            return True
+        roll -= state.timeout_rate
+        if roll < state.error_rate:
+            self._send_error(503, "Injected backend error", "backendError")
+            return True
+        roll -= state.error_rate
+        if roll < state.rate_limit_rate or not state.take_quota():
+            self._send_error(
+                429,
+                "Quota exceeded for quota metric 'Write requests' (injected)",
+                "rateLimitExceeded",
+                {"Retry-After": str(max(1, int(state.quota_reset_in()))) if state.quota_per_minute else "1"},
+            )
+            return True
+        return False
+
+    def _route(self, method: str):
+        parsed = urlparse(self.path)
+        path = unquote(parsed.path)
+        query = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        body = self._body()
+        if self._inject():
+            return
+
+        routes = [
+            (r"^/v4/spreadsheets/([^/:]+):batchUpdate$", "POST", self._sheets_batch_update),
+            (r"^/v4/spreadsheets/([^/]+)/values/(.+):append$", "POST", self._sheets_append),
+            (r"^/v4/spreadsheets/([^/:]+)/values/(.+)$", "GET", self._sheets_values_get),
+            (r"^/v4/spreadsheets/([^/:]+)$", "GET", self._sheets_get),
+            (r"^/upload/drive/v3/files$", "POST", self._drive_upload_start),
+            (r"^/upload/drive/v3/files$", "PUT", self._drive_upload_chunk),
+            (r"^/drive/v3/files/([^/]+)$", "GET", self._drive_get),
+        ]
+        for pattern, route_method, handler in routes:
+            match = re.match(pattern, path)
+            if match and route_method == method:
+                self.state.count(handler.__name__.lstrip("_"))
+                return handler(*match.groups(), query=query, body=body)
+        self._send_error(404, f"No fake route for {method} {path}", "notFound")
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PUT(self):
+        self._route("PUT")
+
+    # ---- Sheets ----
+
+    def _sheet_properties(self, spreadsheet_id: str) -> dict:
+        sheets = self.state.sheets(spreadsheet_id)
+        return {
+            "spreadsheetId": spreadsheet_id,
+            "properties": {"title": "Fake spreadsheet", "locale": "ja_JP", "timeZone": "Asia/Tokyo"},
+            "sheets": [
+                {
+                    "properties": {
+                        "sheetId": index,
+                        "title": title,
+                        "index": index,
+                        "sheetType": "GRID",
+                        "gridProperties": {"rowCount": max(1000, len(rows)), "columnCount": 26},
+                    }
+                }
+                for index, (title, rows) in enumerate(sheets.items())
+            ],
+        }
+
+    def _sheets_get(self, spreadsheet_id, query, body):
+        with self.state.lock:
+            payload = self._sheet_properties(spreadsheet_id)
+        self._send_json(200, payload)
+
+    def _sheet_title(self, range_name: str) -> str:
+        title = range_name.split("!")[0]
+        if len(title) >= 2 and title[0] == title[-1] == "'":
+            title = title[1:-1].replace("''", "'")
+        return title
+
+    def _sheets_values_get(self, spreadsheet_id, range_name, query, body):
+        title = self._sheet_title(range_name)
+        with self.state.lock:
+            rows = self.state.sheets(spreadsheet_id).get(title)
+            if rows is None:
+                return self._send_error(400, f"Unable to parse range: {range_name}", "badRequest")
+            values = [list(r) for r in rows]
+        self._send_json(200, {"range": range_name, "majorDimension": "ROWS", "values": values})
+
+    def _sheets_append(self, spreadsheet_id, range_name, query, body):
+        title = self._sheet_title(range_name)
+        values = json.loads(body or b"{}").get("values") or []
+        received = time.perf_counter()
+        with self.state.lock:
+            rows = self.state.sheets(spreadsheet_id).get(title)
+            if rows is None:
+                return self._send_error(400, f"Unable to parse range: {range_name}", "badRequest")
+            start = len(rows) + 1
+            rows.extend(values)
+            self.state.row_times.extend((spreadsheet_id, title, tuple(v), received) for v in values)
+        self._send_json(
+            200,
+            {
+                "spreadsheetId": spreadsheet_id,
+                "tableRange": f"'{title}'!A1:B{max(1, start - 1)}",
+                "updates": {
+                    "spreadsheetId": spreadsheet_id,
+                    "updatedRange": f"'{title}'!A{start}:B{start + len(values) - 1}",
+                    "updatedRows": len(values),
+                    "updatedColumns": max((len(v) for v in values), default=0),
+                    "updatedCells": sum(len(v) for v in values),
+                },
+            },
+        )
+
+    def _sheets_batch_update(self, spreadsheet_id, query, body):
+        """appendCells だけを扱う。どれか1つでも不正なら何も書き込まない（本物と同じく全体で1回の更新）"""
+        requests = json.loads(body or b"{}").get("requests") or []
+        received = time.perf_counter()
+        with self.state.lock:
+            sheets = self.state.sheets(spreadsheet_id)
+            titles = list(sheets)
+            appends = []
+            for request in requests:
+                append = request.get("appendCells")
+                if append is None:
+                    return self._send_error(400, f"Unsupported request: {list(request)}", "badRequest")
+                sheet_id = append.get("sheetId", 0)
+                if not 0 <= sheet_id < len(titles):
+                    return self._send_error(400, f"No grid with id: {sheet_id}", "badRequest")
+                values = [
+                    [
+                        next(iter((cell.get("userEnteredValue") or {"stringValue": ""}).values()))
+                        for cell in row.get("values") or []
+                    ]
+                    for row in append.get("rows") or []
+                ]
+                appends.append((titles[sheet_id], values))
+            for title, values in appends:
+                sheets[title].extend(values)
+                self.state.row_times.extend((spreadsheet_id, title, tuple(v), received) for v in values)
+        self._send_json(200, {"spreadsheetId": spreadsheet_id, "replies": [{} for _ in requests]})
+
+    # ---- Drive ----
+
+    def _drive_get(self, file_id, query, body):
+        with self.state.lock:
+            meta = self.state.files.get(file_id)
+        if meta is None:
+            return self._send_error(404, f"File not found: {file_id}.", "notFound")
+        self._send_json(200, meta)
+
+    def _drive_upload_start(self, query, body):
+        if query.get("uploadType") != "resumable":
+            return self._send_error(400, "Only resumable uploads are emulated", "badRequest")
+        metadata = json.loads(body or b"{}")
+        for parent in metadata.get("parents") or []:
+            if parent not in self.state.files:
+                return self._send_error(404, f"File not found: {parent}.", "notFound")
+        upload_id = uuid.uuid4().hex
+        size = self.headers.get("X-Upload-Content-Length")
+        with self.state.lock:
+            self.state.uploads[upload_id] = {
+                "metadata": metadata,
+                "size": int(size) if size else None,
+                "data": bytearray(),
+            }
+        host = self.headers.get("Host")
+        location = f"http://{host}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+        self.send_response(200)
+        self.send_header("Location", location)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _drive_upload_chunk(self, query, body):
+        upload_id = query.get("upload_id")
+        with self.state.lock:
+            upload = self.state.uploads.get(upload_id)
+        if upload is None:
+            return self._send_error(404, "Upload session not found", "notFound")
+
+        # Content-Range: "bytes a-b/total" または状態問い合わせの "bytes */total"
+        content_range = self.headers.get("Content-Range", "")
+        match = re.match(r"bytes (\*|(\d+)-(\d+))/(\*|\d+)", content_range)
+        if not match:
+            return self._send_error(400, f"Bad Content-Range: {content_range}", "badRequest")
+        total = None if match.group(4) == "*" else int(match.group(4))
+        with self.state.lock:
+            if total is not None:
+                upload["size"] = total
+            if match.group(1) != "*":
+                start = int(match.group(2))
+                if start != len(upload["data"]):
+                    # 確定済みの位置とずれていたら、クライアントに確定位置を知らせる
+                    return self._send_incomplete(len(upload["data"]))
+                upload["data"].extend(body)
+            received = len(upload["data"])
+            done = upload["size"] is not None and received >= upload["size"]
+            if done:
+                file_id = uuid.uuid4().hex[:28]
+                meta = {
+                    "id": file_id,
+                    "name": upload["metadata"].get("name", "untitled"),
+                    "mimeType": "application/octet-stream",
+                    "parents": upload["metadata"].get("parents", []),
+                    "size": str(received),
+                    "trashed": False,
+                    "webViewLink": f"https://drive.google.com/file/d/{file_id}/view",
+                }
+                self.state.files[file_id] = meta
+                del self.state.uploads[upload_id]
+        if done:
+            return self._send_json(200, {"id": meta["id"], "webViewLink": meta["webViewLink"]})
+        self._send_incomplete(received)
+
+    def _send_incomplete(self, received: int):
+        self.send_response(308)
+        if received:
+            self.send_header("Range", f"bytes=0-{received - 1}")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class FakeGoogleServer:
+    """別スレッドで疑似サーバーを起動する。with 文でも使える"""
+
+    def __init__(self, state: Optional[FakeGoogleState] = None, host: str = "127.0.0.1", port: int = 0):
+        self.state = state or FakeGoogleState()
+        self.httpd = ThreadingHTTPServer((host, port), FakeGoogleHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self._thread = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-google", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="1リクエストあたりの遅延(秒)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延に加える 0〜jitter 秒の揺らぎ")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="503 を返す確率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="429 を返す確率")
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="応答しない確率")
+    parser.add_argument("--quota-per-minute", type=int, default=0, help="1分あたりのリクエスト上限（0 で無制限）")
+    parser.add_argument("--sheets", default="Sheet1", help="カンマ区切りのシート名")
+    args = parser.parse_args()
+
+    state = FakeGoogleState(
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        timeout_rate=args.timeout_rate,
+        quota_per_minute=args.quota_per_minute,
+        sheet_titles=[s.strip() for s in args.sheets.split(",") if s.strip()],
+    )
+    server = FakeGoogleServer(state, args.host, args.port)
+    print(f"Fake Google API server listening on {server.endpoint} (folder id: fake-folder)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
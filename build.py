@@ -77,8 +77,11 @@ def build():
             f.write("   - Supanikki.exe (実行ファイル)\n")
             f.write("   - credentials.json (Google API認証情報)\n")
             f.write("   - settings.json (アプリケーション設定)\n")
-            f.write("   - (自動生成) local_history.json: 直近の履歴データ\n")
-            f.write("   - (自動生成) offline_queue.json: オフライン時の未送信データ\n\n")
+            f.write("   - (自動生成) local_history.db: 送信履歴（全件・全文検索用）\n")
+            f.write("   - (自動生成) offline_queue.journal: オフライン時の未送信データ\n")
+            f.write("   - (自動生成) upload_sessions.json: 中断したアップロードの再開情報\n")
+            f.write("   - (自動生成) upload_index.json: アップロード済みファイルの内容ハッシュとリンク\n")
+            f.write("   - (自動生成) metrics.jsonl: 所要時間などの計測値\n\n")
             f.write("2. settings.jsonの設定項目:\n")
             f.write("   - spreadsheet_id: Google スプレッドシートID\n")
             f.write(
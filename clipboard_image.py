@@ -0,0 +1,66 @@
+import io
+from datetime import datetime
+from typing import Tuple
+
+# 設定値 → (Pillow のフォーマット名, MIMEタイプ, 拡張子)
+FORMATS = {
+    "png": ("PNG", "image/png", "png"),
+    "webp": ("WEBP", "image/webp", "webp"),
+    "jpeg": ("JPEG", "image/jpeg", "jpg"),
+    "jpg": ("JPEG", "image/jpeg", "jpg"),
+}
+
+
+def resolve_format(name: str) -> str:
+    """未知の形式や、WebP 非対応の Pillow では png にフォールバックする"""
+    fmt = (name or "png").strip().lower()
+    if fmt not in FORMATS:
+        print(f"Unknown clipboard_image_format '{name}'. Using png.")
+        return "png"
+    if fmt == "webp":
+        from PIL import features
+
+        if not features.check("webp"):
+            print("Pillow is built without WebP support. Using png.")
+            return "png"
+    return fmt
+
+
+def clipboard_file_name(fmt: str) -> str:
+    ext = FORMATS[resolve_format(fmt)][2]
+    return f"clipboard_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{ext}"
+
+
+def encode_image(img, fmt: str = "png", quality: int = 85, max_dimension: int = 0) -> Tuple[bytes, str]:
+    """
+    貼り付け画像をメモリ上でエンコードし、(データ, MIMEタイプ) を返す。
+    時間がかかるので Tk のスレッドではなくアップロード用スレッドで呼ぶ。
+    - max_dimension > 0 なら長辺がその大きさになるよう縮小する
+    - quality は WebP / JPEG にだけ使う（PNG は可逆のまま）
+    """
+    from PIL import Image
+
+    pil_format, mimetype, _ = FORMATS[resolve_format(fmt)]
+
+    if max_dimension and max(img.size) > max_dimension:
+        img = img.copy()
+        img.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+
+    options = {}
+    if pil_format == "PNG":
+        options["optimize"] = False
+    else:
+        options["quality"] = max(1, min(100, int(quality)))
+        if pil_format == "WEBP":
+            options["method"] = 4
+
+    if pil_format == "JPEG" and img.mode != "RGB":
+        # JPEG は透過を持てないので白背景に合成する
+        rgba = img.convert("RGBA")
+        background = Image.new("RGB", rgba.size, (255, 255, 255))
+        background.paste(rgba, mask=rgba.split()[3])
+        img = background
+
+    buf = io.BytesIO()
+    img.save(buf, pil_format, **options)
+    return buf.getvalue(), mimetype
@@ -1,7 +1,8 @@
-import json
 import os
 import sys
 
+from settings_store import BOOL, NUMBER, OPTIONAL_STR, STR, SettingsStore
+
 # Determine if we are running in a frozen bundle (PyInstaller) or standard script
 if getattr(sys, "frozen", False):
     # When PyInstaller builds a one-file bundle the runtime executable is unpacked into a temp directory,
@@ -13,59 +14,171 @@ else:
     # If script, the script dir is here
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# 設定・トークン・キュー等を別ディレクトリで扱う場合（ベンチマークなど）
+if os.environ.get("SUPANIKKI_HOME"):
+    BASE_DIR = os.path.abspath(os.environ["SUPANIKKI_HOME"])
+
 # 外部設定ファイルのパス
 SETTINGS_FILE = os.path.join(BASE_DIR, "settings.json")
 
+# 設定項目の型（値が合わない項目は警告して既定値を使う）と、無いと起動できない項目
+SETTINGS_SCHEMA = {
+    "spreadsheet_id": STR,
+    "credentials_file": STR,
+    "drive_folder_id": STR,
+    "hotkey": STR,
+    "sheet_name": STR,
+    "sheet_next_hotkey": OPTIONAL_STR,
+    "sheet_prev_hotkey": OPTIONAL_STR,
+    "batch_window_ms": NUMBER,
+    "batch_max_rows": NUMBER,
+    "drain_chunk_size": NUMBER,
+    # 旧名（rate_limit_max_wait が無ければこちらを使う）
+    "drain_max_delay": NUMBER,
+    "sheets_quota_per_minute": NUMBER,
+    "drive_quota_per_minute": NUMBER,
+    "rate_limit_max_retries": NUMBER,
+    "rate_limit_max_wait": NUMBER,
+    "sync_backoff_base": NUMBER,
+    "sync_backoff_max": NUMBER,
+    "prewarm": BOOL,
+    "sheet_cache_ttl": NUMBER,
+    "drive_folder_cache_ttl": NUMBER,
+    "upload_concurrency": NUMBER,
+    "upload_chunk_size_mb": NUMBER,
+    "upload_chunk_retries": NUMBER,
+    "upload_dedup": BOOL,
+    "upload_dedup_verify": BOOL,
+    "clipboard_image_format": STR,
+    "clipboard_image_quality": NUMBER,
+    "clipboard_image_max_dimension": NUMBER,
+    "http_connect_timeout": NUMBER,
+    "http_read_timeout": NUMBER,
+    "http_pool_size": NUMBER,
+    "token_refresh_margin": NUMBER,
+    "use_async_engine": BOOL,
+    "async_max_concurrency": NUMBER,
+    "api_endpoint": STR,
+    "metrics_enabled": BOOL,
+    "metrics_export_interval": NUMBER,
+    "metrics_file_max_bytes": NUMBER,
+    "metrics_file_backups": NUMBER,
+    "instant_show": BOOL,
+}
+REQUIRED_SETTINGS = ("spreadsheet_id", "credentials_file", "drive_folder_id", "hotkey")
 
-def load_settings():
-    """外部設定ファイルから設定を読み込む"""
-    if not os.path.exists(SETTINGS_FILE):
-        raise FileNotFoundError(
-            f"設定ファイルが見つかりません: {SETTINGS_FILE}\n"
-            "settings.json を同じディレクトリに配置してください。"
-        )
+# 設定を読み込み（読み込みはここで1回だけ。失敗しても例外にせず settings.errors に理由を残し、main で表示する）
+settings = SettingsStore(SETTINGS_FILE, SETTINGS_SCHEMA, REQUIRED_SETTINGS)
+settings.load()
+_settings = settings.data
 
-    try:
-        with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-            settings = json.load(f)
+# 各設定値（外部設定ファイルから読み込み）
+SPREADSHEET_ID = _settings.get("spreadsheet_id", "")
+CREDENTIALS_FILE = os.path.join(BASE_DIR, _settings.get("credentials_file", "credentials.json"))
+TOKEN_FILE = os.path.join(BASE_DIR, "token.json")
 
-        # 必須項目のチェック
-        required_fields = [
-            "spreadsheet_id",
-            "credentials_file",
-            "drive_folder_id",
-            "hotkey",
-        ]
-        missing_fields = [field for field in required_fields if field not in settings]
+DEFAULT_SHEET_NEXT_HOTKEY = "ctrl+shift+]"
+DEFAULT_SHEET_PREV_HOTKEY = "ctrl+shift+["
 
-        if missing_fields:
-            raise ValueError(
-                f"settings.json に必須項目が不足しています: {', '.join(missing_fields)}"
-            )
 
-        return settings
-    except json.JSONDecodeError as e:
-        raise ValueError(f"settings.json の形式が正しくありません: {e}")
-    except Exception as e:
-        raise Exception(f"設定ファイルの読み込みに失敗しました: {e}")
+def _optional_hotkey(value) -> str:
+    return str(value).strip() if value is not None else ""
 
 
-# 設定を読み込み
-_settings = load_settings()
+HOTKEY = _settings.get("hotkey", "")
+SHEET_NAME = (_settings.get("sheet_name") or "").strip()
+SHEET_NEXT_HOTKEY = _optional_hotkey(_settings.get("sheet_next_hotkey", DEFAULT_SHEET_NEXT_HOTKEY))
+SHEET_PREV_HOTKEY = _optional_hotkey(_settings.get("sheet_prev_hotkey", DEFAULT_SHEET_PREV_HOTKEY))
+DRIVE_FOLDER_ID = _settings.get("drive_folder_id", "")
 
-# 各設定値（外部設定ファイルから読み込み）
-SPREADSHEET_ID = _settings["spreadsheet_id"]
-CREDENTIALS_FILE = os.path.join(BASE_DIR, _settings["credentials_file"])
-TOKEN_FILE = os.path.join(BASE_DIR, "token.json")
-HOTKEY = _settings["hotkey"]
+# ホットキー・シート・アップロード先フォルダは、settings.json が変わったら再起動せずに反映する
+LIVE_SETTINGS = {"hotkey", "sheet_name", "sheet_next_hotkey", "sheet_prev_hotkey", "drive_folder_id"}
 
-DEFAULT_SHEET_NEXT_HOTKEY = "ctrl+shift+]"
-DEFAULT_SHEET_PREV_HOTKEY = "ctrl+shift+["
 
-SHEET_NAME = (_settings.get("sheet_name") or "").strip()
-_raw_next_hotkey = _settings.get("sheet_next_hotkey", DEFAULT_SHEET_NEXT_HOTKEY)
-_raw_prev_hotkey = _settings.get("sheet_prev_hotkey", DEFAULT_SHEET_PREV_HOTKEY)
-SHEET_NEXT_HOTKEY = (str(_raw_next_hotkey).strip() if _raw_next_hotkey is not None else "")
-SHEET_PREV_HOTKEY = (str(_raw_prev_hotkey).strip() if _raw_prev_hotkey is not None else "")
+def _apply_live_settings(changed: dict):
+    global HOTKEY, SHEET_NAME, SHEET_NEXT_HOTKEY, SHEET_PREV_HOTKEY, DRIVE_FOLDER_ID
+    if "hotkey" in changed:
+        HOTKEY = settings.get("hotkey", HOTKEY)
+    if "sheet_name" in changed:
+        SHEET_NAME = (settings.get("sheet_name") or "").strip()
+    if "sheet_next_hotkey" in changed:
+        SHEET_NEXT_HOTKEY = _optional_hotkey(settings.get("sheet_next_hotkey", DEFAULT_SHEET_NEXT_HOTKEY))
+    if "sheet_prev_hotkey" in changed:
+        SHEET_PREV_HOTKEY = _optional_hotkey(settings.get("sheet_prev_hotkey", DEFAULT_SHEET_PREV_HOTKEY))
+    if "drive_folder_id" in changed:
+        DRIVE_FOLDER_ID = settings.get("drive_folder_id", DRIVE_FOLDER_ID)
+    restart_needed = sorted(set(changed) - LIVE_SETTINGS)
+    if restart_needed:
+        print(f"Restart Supanikki to apply: {', '.join(restart_needed)}")
+
+
+settings.subscribe(_apply_live_settings)
+
+# 連続送信をまとめて1回の append にする待ち時間(ms)と最大行数
+BATCH_WINDOW_MS = int(_settings.get("batch_window_ms", 200))
+BATCH_MAX_ROWS = int(_settings.get("batch_max_rows", 50))
+
+# オフラインキュー再送時の1回あたり最大行数
+DRAIN_CHUNK_SIZE = int(_settings.get("drain_chunk_size", 100))
+
+# 再送失敗時の指数バックオフ（秒）：初回の待ち時間と上限
+SYNC_BACKOFF_BASE = float(_settings.get("sync_backoff_base", 2))
+SYNC_BACKOFF_MAX = float(_settings.get("sync_backoff_max", 300))
+
+# 起動直後にバックグラウンドで認証・シート取得を済ませておくか
+PREWARM = bool(_settings.get("prewarm", True))
+
+# シート一覧キャッシュの有効期間（秒）
+SHEET_CACHE_TTL = float(_settings.get("sheet_cache_ttl", 300))
+
+# アップロード先フォルダの存在確認を再実行する間隔（秒）。0 以下ならセッション中1回だけ
+DRIVE_FOLDER_CACHE_TTL = float(_settings.get("drive_folder_cache_ttl", 0))
+
+# ドロップしたファイルを同時にアップロードする最大数
+UPLOAD_CONCURRENCY = max(1, int(_settings.get("upload_concurrency", 3)))
+
+# 再開可能アップロードの1回あたりの送信サイズ(MB)と、通信エラー時の再試行回数
+UPLOAD_CHUNK_SIZE = max(1, int(_settings.get("upload_chunk_size_mb", 8))) * 1024 * 1024
+UPLOAD_CHUNK_RETRIES = max(0, int(_settings.get("upload_chunk_retries", 5)))
+
+# 同じ内容のファイルは再アップロードせず、前回のリンクを返す。verify が有効なら Drive 上に残っているか確認する
+UPLOAD_DEDUP = bool(_settings.get("upload_dedup", True))
+UPLOAD_DEDUP_VERIFY = bool(_settings.get("upload_dedup_verify", True))
+
+# 貼り付け画像のエンコード形式（png / webp / jpeg）、画質(1-100, webp/jpeg のみ)、長辺の最大ピクセル数（0 なら縮小しない）
+CLIPBOARD_IMAGE_FORMAT = str(_settings.get("clipboard_image_format", "png")).strip().lower()
+CLIPBOARD_IMAGE_QUALITY = int(_settings.get("clipboard_image_quality", 85))
+CLIPBOARD_IMAGE_MAX_DIMENSION = max(0, int(_settings.get("clipboard_image_max_dimension", 0)))
+
+# Google API 通信のタイムアウト（秒）と、Sheets 用に保持する keep-alive 接続数
+HTTP_CONNECT_TIMEOUT = float(_settings.get("http_connect_timeout", 10))
+HTTP_READ_TIMEOUT = float(_settings.get("http_read_timeout", 60))
+HTTP_POOL_SIZE = max(1, int(_settings.get("http_pool_size", UPLOAD_CONCURRENCY + 4)))
+
+# アクセストークンの有効期限の何秒前にバックグラウンドで更新するか
+TOKEN_REFRESH_MARGIN = float(_settings.get("token_refresh_margin", 300))
+
+# 送信・アップロード・フォルダ確認を asyncio のイベントループ1本で実行する（試験的）。
+# アップロード以外（送信・シート確認など）で同時に実行する HTTP 呼び出しの上限（アップロードは upload_concurrency の別枠）
+USE_ASYNC_ENGINE = bool(_settings.get("use_async_engine", False))
+ASYNC_MAX_CONCURRENCY = max(1, int(_settings.get("async_max_concurrency", 2)))
+
+# Google API の接続先を差し替える（例: "http://127.0.0.1:8765"）。benchmarks/fake_google_server.py での計測用。通常は空
+API_ENDPOINT = str(_settings.get("api_endpoint", "") or "").strip()
+
+# 所要時間・カウンタを metrics.jsonl に書き出す間隔（秒）と、ローテーションするサイズ・世代数
+METRICS_ENABLED = bool(_settings.get("metrics_enabled", True))
+METRICS_EXPORT_INTERVAL = float(_settings.get("metrics_export_interval", 60))
+METRICS_FILE_MAX_BYTES = int(_settings.get("metrics_file_max_bytes", 1024 * 1024))
+METRICS_FILE_BACKUPS = int(_settings.get("metrics_file_backups", 3))
+
+# 入力ウィンドウを描画済みのまま画面外で待機させ、ホットキーで即座に表示する
+INSTANT_SHOW = bool(_settings.get("instant_show", False))
 
-DRIVE_FOLDER_ID = _settings["drive_folder_id"]
+# Google API の1分あたりの呼び出し上限（この速さを超えないよう送信側で待つ）と、
+# クォータエラー（429）を待ってから再試行する回数・1回の最大待ち時間(秒)
+SHEETS_QUOTA_PER_MINUTE = max(1.0, float(_settings.get("sheets_quota_per_minute", 60)))
+DRIVE_QUOTA_PER_MINUTE = max(1.0, float(_settings.get("drive_quota_per_minute", 1000)))
+RATE_LIMIT_MAX_RETRIES = max(0, int(_settings.get("rate_limit_max_retries", 5)))
+# rate_limit_max_wait は以前 drain_max_delay という名前だったので、旧名の設定も読む
+RATE_LIMIT_MAX_WAIT = float(_settings.get("rate_limit_max_wait", _settings.get("drain_max_delay", 64)))
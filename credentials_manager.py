@@ -0,0 +1,193 @@
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Callable, List, Optional
+
+# バックグラウンド更新が通信エラーで失敗したときの再試行間隔（秒）
+REFRESH_RETRY_INTERVAL = 60
+
+
+class CredentialsManager:
+    """
+    OAuth トークンを管理する。
+    - 期限切れでもまず refresh_token で更新し、ブラウザでの再認証は refresh_token 自体が
+      失効/取り消しされた場合（またはスコープ不足・初回）だけ行う
+    - 有効期限の少し前（token_refresh_margin 秒前）にバックグラウンドで更新しておく
+    - token.json は一時ファイル経由で置き換える（書き込み途中で落ちても壊れない）
+    - refresh_token の失効に気づいたら creds を捨てて on_revoked を呼ぶ。次の get_credentials() は
+      token.json を読み直さずにブラウザで再認証する
+    """
+
+    def __init__(self, token_file: str, credentials_file: str, scopes: List[str], refresh_margin: float = 300):
+        self.token_file = token_file
+        self.credentials_file = credentials_file
+        self.scopes = scopes
+        self.refresh_margin = refresh_margin
+        self.creds = None
+        self._lock = threading.RLock()
+        self._saved_token: Optional[str] = None
+        self._refresher: Optional[threading.Thread] = None
+        self._wakeup = threading.Event()
+        # refresh_token が失効した（token.json の内容では更新できない）
+        self.revoked = False
+        self.on_revoked: Optional[Callable[[], None]] = None
+
+    def get_credentials(self):
+        """
+        有効な資格情報を返す。更新できなければブラウザで再認証する。
+        通信エラーなどで判断できない場合は None を返す（token.json は消さない）。
+        """
+        from google.auth.exceptions import RefreshError
+
+        with self._lock:
+            if self.creds is None and not self.revoked:
+                self.creds = self._load()
+
+            if self.creds and not self.creds.valid:
+                if self.creds.refresh_token:
+                    try:
+                        self._refresh_locked()
+                    except RefreshError as e:
+                        print(f"Refresh token is no longer valid ({e}). Re-authentication is required.")
+                        self.creds = None
+                        self.revoked = True
+                    except Exception as e:
+                        print(f"Failed to refresh access token: {e}")
+                        return None
+                else:
+                    self.creds = None
+
+            if self.creds is None:
+                self.creds = self._run_flow()
+                if self.creds is None:
+                    return None
+                self.revoked = False
+                self._save_locked()
+
+            self._start_refresher()
+            return self.creds
+
+    def mark_revoked(self, error: Exception):
+        """
+        refresh_token が失効していた（バックグラウンド更新や API 呼び出し中の自動更新で RefreshError）。
+        creds を捨て、次に資格情報が必要になったときにブラウザで再認証させる。
+        """
+        with self._lock:
+            if self.revoked and self.creds is None:
+                return
+            print(f"Refresh token is no longer valid ({error}). Re-authentication will be required.")
+            self.creds = None
+            self.revoked = True
+            self._wakeup.set()
+        callback = self.on_revoked
+        if callback is not None:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Credentials revoked callback error: {e}")
+
+    def _load(self):
+        from google.oauth2.credentials import Credentials
+
+        if not os.path.exists(self.token_file):
+            return None
+
+        # まずは token.json に入っているスコープのまま読み込む（ここでSCOPESを渡すと、
+        # refresh時に「持っていないスコープ」で更新を試みて invalid_scope になり得る）
+        try:
+            if os.path.getsize(self.token_file) == 0:
+                raise ValueError("token.json is empty")
+            creds = Credentials.from_authorized_user_file(self.token_file)
+        except Exception as e:
+            # 空/壊れた token.json は再認証で作り直す
+            print(f"Failed to load {self.token_file} ({e}). Re-authentication is required.")
+            return None
+
+        # スコープが不足している場合（Drive追加など）は再認証が必要
+        if hasattr(creds, "has_scopes") and not creds.has_scopes(self.scopes):
+            print("Existing token.json does not have required scopes. Re-authentication is required.")
+            return None
+
+        self._saved_token = creds.token
+        return creds
+
+    def _run_flow(self):
+        from google_auth_oauthlib.flow import InstalledAppFlow
+
+        if not os.path.exists(self.credentials_file):
+            print(f"Credentials file '{self.credentials_file}' not found.")
+            return None
+
+        flow = InstalledAppFlow.from_client_secrets_file(self.credentials_file, self.scopes)
+        return flow.run_local_server(port=0, open_browser=True)
+
+    def _refresh_locked(self):
+        from google.auth.transport.requests import Request
+
+        self.creds.refresh(Request())
+        self._save_locked()
+
+    def _save_locked(self):
+        try:
+            tmp_path = self.token_file + ".tmp"
+            with open(tmp_path, "w") as token:
+                token.write(self.creds.to_json())
+                token.flush()
+                os.fsync(token.fileno())
+            os.replace(tmp_path, self.token_file)
+            self._saved_token = self.creds.token
+        except Exception as e:
+            print(f"Failed to save {self.token_file}: {e}")
+
+    def _start_refresher(self):
+        if self._refresher is not None and self._refresher.is_alive():
+            # 新しい資格情報の有効期限で待ち直させる
+            self._wakeup.set()
+            return
+        self._refresher = threading.Thread(target=self._refresh_loop, name="token-refresh", daemon=True)
+        self._refresher.start()
+
+    def _seconds_until_refresh(self) -> float:
+        creds = self.creds
+        if creds is None or creds.expiry is None:
+            # 有効期限が分からない場合はすぐに更新して期限を得る
+            return 0
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return max(0.0, (creds.expiry - now).total_seconds() - self.refresh_margin)
+
+    def _refresh_loop(self):
+        from google.auth.exceptions import RefreshError
+
+        retry_at = None
+        while True:
+            with self._lock:
+                if self.creds is None or not self.creds.refresh_token:
+                    return
+                # 通信ライブラリ側で自動更新された場合も token.json に反映しておく
+                if self.creds.token != self._saved_token and self.creds.valid:
+                    self._save_locked()
+                delay = retry_at if retry_at is not None else self._seconds_until_refresh()
+
+            retry_at = None
+            if self._wakeup.wait(delay):
+                self._wakeup.clear()
+                continue
+
+            revoked = None
+            with self._lock:
+                if self.creds is None:
+                    return
+                if self._seconds_until_refresh() > 0:
+                    continue
+                try:
+                    self._refresh_locked()
+                    print("Access token refreshed in background.")
+                except RefreshError as e:
+                    revoked = e
+                except Exception as e:
+                    print(f"Background token refresh failed ({e}). Retrying in {REFRESH_RETRY_INTERVAL}s.")
+                    retry_at = REFRESH_RETRY_INTERVAL
+            if revoked is not None:
+                # ここではブラウザを開かない。on_revoked で SheetManager が接続を捨て、次に API を使うときに再認証する
+                self.mark_revoked(revoked)
+                return
@@ -0,0 +1,338 @@
+import queue
+import sys
+import threading
+import time
+from typing import Callable, Dict, FrozenSet, Optional, Set
+
+from metrics import metrics
+
+MODIFIERS = ("ctrl", "shift", "alt", "cmd")
+# 設定ファイルでの表記 → 内部のキー名
+_ALIASES = {
+    "control": "ctrl",
+    "win": "cmd",
+    "windows": "cmd",
+    "super": "cmd",
+    "escape": "esc",
+    "return": "enter",
+}
+# 押しっぱなしのキーは OS のキーリピートで押下イベントが続くので、
+# この秒数より前から押下イベントが来ていない修飾キー以外のキーは離したものとみなす
+STALE_KEY_SECONDS = 2.0
+# 修飾キーはキーリピートしない環境（X11 など）があるので長めに待つ
+STALE_MODIFIER_SECONDS = 5.0
+# リスナーが止まったときに作り直すまでの待ち時間（秒）
+RESTART_DELAY = 1.0
+
+
+def _normalize(name: str) -> str:
+    """ctrl_l / alt_gr / cmd_r などを修飾キーの名前にまとめる"""
+    for modifier in MODIFIERS:
+        if name.startswith(modifier):
+            return modifier
+    return name
+
+
+def parse_hotkey(hotkey_str: str) -> Optional[FrozenSet[str]]:
+    """
+    ホットキー文字列をキー名の集合に変換する。解釈できなければ None
+    例: 'ctrl+shift+space' -> {'ctrl', 'shift', 'space'}
+    """
+    parts = [p.strip().lower() for p in (hotkey_str or "").split("+")]
+    if not parts or any(not p for p in parts):
+        return None
+    keys = frozenset(_ALIASES.get(p, p) for p in parts)
+    # 修飾キーだけの組み合わせは通常の入力と区別できない
+    if all(k in MODIFIERS for k in keys):
+        return None
+    return keys
+
+
+class HotkeyMatcher:
+    """
+    押下/解放イベントから押されているキーを管理し、ホットキーの組み合わせに一致したらコールバックを返す。
+    OS のフックに依存しない（テスト・ベンチマークではイベントを直接渡す）。
+    - 同じキーの押下が続くのはキーリピートなので、一致してもコールバックは最初の1回だけ
+    - 解放イベントを取りこぼして押したままになったキーは、次の押下時に取り除く
+      （modifier_probe があれば実際の修飾キーの状態に合わせ、無ければ押下からの経過時間で判断する）
+    """
+
+    def __init__(
+        self,
+        modifier_probe: Optional[Callable[[], Set[str]]] = None,
+        stale_key_seconds: float = STALE_KEY_SECONDS,
+        stale_modifier_seconds: float = STALE_MODIFIER_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.modifier_probe = modifier_probe
+        self.stale_key_seconds = stale_key_seconds
+        self.stale_modifier_seconds = stale_modifier_seconds
+        self.clock = clock
+        self._bindings: Dict[FrozenSet[str], Callable] = {}
+        # キー名 → 最後に押下（またはキーリピート）を受け取った時刻
+        self._pressed: Dict[str, float] = {}
+        self.reconciled = 0
+
+    def bind(self, keys: FrozenSet[str], callback: Callable) -> bool:
+        """組み合わせを登録する。既に登録済みなら False"""
+        if keys in self._bindings:
+            return False
+        self._bindings[keys] = callback
+        return True
+
+    def clear(self):
+        self._bindings.clear()
+
+    def reset(self):
+        self._pressed.clear()
+
+    @property
+    def pressed(self) -> FrozenSet[str]:
+        return frozenset(self._pressed)
+
+    def press(self, key: str) -> Optional[Callable]:
+        now = self.clock()
+        if key in self._pressed:
+            # キーリピート
+            self._pressed[key] = now
+            return None
+        if key not in MODIFIERS:
+            self._reconcile(now)
+        self._pressed[key] = now
+        return self._bindings.get(frozenset(self._pressed))
+
+    def release(self, key: str):
+        self._pressed.pop(key, None)
+
+    def _reconcile(self, now: float):
+        stuck = []
+        if self.modifier_probe is not None:
+            try:
+                held = self.modifier_probe()
+            except Exception:
+                held = None
+            if held is not None:
+                for key in MODIFIERS:
+                    if key in self._pressed and key not in held:
+                        stuck.append(key)
+                    elif key in held and key not in self._pressed:
+                        # 押下イベントを取りこぼした修飾キーは押されているものとして扱う
+                        self._pressed[key] = now
+        for key, at in self._pressed.items():
+            if key in stuck:
+                continue
+            if key in MODIFIERS:
+                if self.modifier_probe is None and now - at > self.stale_modifier_seconds:
+                    stuck.append(key)
+            elif now - at > self.stale_key_seconds:
+                stuck.append(key)
+        for key in stuck:
+            del self._pressed[key]
+        if stuck:
+            self.reconciled += len(stuck)
+            metrics.incr("hotkey.stuck_keys", len(stuck))
+
+
+def windows_modifier_probe() -> Optional[Callable[[], Set[str]]]:
+    """Windows では GetAsyncKeyState で実際に押されている修飾キーを返す関数を作る。それ以外は None"""
+    if sys.platform != "win32":
+        return None
+    try:
+        import ctypes
+
+        get_state = ctypes.windll.user32.GetAsyncKeyState
+    except Exception:
+        return None
+    virtual_keys = {
+        "ctrl": (0x11,),
+        "shift": (0x10,),
+        "alt": (0x12,),
+        "cmd": (0x5B, 0x5C),
+    }
+
+    def probe() -> Set[str]:
+        return {
+            name
+            for name, vks in virtual_keys.items()
+            if any(get_state(vk) & 0x8000 for vk in vks)
+        }
+
+    return probe
+
+
+class HotkeyListener:
+    """
+    pynput の keyboard.Listener を1つだけ常駐させてホットキーを判定する。
+    - 押下のたびにフックを作り直さない（作り直しの間の取りこぼしが無い）
+    - コールバックは専用スレッドで順に実行し、OS のフックのスレッドを待たせない
+    - リスナーのスレッドが終了したら（join で待っている監視スレッドが起きて）作り直す
+    """
+
+    def __init__(self, modifier_probe: Optional[Callable[[], Set[str]]] = None):
+        self.matcher = HotkeyMatcher(modifier_probe=modifier_probe)
+        self._lock = threading.Lock()
+        self._listener = None
+        self._keyboard = None
+        self._vk_names: Dict[int, str] = {}
+        self._bindings: Dict[str, Callable] = {}
+        self._stopping = False
+        self._calls: "queue.Queue" = queue.Queue()
+        self._dispatcher = None
+        self._watchdog = None
+        self.restarts = 0
+
+    def set_bindings(self, bindings: Dict[str, Callable]) -> Dict[str, bool]:
+        """
+        {ホットキー文字列: コールバック} を登録し直す（リスナーはそのまま）。
+        文字列ごとに登録できたかを返す（解釈できない・他と重複する場合は False）
+        """
+        with self._lock:
+            self._bindings = dict(bindings)
+            return self._rebind()
+
+    def _rebind(self) -> Dict[str, bool]:
+        result = {}
+        self.matcher.clear()
+        for hotkey_str, callback in self._bindings.items():
+            keys = parse_hotkey(hotkey_str)
+            result[hotkey_str] = bool(keys) and self.matcher.bind(self._canonical_keys(keys), callback)
+        return result
+
+    def start(self):
+        with self._lock:
+            if self._listener is not None:
+                return
+            self._stopping = False
+            self._start_listener()
+            self._ensure_dispatcher()
+            self._watchdog = threading.Thread(target=self._watch, name="hotkey-watchdog", daemon=True)
+            self._watchdog.start()
+
+    def stop(self):
+        with self._lock:
+            self._stopping = True
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            try:
+                listener.stop()
+            except Exception:
+                pass
+        self._calls.put(None)
+
+    @property
+    def running(self) -> bool:
+        listener = self._listener
+        return listener is not None and listener.running
+
+    def on_key(self, key: str, is_press: bool):
+        """キー名でイベントを渡す（OS のイベントもベンチマークの合成イベントもここを通る）"""
+        with self._lock:
+            if not is_press:
+                self.matcher.release(key)
+                return
+            callback = self.matcher.press(key)
+        if callback is not None:
+            self._ensure_dispatcher()
+            self._calls.put((callback, time.perf_counter()))
+
+    def _ensure_dispatcher(self):
+        dispatcher = self._dispatcher
+        if dispatcher is None or not dispatcher.is_alive():
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="hotkey-dispatch", daemon=True)
+            self._dispatcher.start()
+
+    def _start_listener(self):
+        if self._keyboard is None:
+            from pynput import keyboard
+
+            self._keyboard = keyboard
+            # 特殊キー（space, enter など）は canonical() で仮想キーコードになるので、名前を引けるようにする
+            for key in keyboard.Key:
+                vk = getattr(key.value, "vk", None)
+                if vk is not None:
+                    self._vk_names.setdefault(vk, key.name)
+            # pynput を読み込む前に登録された組み合わせを、イベントと同じ表記で登録し直す
+            self._rebind()
+        self.matcher.reset()
+        self._listener = self._keyboard.Listener(on_press=self._on_press, on_release=self._on_release)
+        self._listener.start()
+
+    def _canonical_keys(self, keys: FrozenSet[str]) -> FrozenSet[str]:
+        """設定の表記（'space' など）を、イベントから得る名前と同じ表記にそろえる"""
+        if self._keyboard is None:
+            return keys
+        names = set()
+        for name in keys:
+            key = getattr(self._keyboard.Key, name, None)
+            vk = getattr(getattr(key, "value", None), "vk", None)
+            names.add(_normalize(self._vk_names.get(vk, name)) if vk is not None else name)
+        return frozenset(names)
+
+    def _key_name(self, key) -> Optional[str]:
+        keyboard = self._keyboard
+        listener = self._listener
+        if listener is not None:
+            key = listener.canonical(key)
+        if isinstance(key, keyboard.Key):
+            return _normalize(key.name)
+        if isinstance(key, keyboard.KeyCode):
+            if key.char and key.char.isprintable():
+                return key.char.lower()
+            vk = key.vk
+            if vk is None:
+                return None
+            if sys.platform == "win32" and (0x30 <= vk <= 0x39 or 0x41 <= vk <= 0x5A):
+                # Ctrl を押しながらの英数字は制御文字になることがあるので仮想キーコードから戻す
+                return chr(vk).lower()
+            return _normalize(self._vk_names.get(vk, f"vk{vk}"))
+        return None
+
+    def _on_press(self, key):
+        name = self._key_name(key)
+        if name:
+            self.on_key(name, True)
+
+    def _on_release(self, key):
+        name = self._key_name(key)
+        if name:
+            self.on_key(name, False)
+
+    def _dispatch_loop(self):
+        while True:
+            item = self._calls.get()
+            if item is None:
+                return
+            callback, pressed_at = item
+            metrics.observe("hotkey.dispatch", (time.perf_counter() - pressed_at) * 1000)
+            try:
+                callback()
+            except Exception as e:
+                print(f"Hotkey callback error: {e}")
+
+    def _watch(self):
+        """リスナーのスレッド終了を join で待ち、意図しない終了なら作り直す（定期的なポーリングはしない）"""
+        while True:
+            with self._lock:
+                listener = self._listener
+            if listener is None:
+                return
+            try:
+                listener.join()
+            except Exception as e:
+                print(f"Hotkey listener stopped with error: {e}")
+            with self._lock:
+                if self._stopping or self._listener is not listener:
+                    return
+            print("Hotkey listener is down. Restarting...")
+            time.sleep(RESTART_DELAY)
+            with self._lock:
+                if self._stopping:
+                    return
+                try:
+                    self._start_listener()
+                    self.restarts += 1
+                    metrics.incr("hotkey.listener_restarts")
+                except Exception as e:
+                    print(f"Failed to restart hotkey listener: {e}")
+                    self._listener = None
+                    return
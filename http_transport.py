@@ -0,0 +1,142 @@
+import threading
+
+import config
+
+# api_endpoint を設定したときに置き換える Google API のホスト（ローカルの疑似サーバーでの計測用）
+GOOGLE_API_HOSTS = ("https://sheets.googleapis.com", "https://www.googleapis.com")
+
+
+def rewrite_endpoint(url: str) -> str:
+    endpoint = config.API_ENDPOINT
+    if not endpoint:
+        return url
+    for host in GOOGLE_API_HOSTS:
+        if url.startswith(host):
+            return endpoint.rstrip("/") + url[len(host):]
+    return url
+
+
+def _pooled_adapter():
+    import requests
+
+    class EndpointAdapter(requests.adapters.HTTPAdapter):
+        def send(self, request, **kwargs):
+            request.url = rewrite_endpoint(request.url)
+            return super().send(request, **kwargs)
+
+    # 並列アップロード数＋送信/再送スレッド分の接続を保持できるようにする
+    return EndpointAdapter(pool_connections=config.HTTP_POOL_SIZE, pool_maxsize=config.HTTP_POOL_SIZE)
+
+
+def _http(timeout: float):
+    import httplib2
+
+    if config.API_ENDPOINT:
+
+        class EndpointHttp(httplib2.Http):
+            def request(self, uri, *args, **kwargs):
+                return super().request(rewrite_endpoint(uri), *args, **kwargs)
+
+        http = EndpointHttp(timeout=timeout)
+    else:
+        http = httplib2.Http(timeout=timeout)
+    # 再開可能アップロードの 308 はリダイレクトではないので、httplib2 に追従させない
+    # （googleapiclient.http.build_http と同じ設定）
+    http.redirect_codes = http.redirect_codes - {308}
+    return http
+
+
+class HttpTransport:
+    """
+    Google API 用の HTTP 接続をまとめて管理する。
+    - Sheets(gspread): requests の AuthorizedSession を1つ共有する。urllib3 の接続プールは
+      スレッドセーフなので、送信・再送スレッドから同時に使っても keep-alive の接続を使い回せる
+    - Drive(googleapiclient): httplib2.Http はスレッドセーフではないため、スレッドごとに
+      AuthorizedHttp とサービスを持つ。同じスレッドの2回目以降は接続(TLS)を再利用する
+    - release_drive() で手放した接続済みのサービスは、次に Drive を使う別のスレッドが引き継ぐ
+      （プレウォームのスレッドで接続したものを、最初のアップロードのスレッドで使う）
+    認証し直した（creds が変わった）場合は作り直す。
+    """
+
+    def __init__(self, creds):
+        self.creds = creds
+        self._lock = threading.Lock()
+        self._session = None
+        self._local = threading.local()
+        # どのスレッドも使っていない (AuthorizedHttp, サービス)
+        self._spare_drive = []
+
+    def sheets_session(self):
+        with self._lock:
+            if self._session is None:
+                from google.auth.transport.requests import AuthorizedSession
+
+                session = AuthorizedSession(self.creds)
+                session.mount("https://", _pooled_adapter())
+                self._session = session
+            return self._session
+
+    def sheets_timeout(self):
+        """gspread の set_timeout に渡す (接続, 読み込み) のタイムアウト（秒）"""
+        return (config.HTTP_CONNECT_TIMEOUT, config.HTTP_READ_TIMEOUT)
+
+    def authorize_gspread(self):
+        import gspread
+
+        # 自前の session を渡すときは credentials に None を指定する
+        client = gspread.authorize(None, session=self.sheets_session())
+        client.set_timeout(self.sheets_timeout())
+        return client
+
+    def _adopt_spare_drive(self):
+        with self._lock:
+            if not self._spare_drive:
+                return
+            self._local.http, self._local.drive = self._spare_drive.pop()
+
+    def drive_http(self):
+        """呼び出しスレッド専用の AuthorizedHttp を返す"""
+        if getattr(self._local, "http", None) is None:
+            self._adopt_spare_drive()
+        http = getattr(self._local, "http", None)
+        if http is None:
+            import google_auth_httplib2
+
+            # httplib2 は接続と読み込みを区別しないので、長い方（読み込み）を使う
+            http = google_auth_httplib2.AuthorizedHttp(
+                self.creds, http=_http(config.HTTP_READ_TIMEOUT)
+            )
+            self._local.http = http
+        return http
+
+    def drive_service(self):
+        """呼び出しスレッド専用の Drive v3 サービスを返す"""
+        if getattr(self._local, "http", None) is None:
+            self._adopt_spare_drive()
+        service = getattr(self._local, "drive", None)
+        if service is None:
+            from googleapiclient.discovery import build
+
+            service = build("drive", "v3", http=self.drive_http(), cache_discovery=False)
+            self._local.drive = service
+        return service
+
+    def release_drive(self):
+        """呼び出しスレッドの Drive サービスを手放し、別のスレッドが接続ごと引き継げるようにする"""
+        http = getattr(self._local, "http", None)
+        service = getattr(self._local, "drive", None)
+        self._local.http = None
+        self._local.drive = None
+        if http is not None and service is not None:
+            with self._lock:
+                self._spare_drive.append((http, service))
+
+    def close(self):
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            try:
+                session.close()
+            except Exception:
+                pass
+
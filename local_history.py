@@ -1,54 +1,237 @@
 import json
 import os
+import sqlite3
 import threading
-from typing import List, Dict
+from datetime import datetime
+from typing import List, Dict, Optional
 
 import config
+from suggest_index import SuggestionIndex
 
+# 旧形式（直近10件だけを保持するJSON）。初回起動時に DB へ取り込む
 HISTORY_FILE = os.path.join(config.BASE_DIR, "local_history.json")
-MAX_HISTORY = 10
+HISTORY_DB = os.path.join(config.BASE_DIR, "local_history.db")
+
 
 class LocalHistory:
+    """
+    送信した全エントリをローカルの SQLite(WAL) に保存する。
+    本文・タイムスタンプ・シート名は FTS5 で全文検索できる
+    （trigram トークナイザが使える場合は日本語も部分一致で検索可能）。
+    """
+
     def __init__(self):
         self._lock = threading.Lock()
-        self._history: List[str] = self._load_history()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._fts_tokenizer: Optional[str] = None
+        self._last_text: Optional[str] = None
+        try:
+            self._conn = self._open_db()
+            self._fts_tokenizer = self._create_schema()
+            self._import_legacy_file()
+            self._last_text = self._load_last_text()
+        except Exception as e:
+            print(f"Failed to open local history: {e}")
+            self._conn = None
+
+        # 入力補完用インデックスは起動を遅らせないよう別スレッドで構築する。
+        # 構築中に add() された分は _pending_suggestions に溜め、構築後に反映する
+        self._suggestions = SuggestionIndex()
+        self._suggestions_ready = False
+        self._pending_suggestions: List[str] = []
+        threading.Thread(target=self._build_suggestions, daemon=True).start()
+
+    def _open_db(self) -> sqlite3.Connection:
+        # 送信スレッドとUIスレッドの両方から使うので、排他は self._lock で行う
+        conn = sqlite3.connect(HISTORY_DB, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _create_schema(self) -> Optional[str]:
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " text TEXT NOT NULL,"
+            " created_at TEXT NOT NULL,"
+            " sheet TEXT NOT NULL DEFAULT ''"
+            ")"
+        )
+
+        # FTS5 が無いビルドの SQLite では LIKE 検索にフォールバックする
+        for tokenizer in ("trigram", "unicode61"):
+            try:
+                self._conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5("
+                    " text, created_at, sheet,"
+                    " content='entries', content_rowid='id',"
+                    f" tokenize='{tokenizer}'"
+                    ")"
+                )
+                break
+            except sqlite3.OperationalError:
+                continue
+        else:
+            print("SQLite FTS5 is not available. Falling back to LIKE search.")
+            return None
 
-    def _load_history(self) -> List[str]:
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS entries_ai AFTER INSERT ON entries BEGIN"
+            " INSERT INTO entries_fts(rowid, text, created_at, sheet)"
+            " VALUES (new.id, new.text, new.created_at, new.sheet);"
+            " END"
+        )
+        row = self._conn.execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'entries_fts'"
+        ).fetchone()
+        return "trigram" if row and "trigram" in row[0] else "unicode61"
+
+    def _import_legacy_file(self):
         if not os.path.exists(HISTORY_FILE):
-            return []
+            return
+        if self._conn.execute("SELECT 1 FROM entries LIMIT 1").fetchone():
+            return
+
         try:
             with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+                legacy = json.load(f)
+            # 旧形式は時刻を持たないので、ファイルの更新時刻で代用する
+            created_at = datetime.fromtimestamp(os.path.getmtime(HISTORY_FILE)).strftime(
+                "%Y-%m-%d %H:%M:%S"
+            )
+            with self._conn:
+                self._conn.execute("BEGIN")
+                # 旧形式は新しい順なので、古い順に挿入して id の順序を揃える
+                self._conn.executemany(
+                    "INSERT INTO entries(text, created_at) VALUES (?, ?)",
+                    [(text, created_at) for text in reversed(legacy) if text],
+                )
+            os.replace(HISTORY_FILE, HISTORY_FILE + ".migrated")
+            print(f"Imported {len(legacy)} history item(s) into {HISTORY_DB}")
         except Exception as e:
-            print(f"Failed to load local history: {e}")
-            return []
+            print(f"Failed to import local history: {e}")
 
-    def _save_history(self):
-        try:
-            with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-                json.dump(self._history, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"Failed to save local history: {e}")
+    def _build_suggestions(self):
+        texts: List[str] = []
+        if self._conn is not None:
+            try:
+                with self._lock:
+                    rows = self._conn.execute("SELECT text FROM entries ORDER BY id").fetchall()
+                texts = [row[0] for row in rows]
+            except Exception as e:
+                print(f"Failed to load history for suggestions: {e}")
 
-    def add(self, text: str):
-        if not text:
+        self._suggestions.add_many(texts)
+        with self._lock:
+            pending = self._pending_suggestions
+            self._pending_suggestions = []
+            self._suggestions_ready = True
+        self._suggestions.add_many(pending)
+
+    def _load_last_text(self) -> Optional[str]:
+        row = self._conn.execute(
+            "SELECT text FROM entries ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    def add(self, text: str, sheet: str = ""):
+        if not text or self._conn is None:
             return
-        
+
         with self._lock:
             # 重複排除（直近と同じなら追加しない）
-            if self._history and self._history[0] == text:
+            if self._last_text == text:
                 return
-            
-            self._history.insert(0, text)
-            if len(self._history) > MAX_HISTORY:
-                self._history = self._history[:MAX_HISTORY]
-            self._save_history()
+
+            try:
+                self._conn.execute(
+                    "INSERT INTO entries(text, created_at, sheet) VALUES (?, ?, ?)",
+                    (text, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), sheet or ""),
+                )
+                self._last_text = text
+            except Exception as e:
+                print(f"Failed to save local history: {e}")
+
+            if not self._suggestions_ready:
+                self._pending_suggestions.append(text)
+                return
+        self._suggestions.add(text)
+
+    def suggest(self, query: str, limit: int = 5) -> List[str]:
+        """入力途中の文字列に対する補完候補（インデックス構築前は空）"""
+        if not self._suggestions_ready:
+            return []
+        return self._suggestions.search(query, limit)
 
     def get_latest(self, count: int = 5) -> List[str]:
+        if self._conn is None:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text FROM entries ORDER BY id DESC LIMIT ?", (count,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def search(self, query: str, limit: int = 20) -> List[Dict]:
+        """
+        本文・タイムスタンプ・シート名からキーワード検索し、新しい順に返す。
+        trigram は3文字未満を索引できないため、短いクエリは LIKE で探す。
+        """
+        query = (query or "").strip()
+        if not query or self._conn is None:
+            return []
+
+        use_fts = self._fts_tokenizer is not None and (
+            self._fts_tokenizer != "trigram" or len(query) >= 3
+        )
         with self._lock:
-            return self._history[:count]
+            try:
+                if use_fts:
+                    phrase = '"' + query.replace('"', '""') + '"'
+                    rows = self._conn.execute(
+                        "SELECT e.id, e.text, e.created_at, e.sheet"
+                        " FROM entries_fts JOIN entries e ON e.id = entries_fts.rowid"
+                        " WHERE entries_fts MATCH ?"
+                        " ORDER BY entries_fts.rowid DESC LIMIT ?",
+                        (phrase, limit),
+                    ).fetchall()
+                else:
+                    pattern = (
+                        "%"
+                        + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+                        + "%"
+                    )
+                    rows = self._conn.execute(
+                        "SELECT id, text, created_at, sheet FROM entries"
+                        " WHERE text LIKE ? ESCAPE '\\' OR created_at LIKE ? ESCAPE '\\'"
+                        " OR sheet LIKE ? ESCAPE '\\'"
+                        " ORDER BY id DESC LIMIT ?",
+                        (pattern, pattern, pattern, limit),
+                    ).fetchall()
+            except Exception as e:
+                print(f"History search failed: {e}")
+                return []
+
+        return [
+            {"id": r[0], "text": r[1], "created_at": r[2], "sheet": r[3]} for r in rows
+        ]
 
     def clear(self):
+        if self._conn is None:
+            return
         with self._lock:
-            self._history = []
-            self._save_history()
+            try:
+                with self._conn:
+                    self._conn.execute("BEGIN")
+                    self._conn.execute("DELETE FROM entries")
+                    if self._fts_tokenizer is not None:
+                        self._conn.execute(
+                            "INSERT INTO entries_fts(entries_fts) VALUES ('delete-all')"
+                        )
+                self._last_text = None
+            except Exception as e:
+                print(f"Failed to clear local history: {e}")
+            if self._suggestions_ready:
+                self._suggestions = SuggestionIndex()
+            else:
+                self._pending_suggestions = []
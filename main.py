@@ -1,4 +1,6 @@
-import json
+# 起動時間の計測を最初に開始する（ここより前に重い import を置かない）
+from startup_report import startup
+
 import os
 import subprocess
 import sys
@@ -6,39 +8,18 @@ import threading
 import time
 import webbrowser
 
-import pystray
-from PIL import Image, ImageDraw
-from pynput import keyboard
-
 import config
-from sheet_manager import SheetManager
-from ui import InputWindow
-from local_history import LocalHistory
-
-# Ensure we can find local modules
-
-SETTINGS_FILE = os.path.join(config.BASE_DIR, "settings.json")
-
-
-def load_settings():
-    try:
-        if os.path.exists(SETTINGS_FILE):
-            with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-    except Exception as e:
-        print(f"Failed to load settings: {e}")
-    return {}
-
+from hotkey_listener import HotkeyListener, parse_hotkey, windows_modifier_probe
+from metrics import metrics
 
-def save_settings(settings: dict):
-    try:
-        with open(SETTINGS_FILE, "w", encoding="utf-8") as f:
-            json.dump(settings, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"Failed to save settings: {e}")
+# sheet_manager / local_history / pystray / PIL / pynput / customtkinter / tkinterdnd2 は main() の中で、
+# ホットキー受付 → キュー・履歴 → 入力ウィンドウ → トレイの順に必要になった時点で import する
 
+# Ensure we can find local modules
 
 def create_image():
+    from PIL import Image, ImageDraw
+
     # Generate an icon with a 'S'
     width = 64
     height = 64
@@ -55,52 +36,76 @@ def create_image():
 
 def main():
     print("Starting Supanikki...")
-
-    # Initialize Sheet Manager
-    sheet_manager = SheetManager()
-    history_manager = LocalHistory()
-
-    settings = load_settings()
-    hotkey_value = settings.get("hotkey") or config.HOTKEY
-    if "sheet_next_hotkey" in settings:
-        sheet_next_hotkey = (settings.get("sheet_next_hotkey") or "").strip()
-    else:
-        sheet_next_hotkey = config.SHEET_NEXT_HOTKEY
-
-    if "sheet_prev_hotkey" in settings:
-        sheet_prev_hotkey = (settings.get("sheet_prev_hotkey") or "").strip()
-    else:
-        sheet_prev_hotkey = config.SHEET_PREV_HOTKEY
-
-    def on_submit(text):
-        print(f"Logging: {text}")
-        history_manager.add(text) # Save to local history
-        if sheet_manager.append_log(text):
+    if config.settings.errors:
+        # 設定が読めない・必須項目が無い場合は理由を表示して終了する
+        for error in config.settings.errors:
+            print(error)
+        return
+
+    # キューの再生・アップロード索引の読み込み・履歴の移行は、ホットキーの受付を始めてから行う
+    sheet_manager = None
+    history_manager = None
+
+    def run_in_background(func, *args):
+        """非同期エンジンが有効ならそのループ/プールで、無効ならスレッドを立てて実行する"""
+        if sheet_manager.engine is not None:
+            return sheet_manager.engine.submit(func, *args)
+        threading.Thread(target=func, args=args, daemon=True).start()
+
+    def report_logged(ok: bool):
+        if ok:
             print("Successfully logged to Sheet.")
         else:
             print("Failed to log to Sheet. Check config/connection.")
 
-    def on_upload(file_path: str) -> str:
-        return sheet_manager.upload_file_to_drive(file_path)
+    def on_submit(text):
+        print(f"Logging: {text}")
+        history_manager.add(text, sheet=sheet_manager.sheet_title or "") # Save to local history
+        if sheet_manager.engine is not None:
+            # 結果はイベントループ上で待ち、呼び出し元のスレッドはすぐ返す
+            future = sheet_manager.engine.run(sheet_manager.append_log_async(text))
+            future.add_done_callback(
+                lambda f: report_logged(not f.cancelled() and f.exception() is None and f.result())
+            )
+            return
+        report_logged(sheet_manager.append_log(text))
+
+    def on_upload(file_path: str, progress_callback=None) -> str:
+        return sheet_manager.upload_file_to_drive(file_path, progress_callback=progress_callback)
+
+    def on_upload_image(data: bytes, file_name: str, mimetype: str, progress_callback=None) -> str:
+        return sheet_manager.upload_bytes_to_drive(
+            data, file_name, mimetype, progress_callback=progress_callback
+        )
 
     window = None
 
     def get_current_sheet_name() -> str:
-        return sheet_manager.sheet_title or settings.get("sheet_name", "")
+        return sheet_manager.sheet_title or config.SHEET_NAME
+
+    def apply_sheet_title(title: str):
+        # シート切り替えのたびには書き込まず、まとめて settings.json に保存する
+        config.settings.update(sheet_name=title)
+        if window:
+            # ホットキー/トレイのスレッドから呼ばれるので Tk のスレッドで更新する
+            window.root.after(0, lambda: window.update_sheet_name(title))
 
     def set_active_sheet(title: str) -> bool:
         if sheet_manager.set_sheet_by_title(title):
-            settings["sheet_name"] = title
-            save_settings(settings)
+            apply_sheet_title(title)
             print(f"Active sheet set to: {title}")
-            if window:
-                window.update_sheet_name(title)
             return True
         print(f"Failed to select sheet: {title}")
         return False
 
     def cycle_sheet(direction: int):
-        titles = sheet_manager.get_sheet_titles()
+        if sheet_manager is None:
+            print("Still starting up. Try switching sheets again in a moment.")
+            return
+        # キャッシュ済みの一覧で即座に切り替え、確認はバックグラウンドで行う
+        titles = sheet_manager.get_cached_sheet_titles()
+        if not titles:
+            titles = sheet_manager.get_sheet_titles()
         if not titles:
             print("No sheets available or failed to connect.")
             return
@@ -118,39 +123,27 @@ def main():
             idx = 0
 
         new_title = titles[(idx + direction) % len(titles)]
-        set_active_sheet(new_title)
-        schedule_hotkey_reset()
+        generation = sheet_manager.select_sheet_optimistic(new_title)
+        apply_sheet_title(new_title)
+        print(f"Active sheet set to: {new_title}")
+
+        def confirm():
+            if sheet_manager.confirm_sheet(new_title, generation) is False:
+                print(
+                    f"Sheet '{new_title}' was not found. "
+                    f"Switched to: {sheet_manager.sheet_title}"
+                )
+                apply_sheet_title(sheet_manager.sheet_title)
 
-    # Initialize UI
-    window = InputWindow(
-        submit_callback=on_submit, 
-        upload_callback=on_upload,
-        history_manager=history_manager,
-        sheet_name_provider=get_current_sheet_name,
-    )
+        run_in_background(confirm)
 
-    # ホットキーの状態管理
-    hotkey_listener = None
-    hotkey_lock = threading.Lock()
+    # ホットキーの状態管理（リスナーは1つだけ常駐させ、押下のたびに作り直さない）
+    hotkey_listener = HotkeyListener(modifier_probe=windows_modifier_probe())
     last_trigger_time = [0]  # リスト参照で共有
     debounce_interval = 0.3  # 300ms以内の連続呼び出しを防ぐ
-    last_hotkey_reset = [0]
-    hotkey_reset_lock = threading.Lock()
-    hotkey_reset_interval = 0.5  # 連続リセット抑制
-
-    def schedule_hotkey_reset():
-        """押下状態のスタック対策としてホットキーを再登録する"""
-        now = time.time()
-        if now - last_hotkey_reset[0] < hotkey_reset_interval:
-            return
-        last_hotkey_reset[0] = now
-
-        def worker():
-            time.sleep(0.05)
-            with hotkey_reset_lock:
-                register_hotkey()
-
-        threading.Thread(target=worker, daemon=True).start()
+    # ウィンドウ生成前にホットキーが押された場合は、生成後に表示する
+    window_lock = threading.Lock()
+    pending_toggle = [False]
 
     def toggle_window():
         """ホットキー押下時のコールバック（デバウンス処理付き）"""
@@ -159,143 +152,128 @@ def main():
             return  # 連続呼び出しを無視
         last_trigger_time[0] = current_time
 
+        metrics.incr("hotkey.toggle")
         try:
+            with window_lock:
+                if window is None:
+                    pending_toggle[0] = True
+                    return
+            if not window.is_visible:
+                # 表示までの時間を InputWindow.show で記録する
+                metrics.begin("hotkey_to_visible")
             window.thread_safe_toggle()
         except Exception as e:
             print(f"Hotkey callback error: {e}")
-        finally:
-            schedule_hotkey_reset()
-
-    def convert_hotkey_to_pynput(hotkey_str: str):
-        """
-        ホットキー文字列をpynput形式に変換
-        例: 'ctrl+shift+space' -> '<ctrl>+<shift>+<space>'
-        """
-        parts = [p.strip().lower() for p in hotkey_str.split("+")]
-        pynput_parts = []
-
-        for part in parts:
-            if part in ("ctrl", "control"):
-                pynput_parts.append("<ctrl>")
-            elif part in ("shift",):
-                pynput_parts.append("<shift>")
-            elif part in ("alt",):
-                pynput_parts.append("<alt>")
-            elif part in ("win", "windows", "cmd", "super"):
-                pynput_parts.append("<cmd>")
-            elif part == "space":
-                pynput_parts.append("<space>")
-            elif part == "enter":
-                pynput_parts.append("<enter>")
-            elif part == "esc":
-                pynput_parts.append("<esc>")
-            elif part == "tab":
-                pynput_parts.append("<tab>")
-            elif len(part) == 1:
-                pynput_parts.append(part)
-            else:
-                pynput_parts.append(f"<{part}>")
-
-        return "+".join(pynput_parts) if pynput_parts else None
 
     def register_hotkey():
-        """ホットキーを登録（pynput使用）"""
-        nonlocal hotkey_listener
-        with hotkey_lock:
-            try:
-                # 既存のリスナーを停止
-                if hotkey_listener is not None:
-                    try:
-                        hotkey_listener.stop()
-                    except Exception:
-                        pass
-                    hotkey_listener = None
-
-                hotkey_map = {}
-                registered_hotkeys = set()
-
-                # Toggle window hotkey
-                pynput_hotkey = convert_hotkey_to_pynput(hotkey_value)
-                if pynput_hotkey:
-                    hotkey_map[pynput_hotkey] = toggle_window
-                    registered_hotkeys.add(pynput_hotkey)
-                else:
-                    print(f"Invalid hotkey format: {hotkey_value}")
-
-                # Sheet switching hotkeys
-                if sheet_next_hotkey:
-                    pynput_next = convert_hotkey_to_pynput(sheet_next_hotkey)
-                    if pynput_next:
-                        if pynput_next in registered_hotkeys:
-                            print("sheet_next_hotkey conflicts with existing hotkey; skipping.")
-                        else:
-                            hotkey_map[pynput_next] = lambda: cycle_sheet(1)
-                            registered_hotkeys.add(pynput_next)
-                    else:
-                        print(f"Invalid sheet_next_hotkey: {sheet_next_hotkey}")
-
-                if sheet_prev_hotkey:
-                    pynput_prev = convert_hotkey_to_pynput(sheet_prev_hotkey)
-                    if pynput_prev:
-                        if pynput_prev in registered_hotkeys:
-                            print("sheet_prev_hotkey conflicts with existing hotkey; skipping.")
-                        else:
-                            hotkey_map[pynput_prev] = lambda: cycle_sheet(-1)
-                            registered_hotkeys.add(pynput_prev)
-                    else:
-                        print(f"Invalid sheet_prev_hotkey: {sheet_prev_hotkey}")
-
-                if not hotkey_map:
-                    print("No valid hotkeys to register.")
-                    return
+        """ホットキーを登録する（初回はリスナーを起動し、以降は組み合わせだけ差し替える）"""
+        bindings = {}
+        for name, value, callback in (
+            ("hotkey", config.HOTKEY, toggle_window),
+            ("sheet_next_hotkey", config.SHEET_NEXT_HOTKEY, lambda: cycle_sheet(1)),
+            ("sheet_prev_hotkey", config.SHEET_PREV_HOTKEY, lambda: cycle_sheet(-1)),
+        ):
+            if not value:
+                continue
+            if value in bindings:
+                print(f"{name} conflicts with existing hotkey; skipping.")
+                continue
+            bindings[value] = callback
 
-                # GlobalHotKeysを使用して登録
-                try:
-                    hotkey_listener = keyboard.GlobalHotKeys(hotkey_map)
-                    hotkey_listener.start()
-                    print("Hotkeys registered successfully.")
-                except Exception as e:
-                    print(f"Failed to register hotkeys: {e}")
-                    if pynput_hotkey:
-                        try:
-                            hotkey_listener = keyboard.GlobalHotKeys({pynput_hotkey: toggle_window})
-                            hotkey_listener.start()
-                            print("Hotkey registered successfully (toggle only).")
-                        except Exception as e2:
-                            print(f"Failed to register toggle hotkey only: {e2}")
-            except Exception as e:
-                print(f"Failed to register hotkey: {e}")
-                import traceback
+        try:
+            result = hotkey_listener.set_bindings(bindings)
+            for value, ok in result.items():
+                if not ok:
+                    print(f"Invalid or conflicting hotkey: {value}")
+            if not any(result.values()):
+                print("No valid hotkeys to register.")
+                return
+            hotkey_listener.start()
+            print("Hotkeys registered successfully.")
+        except Exception as e:
+            print(f"Failed to register hotkey: {e}")
+            import traceback
 
-                traceback.print_exc()
+            traceback.print_exc()
 
-    # Setup Global Hotkey
-    register_hotkey()
+    # Setup Global Hotkey（入力ウィンドウより先に受付を開始する）
+    with startup.section("register hotkey"):
+        register_hotkey()
+    startup.mark("hotkey ready")
 
-    # ホットキーの監視スレッド（定期的に状態確認して自動復旧）
-    def monitor_hotkey():
-        while True:
-            try:
-                time.sleep(60)  # 60秒ごとにチェック
-                with hotkey_lock:
-                    if hotkey_listener is None or not hotkey_listener.running:
-                        print("Hotkey listener is down. Re-registering...")
-                        register_hotkey()
-            except Exception as e:
-                print(f"Hotkey monitor error: {e}")
+    # Initialize Sheet Manager
+    with startup.section("init SheetManager / LocalHistory"):
+        from sheet_manager import SheetManager, preload_google_modules
+        from local_history import LocalHistory
+
+        sheet_manager = SheetManager()
+        history_manager = LocalHistory()
+
+    if config.METRICS_ENABLED:
+        metrics.configure(
+            os.path.join(config.BASE_DIR, "metrics.jsonl"),
+            max_bytes=config.METRICS_FILE_MAX_BYTES,
+            backup_count=config.METRICS_FILE_BACKUPS,
+        )
+        metrics.start_exporter(config.METRICS_EXPORT_INTERVAL)
+
+    def on_settings_changed(changed: dict):
+        """settings.json の変更（トレイからの変更・外部での編集）を再起動せずに反映する"""
+        if changed.keys() & {"hotkey", "sheet_next_hotkey", "sheet_prev_hotkey"}:
+            register_hotkey()
+        if "sheet_name" in changed:
+            title = config.SHEET_NAME
+            if title and title != sheet_manager.sheet_title:
+                generation = sheet_manager.select_sheet_optimistic(title)
+                apply_sheet_title(title)
+                print(f"Active sheet set to: {title}")
+                run_in_background(sheet_manager.confirm_sheet, title, generation)
+        if "drive_folder_id" in changed:
+            # SheetManager は次のアップロードで新しいフォルダを確認し直す
+            print(f"Upload folder set to: {config.DRIVE_FOLDER_ID}")
+
+    config.settings.subscribe(on_settings_changed)
+    config.settings.start_watching()
 
-    monitor_thread = threading.Thread(target=monitor_hotkey, daemon=True)
-    monitor_thread.start()
+    # Initialize UI
+    with startup.section("import ui (customtkinter, tkinterdnd2)"):
+        from ui import InputWindow
+    with startup.section("create window"):
+        new_window = InputWindow(
+            submit_callback=on_submit,
+            upload_callback=on_upload,
+            history_manager=history_manager,
+            sheet_name_provider=get_current_sheet_name,
+            upload_concurrency=config.UPLOAD_CONCURRENCY,
+            image_upload_callback=on_upload_image,
+            clipboard_image_options={
+                "format": config.CLIPBOARD_IMAGE_FORMAT,
+                "quality": config.CLIPBOARD_IMAGE_QUALITY,
+                "max_dimension": config.CLIPBOARD_IMAGE_MAX_DIMENSION,
+            },
+            io_executor=sheet_manager.engine,
+            upload_executor=sheet_manager.engine.uploads if sheet_manager.engine is not None else None,
+            instant_show=config.INSTANT_SHOW,
+        )
+    with window_lock:
+        window = new_window
+        show_now = pending_toggle[0]
+    startup.mark("window ready")
+    if show_now:
+        window.thread_safe_toggle()
+
+    # Google クライアント一式の読み込みと認証・シート取得をバックグラウンドで済ませておく
+    if config.PREWARM:
+        run_in_background(sheet_manager.prewarm)
+    else:
+        run_in_background(preload_google_modules)
 
     # Setup System Tray
     def on_quit(icon, item):
+        metrics.export()
+        config.settings.stop()
         icon.stop()
-        with hotkey_lock:
-            if hotkey_listener is not None:
-                try:
-                    hotkey_listener.stop()
-                except Exception:
-                    pass
+        hotkey_listener.stop()
         window.quit()
 
     def on_toggle_tray(icon, item):
@@ -383,8 +361,7 @@ def main():
 
                 # まず登録できるか試す（パースできるか確認）
                 try:
-                    test_hotkey = convert_hotkey_to_pynput(new_hotkey)
-                    if not test_hotkey:
+                    if not parse_hotkey(new_hotkey):
                         raise ValueError("Invalid hotkey format")
                 except Exception as e:
                     try:
@@ -395,24 +372,13 @@ def main():
                         print(f"Invalid hotkey: {e}")
                     return
 
-                nonlocal hotkey_value, settings
-                hotkey_value = new_hotkey
-                settings["hotkey"] = new_hotkey
-                save_settings(settings)
-
-                # ホットキーを再登録
-                register_hotkey()
-
-                # 変更完了を通知し、再起動を促す
+                # 保存すると on_settings_changed でホットキーが登録し直される（再起動は不要）
+                config.settings.update(hotkey=new_hotkey)
                 try:
-                    result = mb.askyesno(
+                    mb.showinfo(
                         "ショートカット変更完了",
-                        f"ショートカットキーを '{new_hotkey}' に変更しました。\n\n"
-                        "変更を確実に反映させるため、アプリの再起動を推奨します。\n"
-                        "今すぐ再起動しますか？",
+                        f"ショートカットキーを '{new_hotkey}' に変更しました。",
                     )
-                    if result:
-                        on_restart(icon, item)
                 except Exception:
                     print(f"Hotkey changed to: {new_hotkey}")
 
@@ -438,24 +404,66 @@ def main():
             return
         on_quit(icon, item)
 
-    menu = pystray.Menu(
-        pystray.MenuItem("Input", on_toggle_tray),
-        pystray.MenuItem("Open Spreadsheet", on_open_sheet),
-        pystray.MenuItem("Next Sheet", on_next_sheet),
-        pystray.MenuItem("Previous Sheet", on_prev_sheet),
-        pystray.MenuItem("Change Sheet", on_change_sheet),
-        pystray.MenuItem("Open Upload Folder", on_open_upload_folder),
-        pystray.MenuItem("Change Hotkey", on_change_hotkey),
-        pystray.MenuItem("Restart", on_restart),
-        pystray.MenuItem("Quit", on_quit),
-    )
+    def sync_status_text(item=None) -> str:
+        status = sheet_manager.sync_worker.status()
+        queued = sheet_manager.queue.size()
+        state = status["state"]
+        if state == "draining":
+            return f"Sync: sending ({queued} queued)"
+        if state == "backing_off" and status["next_retry_at"]:
+            retry_at = time.strftime("%H:%M:%S", time.localtime(status["next_retry_at"]))
+            return f"Sync: offline, retry at {retry_at} ({queued} queued)"
+        if queued:
+            return f"Sync: idle ({queued} queued)"
+        return "Sync: idle"
+
+    def queue_status_text(item=None) -> str:
+        """未送信件数と、直近の再送で書き込まれた行がキューで待っていた時間"""
+        lag = metrics.get_gauge("sync.last_lag_s")
+        lag_text = "-" if lag is None else f"{lag:.0f}s"
+        return f"Queue: {sheet_manager.queue.size()} | Last sync lag: {lag_text}"
+
+    def run_tray():
+        with startup.section("import pystray / PIL"):
+            import pystray
+
+            image = create_image()
+
+        menu = pystray.Menu(
+            pystray.MenuItem(sync_status_text, None, enabled=False),
+            pystray.MenuItem(queue_status_text, None, enabled=False),
+            pystray.MenuItem("Input", on_toggle_tray),
+            pystray.MenuItem("Open Spreadsheet", on_open_sheet),
+            pystray.MenuItem("Next Sheet", on_next_sheet),
+            pystray.MenuItem("Previous Sheet", on_prev_sheet),
+            pystray.MenuItem("Change Sheet", on_change_sheet),
+            pystray.MenuItem("Open Upload Folder", on_open_upload_folder),
+            pystray.MenuItem("Change Hotkey", on_change_hotkey),
+            pystray.MenuItem("Restart", on_restart),
+            pystray.MenuItem("Quit", on_quit),
+        )
+
+        icon = pystray.Icon("Supanikki", image, "Supanikki", menu)
+
+        def on_sync_state_change(status):
+            # トレイのツールチップとメニュー表示を同期状態に合わせて更新
+            try:
+                icon.title = f"Supanikki - {sync_status_text()}\n{queue_status_text()}"
+                icon.update_menu()
+            except Exception:
+                pass
 
-    icon = pystray.Icon("Supanikki", create_image(), "Supanikki", menu)
+        sheet_manager.sync_worker.on_state_change = on_sync_state_change
+        startup.mark("tray ready")
+        icon.run()
 
     # Run Tray Icon in a separate thread because Tkinter needs the main thread
-    tray_thread = threading.Thread(target=icon.run, daemon=True)
+    tray_thread = threading.Thread(target=run_tray, daemon=True)
     tray_thread.start()
 
+    print(startup.report())
+    print(f"Time to hotkey ready: {startup.elapsed('hotkey ready') * 1000:.0f} ms")
+
     # Start GUI Main Loop
     print("App is running. Press hotkey to toggle.")
     window.start_mainloop()
@@ -0,0 +1,174 @@
+import bisect
+import json
+import logging
+import logging.handlers
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+# ヒストグラムのバケット上限（ms）。最後のバケットはそれ以上すべて
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000, 60000]
+
+
+class Histogram:
+    """固定バケットのヒストグラム（パーセンタイルはバケット上限で近似する）"""
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.last = 0.0
+
+    def observe(self, value_ms: float):
+        self.buckets[bisect.bisect_left(BUCKETS_MS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        self.max = max(self.max, value_ms)
+        self.last = value_ms
+
+    def percentile(self, p: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = p / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count, 2) if self.count else 0.0,
+            "p50_ms": self.percentile(50),
+            "p90_ms": self.percentile(90),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max, 2),
+            "last_ms": round(self.last, 2),
+            "buckets": {
+                (f"le_{BUCKETS_MS[i]}" if i < len(BUCKETS_MS) else "inf"): n
+                for i, n in enumerate(self.buckets)
+                if n
+            },
+        }
+
+
+class Metrics:
+    """
+    ホットパスの所要時間（ヒストグラム）・カウンタ・現在値を記録する。
+    - timer(): with 文の区間を計測
+    - begin()/end(): スレッドをまたぐ区間（ホットキー → ウィンドウ表示など）を計測
+    - add_source(): BatchWriter.stats() のような外部の統計を書き出しに含める
+    export() で metrics.jsonl（サイズでローテーション）にスナップショットを1行追記する。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, float] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._spans: Dict[str, float] = {}
+        self._sources: Dict[str, Callable[[], dict]] = {}
+        self._logger: Optional[logging.Logger] = None
+        self._exporter: Optional[threading.Thread] = None
+
+    def incr(self, name: str, n: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def get_gauge(self, name: str, default: float = None):
+        with self._lock:
+            return self._gauges.get(name, default)
+
+    def observe(self, name: str, value_ms: float):
+        with self._lock:
+            hist = self._histograms.get(name)
+            if hist is None:
+                hist = self._histograms[name] = Histogram()
+            hist.observe(value_ms)
+
+    @contextmanager
+    def timer(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, (time.perf_counter() - started) * 1000)
+
+    def begin(self, name: str):
+        with self._lock:
+            self._spans[name] = time.perf_counter()
+
+    def end(self, name: str) -> Optional[float]:
+        """begin() からの経過時間(ms)を記録して返す。begin されていなければ何もしない"""
+        with self._lock:
+            started = self._spans.pop(name, None)
+        if started is None:
+            return None
+        elapsed = (time.perf_counter() - started) * 1000
+        self.observe(name, elapsed)
+        return elapsed
+
+    def add_source(self, name: str, func: Callable[[], dict]):
+        with self._lock:
+            self._sources[name] = func
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            snap = {
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "histograms": {name: h.summary() for name, h in self._histograms.items()},
+            }
+            sources = dict(self._sources)
+        for name, func in sources.items():
+            try:
+                snap[name] = func()
+            except Exception as e:
+                snap[name] = {"error": str(e)}
+        return snap
+
+    def configure(self, path: str, max_bytes: int = 1024 * 1024, backup_count: int = 3):
+        logger = logging.getLogger("supanikki.metrics")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        handler = logging.handlers.RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        self._logger = logger
+
+    def export(self):
+        if self._logger is None:
+            return
+        try:
+            self._logger.info(json.dumps(self.snapshot(), ensure_ascii=False))
+        except Exception as e:
+            print(f"Failed to export metrics: {e}")
+
+    def start_exporter(self, interval: float):
+        if self._exporter is not None or interval <= 0:
+            return
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.export()
+
+        self._exporter = threading.Thread(target=run, name="metrics-export", daemon=True)
+        self._exporter.start()
+
+
+metrics = Metrics()
@@ -2,47 +2,216 @@ import json
 import os
 import threading
 import time
+from collections import deque
 from datetime import datetime
-from typing import List, Dict, Optional
+from itertools import islice
+from typing import Deque, List, Dict, Optional
 
 import config
 
+# 旧形式（配列を丸ごと書き直すJSON）。このファイルが残っていればロード時にジャーナルへ移行する
 QUEUE_FILE = os.path.join(config.BASE_DIR, "offline_queue.json")
+# 追記専用ジャーナル（1行1レコードのJSON Lines）
+JOURNAL_FILE = os.path.join(config.BASE_DIR, "offline_queue.journal")
+# ack済みレコードがこの件数と残りの件数の多い方を超えたらジャーナルを詰め直す
+# （詰め直しで書く量は直前の ack の件数以下なので、N 件を送り切るまでの書き込みは O(N)）
+COMPACT_THRESHOLD = 500
+
 
 class OfflineQueue:
+    """
+    オフライン時の未送信データを保持するキュー。
+    ファイルには追記のみを行う:
+      {"op": "add", "id": 1, "text": ..., "timestamp": ..., "sheet": ..., "added_at": ...}
+      {"op": "ack", "id": 1}
+      {"op": "migrated"}  （旧形式の内容を取り込み済み。旧ファイルの改名に失敗しても二重に取り込まない）
+    ack 済みが残りの件数以上に溜まったら、生きているレコードだけでジャーナルを作り直す（compaction）。
+    """
+
     def __init__(self):
         self._lock = threading.Lock()
-        self._queue: List[Dict] = self._load_queue()
+        self._queue: Deque[Dict] = deque()
+        self._next_id = 1
+        self._acked_records = 0
+        self._journal = None
+        self._legacy_migrated = False
+        self._load_queue()
 
-    def _load_queue(self) -> List[Dict]:
-        if not os.path.exists(QUEUE_FILE):
-            return []
+    def _load_queue(self):
+        if os.path.exists(JOURNAL_FILE):
+            self._replay_journal()
+        # ジャーナルの有無ではなく旧ファイルの有無で判断する
+        # （前回の移行が失敗した後に add() でジャーナルが作られていても取りこぼさない）
+        if os.path.exists(QUEUE_FILE):
+            self._migrate_legacy_file()
+        self._open_journal()
+
+    def _migrate_legacy_file(self):
+        if self._legacy_migrated:
+            # 取り込みは済んでいて、旧ファイルの改名だけが失敗していた
+            self._retire_legacy_file()
+            return
         try:
             with open(QUEUE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
+                legacy = json.load(f)
+        except Exception as e:
+            print(f"Failed to load offline queue: {e}")
+            return
+
+        # 旧形式の分が古いので先頭に置き、ジャーナルの分と合わせて id を振り直す
+        journal_entries = list(self._queue)
+        journal_next_id = self._next_id
+        merged = [dict(item) for item in legacy] + [dict(entry) for entry in journal_entries]
+        for i, entry in enumerate(merged, start=1):
+            entry["id"] = i
+        self._queue = deque(merged)
+        self._next_id = len(merged) + 1
+        self._legacy_migrated = True
+
+        try:
+            self._write_snapshot()
+        except Exception as e:
+            # ジャーナルは元のままなので、メモリ上もジャーナルの内容に戻す（旧形式の分は次回起動時に再度移行する）
+            print(f"Failed to migrate offline queue: {e}")
+            self._queue = deque(journal_entries)
+            self._next_id = journal_next_id
+            self._legacy_migrated = False
+            return
+        self._acked_records = 0
+        print(f"Migrated {len(legacy)} queued item(s) to {JOURNAL_FILE}")
+        self._retire_legacy_file()
+
+    def _retire_legacy_file(self):
+        try:
+            # 移行元は念のため残しておく（再移行はしない）
+            os.replace(QUEUE_FILE, QUEUE_FILE + ".migrated")
+        except Exception as e:
+            print(f"Failed to rename migrated offline queue file: {e}")
+
+    def _replay_journal(self):
+        entries: Dict[int, Dict] = {}
+        acked = 0
+        valid_size = 0
+        try:
+            with open(JOURNAL_FILE, "rb") as f:
+                data = f.read()
         except Exception as e:
             print(f"Failed to load offline queue: {e}")
-            return []
+            return
+
+        offset = 0
+        while offset < len(data):
+            end = data.find(b"\n", offset)
+            if end == -1:
+                # 改行で終わっていない末尾は書き込み途中でクラッシュした行
+                print("Discarding incomplete record at end of offline queue journal.")
+                break
+            line = data[offset:end]
+            offset = end + 1
+            if not line.strip():
+                valid_size = offset
+                continue
+            try:
+                record = json.loads(line.decode("utf-8"))
+            except Exception:
+                print("Skipping corrupt record in offline queue journal.")
+                valid_size = offset
+                continue
+            valid_size = offset
+
+            op = record.pop("op", None)
+            record_id = record.get("id")
+            if op == "migrated":
+                self._legacy_migrated = True
+                continue
+            if op == "add":
+                entries[record_id] = record
+            elif op == "ack":
+                if entries.pop(record_id, None) is not None:
+                    acked += 1
+            self._next_id = max(self._next_id, int(record_id or 0) + 1)
 
-    def _save_queue(self):
+        if valid_size < len(data):
+            # 壊れた末尾を切り落として、以降の追記が正しい行境界から始まるようにする
+            try:
+                with open(JOURNAL_FILE, "r+b") as f:
+                    f.truncate(valid_size)
+            except Exception as e:
+                print(f"Failed to repair offline queue journal: {e}")
+
+        # add はid順に書かれているので dict の挿入順がそのままキュー順になる
+        self._queue.extend(entries.values())
+        self._acked_records = acked
+
+    def _open_journal(self):
+        try:
+            self._journal = open(JOURNAL_FILE, "a", encoding="utf-8")
+        except Exception as e:
+            print(f"Failed to open offline queue journal: {e}")
+            self._journal = None
+
+    def _append_records(self, records: List[Dict]):
+        if self._journal is None:
+            self._open_journal()
+            if self._journal is None:
+                return
         try:
-            with open(QUEUE_FILE, "w", encoding="utf-8") as f:
-                json.dump(self._queue, f, ensure_ascii=False, indent=2)
+            self._journal.write(
+                "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+            )
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
         except Exception as e:
             print(f"Failed to save offline queue: {e}")
 
-    def add(self, text: str, timestamp: str = None):
+    def _write_snapshot(self):
+        """生きているレコードだけのジャーナルを一時ファイルに書き、アトミックに差し替える"""
+        tmp_path = JOURNAL_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            if self._legacy_migrated and os.path.exists(QUEUE_FILE):
+                # 旧ファイルが改名できずに残っている間は、取り込み済みの印を詰め直しでも消さない
+                f.write(json.dumps({"op": "migrated"}) + "\n")
+            for entry in self._queue:
+                record = {"op": "add"}
+                record.update(entry)
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, JOURNAL_FILE)
+
+    def _compact_if_needed(self):
+        if self._acked_records < max(COMPACT_THRESHOLD, len(self._queue)) and self._queue:
+            return
+        if self._acked_records == 0:
+            return
+        try:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            self._write_snapshot()
+            self._acked_records = 0
+        except Exception as e:
+            print(f"Failed to compact offline queue journal: {e}")
+        self._open_journal()
+
+    def add(self, text: str, timestamp: str = None, sheet: Optional[str] = None):
+        """sheet は書き込み先のシート名（None なら再送時に選択中のシートへ書く）"""
         if timestamp is None:
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-        entry = {
-            "text": text,
-            "timestamp": timestamp,
-            "added_at": time.time()
-        }
+
         with self._lock:
+            entry = {
+                "id": self._next_id,
+                "text": text,
+                "timestamp": timestamp,
+                "sheet": sheet,
+                "added_at": time.time(),
+            }
+            self._next_id += 1
             self._queue.append(entry)
-            self._save_queue()
+            record = {"op": "add"}
+            record.update(entry)
+            self._append_records([record])
         print(f"Added to offline queue: {text[:20]}...")
 
     def peek(self) -> Optional[Dict]:
@@ -53,14 +222,41 @@ class OfflineQueue:
         with self._lock:
             if not self._queue:
                 return None
-            item = self._queue.pop(0)
-            self._save_queue()
+            item = self._queue.popleft()
+            self._append_records([{"op": "ack", "id": item["id"]}])
+            self._acked_records += 1
+            self._compact_if_needed()
             return item
 
+    def peek_many(self, count: int) -> List[Dict]:
+        """先頭から最大 count 件を取り出さずに返す"""
+        with self._lock:
+            return list(islice(self._queue, max(0, count)))
+
+    def ack(self, items: List[Dict]) -> int:
+        """
+        送信が確定した items をキューから外す（まとめて1回追記）。
+        先頭から順に id が一致するものだけを外し、外した件数を返す。
+        """
+        ids = {item.get("id") for item in items}
+        with self._lock:
+            acked = []
+            while self._queue and self._queue[0].get("id") in ids:
+                acked.append(self._queue.popleft()["id"])
+            if acked:
+                self._append_records([{"op": "ack", "id": i} for i in acked])
+                self._acked_records += len(acked)
+                self._compact_if_needed()
+            return len(acked)
+
     def is_empty(self) -> bool:
         with self._lock:
             return len(self._queue) == 0
 
+    def size(self) -> int:
+        with self._lock:
+            return len(self._queue)
+
     def get_all(self) -> List[Dict]:
         with self._lock:
             return list(self._queue)
@@ -0,0 +1,195 @@
+import json
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional, Set
+
+from metrics import metrics
+
+# クォータエラーのたびに送信レートを半分にし、成功するたびに元のレートの 1/10 ずつ戻す（AIMD）
+SLOWDOWN_FACTOR = 0.5
+RECOVERY_STEP = 0.1
+MIN_RATE_FACTOR = 0.05
+# Retry-After が無いクォータエラーの待ち時間（秒）の初期値。続けて失敗するたびに倍にする
+DEFAULT_BACKOFF = 1.0
+# Drive は 429 ではなく 403 + この reason でレート制限を返すことがある
+QUOTA_REASONS = ("rateLimitExceeded", "userRateLimitExceeded")
+# reason が取れないときにメッセージから判断する目印（大文字小文字は区別しない）
+_QUOTA_MARKERS = ("rate_limit_exceeded", "resource_exhausted", "quota exceeded", "ratelimitexceeded")
+
+
+def _status(e: Exception) -> Optional[int]:
+    """gspread(APIError) / googleapiclient(HttpError) の HTTP ステータス"""
+    status = getattr(getattr(e, "response", None), "status_code", None)
+    if status is None:
+        status = getattr(getattr(e, "resp", None), "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def error_reasons(e: Exception) -> Set[str]:
+    """googleapiclient(HttpError) のエラー応答に含まれる reason（errors[].reason）の一覧"""
+    details = getattr(e, "error_details", None)
+    if not isinstance(details, list):
+        details = None
+        content = getattr(e, "content", None)
+        if content:
+            try:
+                data = json.loads(content.decode("utf-8") if isinstance(content, bytes) else content)
+                details = data["error"]["errors"]
+            except (ValueError, KeyError, TypeError, AttributeError):
+                details = None
+    return {d["reason"] for d in details or () if isinstance(d, dict) and isinstance(d.get("reason"), str)}
+
+
+def is_quota_error(e: Exception) -> bool:
+    """gspread(APIError) / googleapiclient(HttpError) のレート制限エラーかどうか"""
+    if _status(e) == 429:
+        return True
+    if error_reasons(e) & set(QUOTA_REASONS):
+        return True
+    message = str(e).lower()
+    return any(marker in message for marker in _QUOTA_MARKERS)
+
+
+def retry_after(e: Exception) -> Optional[float]:
+    """エラー応答の Retry-After（秒数または HTTP 日付）を秒で返す。無ければ None"""
+    value = None
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if headers is not None:
+        value = headers.get("Retry-After")
+    if value is None:
+        resp = getattr(e, "resp", None)
+        if resp is not None and hasattr(resp, "get"):
+            # httplib2.Response はヘッダー名が小文字
+            value = resp.get("retry-after")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class TokenBucket:
+    """
+    1分あたり per_minute 回（最大 burst 回まで連続可）のトークンバケット。
+    クォータエラーを受けたら penalize() で一定時間止め、レートを下げる。成功が続けば元に戻す。
+    """
+
+    def __init__(self, per_minute: float, burst: Optional[int] = None):
+        self.per_minute = max(1.0, float(per_minute))
+        self.burst = max(1, int(burst if burst is not None else self.per_minute // 6))
+        self._cond = threading.Condition()
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self.rate_factor = 1.0
+        self._consecutive_errors = 0
+
+    @property
+    def rate(self) -> float:
+        """現在の補充速度（回/秒）"""
+        return self.per_minute * self.rate_factor / 60.0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """トークンを1つ取る。取れるまで待ち、待った秒数を返す"""
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._blocked_until:
+                    self._cond.wait(self._blocked_until - now)
+                    continue
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return time.monotonic() - started
+                self._cond.wait((1.0 - self._tokens) / self.rate)
+
+    def penalize(self, wait: Optional[float], max_wait: float) -> float:
+        """クォータエラーを受けた。wait（Retry-After）秒、無ければ指数的に伸ばした秒数だけ止める"""
+        with self._cond:
+            self._consecutive_errors += 1
+            if wait is None:
+                wait = DEFAULT_BACKOFF * 2 ** (self._consecutive_errors - 1)
+            wait = min(max_wait, wait)
+            now = time.monotonic()
+            self._refill(now)
+            self._blocked_until = max(self._blocked_until, now + wait)
+            self._tokens = 0.0
+            self.rate_factor = max(MIN_RATE_FACTOR, self.rate_factor * SLOWDOWN_FACTOR)
+            self._cond.notify_all()
+            return wait
+
+    def on_success(self):
+        with self._cond:
+            self._consecutive_errors = 0
+            if self.rate_factor < 1.0:
+                self.rate_factor = min(1.0, self.rate_factor + RECOVERY_STEP)
+
+    def stats(self) -> dict:
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "per_minute": self.per_minute,
+                "rate_factor": round(self.rate_factor, 3),
+                "tokens": round(self._tokens, 2),
+                "blocked_for_s": round(max(0.0, self._blocked_until - time.monotonic()), 2),
+            }
+
+
+class RateLimiter:
+    """
+    API ごと（"sheets" / "drive"）のトークンバケットで呼び出しを待たせる。
+    call() はクォータエラーなら Retry-After に従って待ってから max_retries 回まで再試行するので、
+    呼び出し側には失敗ではなく待ち時間として見える。
+    """
+
+    def __init__(self, quotas: Dict[str, float], max_retries: int = 5, max_wait: float = 64.0):
+        self.buckets = {api: TokenBucket(per_minute) for api, per_minute in quotas.items()}
+        self.max_retries = max(0, int(max_retries))
+        self.max_wait = max(1.0, float(max_wait))
+
+    def acquire(self, api: str):
+        bucket = self.buckets.get(api)
+        if bucket is None:
+            return
+        waited = bucket.acquire()
+        if waited > 0.001:
+            metrics.observe(f"ratelimit.{api}.wait", waited * 1000)
+
+    def call(self, api: str, func: Callable, *args, **kwargs):
+        bucket = self.buckets.get(api)
+        attempt = 0
+        while True:
+            self.acquire(api)
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if bucket is None or not is_quota_error(e) or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                wait = bucket.penalize(retry_after(e), self.max_wait)
+                metrics.incr(f"ratelimit.{api}.throttled")
+                print(
+                    f"{api} quota exceeded. Waiting {wait:.1f}s before retry "
+                    f"({attempt}/{self.max_retries}, rate x{bucket.rate_factor:.2f})"
+                )
+                continue
+            if bucket is not None:
+                bucket.on_success()
+            return result
+
+    def stats(self) -> dict:
+        return {api: bucket.stats() for api, bucket in self.buckets.items()}
@@ -0,0 +1,231 @@
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 変更をまとめて書き込むまでの待ち時間（秒）と、ファイルの変更を確認する間隔（秒）
+WRITE_DEBOUNCE = 0.5
+WATCH_INTERVAL = 1.0
+
+# スキーマで使う型の名前
+STR = "str"
+NUMBER = "number"
+BOOL = "bool"
+OPTIONAL_STR = "optional_str"
+
+
+def _check(kind: str, value) -> bool:
+    if kind == STR:
+        return isinstance(value, str)
+    if kind == OPTIONAL_STR:
+        return value is None or isinstance(value, str)
+    if kind == BOOL:
+        return isinstance(value, bool) or value in (0, 1)
+    if kind == NUMBER:
+        if isinstance(value, bool):
+            return False
+        try:
+            float(value)
+            return True
+        except (TypeError, ValueError):
+            return False
+    return True
+
+
+def validate(raw, schema: Dict[str, str], required: Iterable[str]) -> Tuple[dict, List[str], List[str]]:
+    """
+    設定を検証して (使える設定, エラー, 警告) を返す。
+    - 必須項目が無い・空ならエラー
+    - 型が合わない項目は警告して取り除く（呼び出し側の既定値が使われる）
+    - スキーマに無い項目はそのまま残す
+    """
+    if not isinstance(raw, dict):
+        return {}, ["settings.json の最上位がオブジェクトではありません"], []
+    errors, warnings = [], []
+    data = {}
+    for key, value in raw.items():
+        kind = schema.get(key)
+        if kind is not None and not _check(kind, value):
+            warnings.append(f"settings.json の {key} の値が不正なため既定値を使います: {value!r}")
+            continue
+        data[key] = value
+    missing = [key for key in required if not str(data.get(key) or "").strip()]
+    if missing:
+        errors.append(f"settings.json に必須項目が不足しています: {', '.join(missing)}")
+    return data, errors, warnings
+
+
+class SettingsStore:
+    """
+    settings.json の読み込み・検証・書き込み・変更監視をまとめて行う（プロセスで1つ）。
+    - 読み込みは起動時の1回（とファイルの変更時）だけ。エラーは例外にせず errors に残す
+    - update() の書き込みは WRITE_DEBOUNCE 秒まとめてから、一時ファイル経由の置き換えで行う
+    - start_watching() でファイルの変更を監視し、変わった項目を subscribe() した関数に渡す
+    """
+
+    def __init__(self, path: str, schema: Dict[str, str], required: Iterable[str] = ()):
+        self.path = path
+        self.schema = schema
+        self.required = tuple(required)
+        self.errors: List[str] = []
+        self.warnings: List[str] = []
+        self._lock = threading.RLock()
+        self._data: dict = {}
+        # ファイルに書いたままの内容（型が不正で取り除いた項目も含めて書き戻す）
+        self._raw: dict = {}
+        self._dirty = set()
+        self._timer: Optional[threading.Timer] = None
+        self._signature = None
+        self._subscribers: List[Callable[[dict], None]] = []
+        self._watcher = None
+        self._stop = threading.Event()
+
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def load(self) -> bool:
+        """ファイルを読み込む。読めなかった・必須項目が無い場合は False（errors に理由が入る）"""
+        with self._lock:
+            self._signature = self._stat()
+            if self._signature is None:
+                self.errors = [
+                    f"設定ファイルが見つかりません: {self.path}\n"
+                    "settings.json を同じディレクトリに配置してください。"
+                ]
+                return False
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    raw = json.load(f)
+            except json.JSONDecodeError as e:
+                self.errors = [f"settings.json の形式が正しくありません: {e}"]
+                return False
+            except OSError as e:
+                self.errors = [f"設定ファイルの読み込みに失敗しました: {e}"]
+                return False
+            self._data, self.errors, self.warnings = validate(raw, self.schema, self.required)
+            self._raw = dict(raw) if isinstance(raw, dict) else {}
+            for warning in self.warnings:
+                print(warning)
+            return not self.errors
+
+    @property
+    def data(self) -> dict:
+        with self._lock:
+            return dict(self._data)
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            return self._data.get(key, default)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def subscribe(self, callback: Callable[[dict], None]):
+        """設定が変わったとき（update() とファイルの外部変更）に {項目: 新しい値} を渡して呼ぶ"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def update(self, **changes):
+        """値を変更し、まとめて書き込む予約をする。値が変わらない項目は無視する"""
+        with self._lock:
+            changed = {k: v for k, v in changes.items() if self._data.get(k) != v or k not in self._data}
+            if not changed:
+                return
+            self._data.update(changed)
+            self._raw.update(changed)
+            self._dirty.update(changed)
+            if self._timer is None:
+                self._timer = threading.Timer(WRITE_DEBOUNCE, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        self._notify(changed)
+
+    def flush(self):
+        """予約中の書き込みがあれば今すぐ書き込む（終了時にも呼ぶ）"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            tmp_path = self.path + ".tmp"
+            try:
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump(self._raw, f, ensure_ascii=False, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.path)
+                self._dirty.clear()
+                # 自分で書いた変更は監視で読み直さない
+                self._signature = self._stat()
+            except OSError as e:
+                print(f"Failed to save settings: {e}")
+
+    def start_watching(self, interval: float = WATCH_INTERVAL):
+        """
+        ファイルの更新時刻とサイズを interval 秒ごとに確認し、変わっていれば読み直す。
+        （inotify などの OS 固有の通知は使わず、Windows/macOS/Linux で同じ動きにする）
+        """
+        if self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), name="settings-watch", daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        self.flush()
+
+    def _watch(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self._reload_if_changed()
+            except Exception as e:
+                print(f"Settings watcher error: {e}")
+
+    def _reload_if_changed(self):
+        signature = self._stat()
+        with self._lock:
+            if signature is None or signature == self._signature:
+                return
+            self._signature = signature
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    raw = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                # 編集途中の保存などで読めないときは前の設定のまま、次の変更を待つ
+                print(f"Ignoring settings.json change: {e}")
+                return
+            data, errors, warnings = validate(raw, self.schema, self.required)
+            if errors:
+                for error in errors:
+                    print(f"Ignoring settings.json change: {error}")
+                return
+            for warning in warnings:
+                print(warning)
+            # 書き込み待ちの変更は、外部の変更より新しいので残す
+            for key in self._dirty:
+                if key in self._data:
+                    data[key] = self._data[key]
+                    raw[key] = self._data[key]
+            changed = {k: v for k, v in data.items() if self._data.get(k) != v or k not in self._data}
+            changed.update({k: None for k in self._data if k not in data})
+            self._data = data
+            self._raw = dict(raw)
+            self.warnings = warnings
+        if changed:
+            print(f"settings.json changed: {', '.join(sorted(changed))}")
+            self._notify(changed)
+
+    def _notify(self, changed: dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(changed)
+            except Exception as e:
+                print(f"Settings subscriber error: {e}")
@@ -1,21 +1,31 @@
+import io
+import json
 import os
 import time
-import time
 import threading
 import traceback
 from datetime import datetime
+from typing import List, Optional
 from urllib.parse import urlparse
 
-import gspread
-from google.auth.exceptions import RefreshError
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
-
+# gspread / googleapiclient / google_auth_oauthlib は import に時間がかかるため、
+# 起動を遅らせないよう初回使用時（または preload_google_modules()）に読み込む
 import config
+from batch_writer import BatchWriter
+from credentials_manager import CredentialsManager
+from http_transport import HttpTransport
+from metrics import metrics
 from offline_queue import OfflineQueue
+from rate_limiter import RateLimiter, error_reasons, is_quota_error
+from sync_worker import SyncWorker
+from upload_index import UploadIndex, hash_bytes, hash_file
+from upload_sessions import UploadSessionStore, session_key
+
+# オフライン時にもシート切り替えができるよう、シート名一覧をローカルに保存しておく
+SHEET_CACHE_FILE = os.path.join(config.BASE_DIR, "sheet_cache.json")
+
+# キュー再送中に RateLimiter の再試行を使い切ったクォータエラーが続いたら、次回の再送に持ち越す回数
+DRAIN_MAX_QUOTA_ERRORS = 6
 
 SCOPES = [
     "https://www.googleapis.com/auth/spreadsheets",
@@ -25,6 +35,23 @@ SCOPES = [
 ]
 
 
+def preload_google_modules():
+    """Google クライアント一式をバックグラウンドで先に import しておく"""
+    from startup_report import startup
+
+    try:
+        with startup.section("import google client stack"):
+            import gspread  # noqa: F401
+            import google.auth.transport.requests  # noqa: F401
+            import google.oauth2.credentials  # noqa: F401
+            import google_auth_httplib2  # noqa: F401
+            import google_auth_oauthlib.flow  # noqa: F401
+            import googleapiclient.discovery  # noqa: F401
+            import googleapiclient.http  # noqa: F401
+    except Exception as e:
+        print(f"Failed to preload Google client modules: {e}")
+
+
 def _normalize_drive_folder_id(value: str) -> str:
     """
     config.DRIVE_FOLDER_ID に「フォルダID」または「フォルダURL」が入っていても、
@@ -51,91 +78,148 @@ def _normalize_drive_folder_id(value: str) -> str:
     return v
 
 
+def _is_drive_parent_error(e: Exception) -> bool:
+    """
+    files().create が親フォルダの不在/権限不足で失敗したかどうか。
+    Drive のレート制限も 403 で返るので、クォータエラーは含めない（RateLimiter で待って再試行する）
+    """
+    if is_quota_error(e):
+        return False
+    status = getattr(getattr(e, "resp", None), "status", None)
+    if status == 404:
+        return True
+    if status != 403:
+        return False
+    if error_reasons(e) & {"insufficientFilePermissions", "insufficientParentPermissions"}:
+        return True
+    return "parent" in str(e).lower()
+
+
+def _is_refresh_error(e: Exception) -> bool:
+    """google.auth の RefreshError（refresh_token の失効・取り消し）かどうか"""
+    from google.auth.exceptions import RefreshError
+
+    return isinstance(e, RefreshError)
+
+
+def _row_data(row: list) -> dict:
+    """append_rows(RAW) と同じく、値をそのまま文字列として書き込む RowData"""
+    return {"values": [{"userEnteredValue": {"stringValue": str(value)}} for value in row]}
+
+
 class SheetManager:
     def __init__(self):
         self.creds = None
+        self.credentials = CredentialsManager(
+            config.TOKEN_FILE, config.CREDENTIALS_FILE, SCOPES, config.TOKEN_REFRESH_MARGIN
+        )
+        self.credentials.on_revoked = self._on_credentials_revoked
         self.client = None
         self.spreadsheet = None
         self.sheet = None
         self.sheet_title = getattr(config, "SHEET_NAME", "")
         self.drive = None
+        # Sheets は共有の接続プール、Drive はスレッドごとの httplib2 接続を使う（認証後に生成）
+        self.transport: Optional[HttpTransport] = None
         # We don't verify on init to allow app to start without crashing if config is incomplete
         self.is_authenticated = False
+        # 認証・接続は prewarm スレッドと送信スレッドから同時に呼ばれ得るので直列化する
+        self._connect_lock = threading.RLock()
         self.queue = OfflineQueue()
+        # Sheets / Drive の呼び出しはすべてトークンバケットを通す（クォータエラーは待ってから再試行）
+        self.rate_limiter = RateLimiter(
+            {"sheets": config.SHEETS_QUOTA_PER_MINUTE, "drive": config.DRIVE_QUOTA_PER_MINUTE},
+            max_retries=config.RATE_LIMIT_MAX_RETRIES,
+            max_wait=config.RATE_LIMIT_MAX_WAIT,
+        )
+        self.upload_sessions = UploadSessionStore()
+        self.upload_index = UploadIndex()
+        # title → Worksheet のキャッシュ（TTL 切れ・シートが見つからない場合に再取得）
+        self._worksheets_lock = threading.Lock()
+        self._worksheets = {}
+        self._worksheets_loaded_at = 0.0
+        self._sheet_generation = 0
+        self._cached_titles: List[str] = self._load_cached_titles()
+        # 検証済みのアップロード先フォルダ（config の値ごとにキャッシュ）
+        self._drive_folder_lock = threading.Lock()
+        # フォルダの確認は同時に1回だけ（同時に始まったアップロードは最初の確認の結果を使う）
+        self._drive_folder_validate_lock = threading.Lock()
+        self._drive_folder_source = None
+        self._drive_folder_id: Optional[str] = None
+        self._drive_folder_checked_at = 0.0
+        self._drive_folder_stats = {"hits": 0, "misses": 0}
+        # 連続送信は BatchWriter でまとめて1回の書き込み（batch_update）にする
+        self.batch_writer = BatchWriter(
+            self._append_rows,
+            window=config.BATCH_WINDOW_MS / 1000.0,
+            max_rows=config.BATCH_MAX_ROWS,
+        )
+        metrics.add_source("batch_writer", self.batch_writer.stats)
+        metrics.add_source("offline_queue", lambda: {"depth": self.queue.size()})
+        metrics.add_source("rate_limiter", self.rate_limiter.stats)
+        metrics.add_source("drive_folder_cache", self.drive_folder_cache_stats)
+        # キューの再送は常駐ワーカー1本だけが行う（送信ごとにスレッドを立てない）
+        self.sync_worker = SyncWorker(
+            self.process_queue,
+            has_work=lambda: not self.queue.is_empty(),
+            base_delay=config.SYNC_BACKOFF_BASE,
+            max_delay=config.SYNC_BACKOFF_MAX,
+        )
+        self.sync_worker.start()
 
-    def authenticate(self):
-        try:
-            if os.path.exists(config.TOKEN_FILE):
-                # まずは token.json に入っているスコープのまま読み込む（ここでSCOPESを渡すと、
-                # refresh時に「持っていないスコープ」で更新を試みて invalid_scope になり得る）
-                try:
-                    if os.path.getsize(config.TOKEN_FILE) == 0:
-                        raise ValueError("token.json is empty")
-                    self.creds = Credentials.from_authorized_user_file(config.TOKEN_FILE)
-                except Exception:
-                    # 空/壊れた token.json は削除して再認証へ
-                    self.creds = None
-                    try:
-                        os.remove(config.TOKEN_FILE)
-                    except Exception:
-                        pass
-
-            # スコープが不足している場合（Drive追加など）は再認証が必要
-            if (
-                self.creds
-                and hasattr(self.creds, "has_scopes")
-                and not self.creds.has_scopes(SCOPES)
-            ):
-                print(
-                    "Existing token.json does not have required scopes. Re-authentication is required."
-                )
-                self.creds = None
+        # use_async_engine が有効なら、送信・アップロード・フォルダ確認を1本のイベントループで扱う
+        self.engine = None
+        if config.USE_ASYNC_ENGINE:
+            from async_engine import AsyncEngine
 
-            # 期限切れなら token.json を削除して再認証へ
-            if self.creds and getattr(self.creds, "expired", False):
-                print("Token expired. Removing token.json and re-authenticating.")
-                self.creds = None
-                try:
-                    os.remove(config.TOKEN_FILE)
-                except Exception:
-                    pass
+            self.engine = AsyncEngine(
+                max_workers=config.ASYNC_MAX_CONCURRENCY,
+                max_concurrency=config.ASYNC_MAX_CONCURRENCY,
+                upload_concurrency=config.UPLOAD_CONCURRENCY,
+            )
+            self.engine.start()
 
-            if not self.creds or not self.creds.valid:
-                if self.creds and self.creds.expired and self.creds.refresh_token:
-                    try:
-                        self.creds.refresh(Request())
-                    except RefreshError:
-                        print(
-                            "Refresh token is no longer valid. "
-                            "Re-authentication is required."
-                        )
-                        self.creds = None
-                        try:
-                            os.remove(config.TOKEN_FILE)
-                        except Exception:
-                            pass
-
-                # Refreshに失敗した場合や初回は再認証へ
-                if not self.creds or not self.creds.valid:
-                    if not os.path.exists(config.CREDENTIALS_FILE):
-                        print(
-                            f"Credentials file '{config.CREDENTIALS_FILE}' not found."
-                        )
-                        return False
-
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        config.CREDENTIALS_FILE, SCOPES
-                    )
-                    self.creds = flow.run_local_server(port=0, open_browser=True)
+    def _call(self, api: str, func, *args, **kwargs):
+        """Google API の呼び出し。api（"sheets" / "drive"）のクォータに収まるよう待ってから実行する"""
+        try:
+            return self.rate_limiter.call(api, func, *args, **kwargs)
+        except Exception as e:
+            # 呼び出し中のトークン自動更新で refresh_token の失効が分かった場合
+            if _is_refresh_error(e):
+                self.credentials.mark_revoked(e)
+            raise
+
+    def _on_credentials_revoked(self):
+        """refresh_token が失効した。接続を捨て、次の送信・アップロードで _authenticate() からやり直す"""
+        with self._connect_lock:
+            self.is_authenticated = False
+            self.creds = None
+            self.client = None
+            self.spreadsheet = None
+            self.sheet = None
+            self.drive = None
+            if self.transport is not None:
+                self.transport.close()
+                self.transport = None
 
-                with open(config.TOKEN_FILE, "w") as token:
-                    token.write(self.creds.to_json())
+    def authenticate(self):
+        with self._connect_lock:
+            return self._authenticate()
 
-            self.client = gspread.authorize(self.creds)
+    def _authenticate(self):
+        try:
+            # 期限切れでも token.json は消さず、まず refresh_token で更新する
+            self.creds = self.credentials.get_credentials()
+            if self.creds is None:
+                return False
+
+            if self.transport is None or self.transport.creds is not self.creds:
+                if self.transport is not None:
+                    self.transport.close()
+                self.transport = HttpTransport(self.creds)
+            self.client = self.transport.authorize_gspread()
             # Drive API（v3）
-            self.drive = build(
-                "drive", "v3", credentials=self.creds, cache_discovery=False
-            )
+            self.drive = self.transport.drive_service()
             self.is_authenticated = True
             return True
         except Exception as e:
@@ -144,8 +228,73 @@ class SheetManager:
             return False
 
     def connect_sheet(self):
+        with self._connect_lock:
+            return self._connect_sheet()
+
+    def _ensure_connected(self) -> bool:
+        """未接続なら接続する。他スレッドが接続中ならその完了を待って結果を使う"""
+        if self.sheet:
+            return True
+        with self._connect_lock:
+            if self.sheet:
+                return True
+            return self._connect_sheet()
+
+    def _ensure_authenticated(self) -> bool:
+        if self.is_authenticated:
+            return True
+        with self._connect_lock:
+            if self.is_authenticated:
+                return True
+            return self._authenticate()
+
+    def prewarm(self) -> bool:
+        """
+        起動直後にバックグラウンドで呼ぶ。認証・スプレッドシート/ワークシート取得を済ませておき、
+        最初の送信が書き込み1回で済むようにする。
+        Drive はフォルダの確認（結果はキャッシュ）に使った接続を手放し、最初のアップロードのスレッドに引き継ぐ。
+        """
+        started = time.perf_counter()
+        preload_google_modules()
+        try:
+            ok = self._ensure_connected()
+        except Exception as e:
+            print(f"Pre-warm error: {e}")
+            ok = False
+        sheets_elapsed = time.perf_counter() - started
+
+        drive_note = "drive skipped"
+        if ok and self.drive:
+            drive_started = time.perf_counter()
+            # アップロード先フォルダの検証もここで済ませておく
+            try:
+                self._resolve_drive_folder()
+                drive_note = f"drive folder check {time.perf_counter() - drive_started:.2f}s"
+            except Exception as e:
+                print(f"Pre-warm: {e}")
+                drive_note = "drive folder check failed"
+            finally:
+                self.transport.release_drive()
+        elapsed = time.perf_counter() - started
+
+        if ok:
+            print(
+                f"Pre-warm completed in {elapsed:.2f}s "
+                f"(auth + sheets {sheets_elapsed:.2f}s, {drive_note}; sheet: {self.sheet_title})"
+            )
+            # 前回の未送信分が残っていれば再送を始める
+            if not self.queue.is_empty():
+                self.sync_worker.wake(reset_backoff=True)
+        else:
+            print(
+                f"Pre-warm failed after {elapsed:.2f}s. "
+                "The connection will be retried on the first submit."
+            )
+        return ok
+
+    def _connect_sheet(self):
         if not self.is_authenticated:
-            if not self.authenticate():
+            if not self._authenticate():
                 return False
 
         if config.SPREADSHEET_ID == "YOUR_SPREADSHEET_ID_HERE":
@@ -153,162 +302,574 @@ class SheetManager:
             return False
 
         try:
-            self.spreadsheet = self.client.open_by_key(config.SPREADSHEET_ID)
-            if self.sheet_title:
-                try:
-                    self.sheet = self.spreadsheet.worksheet(self.sheet_title)
-                except Exception:
+            self.spreadsheet = self._call("sheets", self.client.open_by_key, config.SPREADSHEET_ID)
+            # シート一覧を1回で取得してキャッシュし、その中から対象シートを選ぶ
+            self._refresh_worksheets()
+            worksheet = self._cached_worksheet(self.sheet_title) if self.sheet_title else None
+            if worksheet is None:
+                if self.sheet_title:
                     print(f"Sheet '{self.sheet_title}' not found. Falling back to first sheet.")
-                    self.sheet = self.spreadsheet.sheet1
-                    self.sheet_title = self.sheet.title
-            else:
-                self.sheet = self.spreadsheet.sheet1
-                self.sheet_title = self.sheet.title
+                worksheet = self._first_worksheet() or self._call("sheets", lambda: self.spreadsheet.sheet1)
+            self.sheet = worksheet
+            self.sheet_title = worksheet.title
             return True
         except Exception as e:
             print(f"Error connecting to sheet: {e}")
             print(traceback.format_exc())
             return False
 
+    def _load_cached_titles(self) -> List[str]:
+        if not os.path.exists(SHEET_CACHE_FILE):
+            return []
+        try:
+            with open(SHEET_CACHE_FILE, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("spreadsheet_id") != config.SPREADSHEET_ID:
+                return []
+            return list(data.get("titles") or [])
+        except Exception as e:
+            print(f"Failed to load sheet cache: {e}")
+            return []
+
+    def _save_cached_titles(self, titles: List[str]):
+        try:
+            tmp_path = SHEET_CACHE_FILE + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"spreadsheet_id": config.SPREADSHEET_ID, "titles": titles},
+                    f,
+                    ensure_ascii=False,
+                    indent=2,
+                )
+            os.replace(tmp_path, SHEET_CACHE_FILE)
+        except Exception as e:
+            print(f"Failed to save sheet cache: {e}")
+
+    def _refresh_worksheets(self):
+        """spreadsheet.worksheets() を1回呼んで title → Worksheet のキャッシュを作り直す"""
+        worksheets = self._call("sheets", self.spreadsheet.worksheets)
+        with self._worksheets_lock:
+            self._worksheets = {ws.title: ws for ws in worksheets}
+            self._worksheets_loaded_at = time.time()
+            titles = list(self._worksheets)
+            changed = titles != self._cached_titles
+            self._cached_titles = titles
+        if changed:
+            self._save_cached_titles(titles)
+
+    def _worksheets_fresh(self) -> bool:
+        with self._worksheets_lock:
+            return bool(self._worksheets) and (
+                time.time() - self._worksheets_loaded_at < config.SHEET_CACHE_TTL
+            )
+
+    def _cached_worksheet(self, title: str):
+        with self._worksheets_lock:
+            return self._worksheets.get(title)
+
+    def _first_worksheet(self):
+        with self._worksheets_lock:
+            return next(iter(self._worksheets.values()), None)
+
+    def invalidate_worksheet_cache(self):
+        with self._worksheets_lock:
+            self._worksheets_loaded_at = 0.0
+
+    def get_cached_sheet_titles(self) -> List[str]:
+        """ネットワークを使わずに分かるシート名一覧（メモリ上のキャッシュ → 保存済み一覧の順）"""
+        with self._worksheets_lock:
+            if self._worksheets:
+                return list(self._worksheets)
+            return list(self._cached_titles)
+
     def get_sheet_titles(self):
+        if self._worksheets_fresh():
+            return self.get_cached_sheet_titles()
+
         if not self.spreadsheet:
-            if not self.connect_sheet():
-                return []
+            if not self._ensure_connected():
+                return self.get_cached_sheet_titles()
 
         try:
-            return [ws.title for ws in self.spreadsheet.worksheets()]
+            self._refresh_worksheets()
         except Exception as e:
             print(f"Failed to list sheets: {e}")
-            return []
+        return self.get_cached_sheet_titles()
 
     def set_sheet_by_title(self, title: str) -> bool:
         if not title:
             return False
 
-        if not self.spreadsheet:
-            if not self.connect_sheet():
-                return False
+        worksheet = self._cached_worksheet(title) if self._worksheets_fresh() else None
+        if worksheet is None:
+            if not self.spreadsheet:
+                if not self._ensure_connected():
+                    return False
+            try:
+                self._refresh_worksheets()
+            except Exception as e:
+                print(f"Failed to refresh sheets: {e}")
+            worksheet = self._cached_worksheet(title)
 
-        try:
-            self.sheet = self.spreadsheet.worksheet(title)
-            self.sheet_title = title
+        if worksheet is None:
+            print(f"Failed to select sheet '{title}': not found")
+            return False
+
+        self.sheet = worksheet
+        self.sheet_title = title
+        return True
+
+    def select_sheet_optimistic(self, title: str) -> int:
+        """
+        ネットワークを待たずにシートを切り替える（ホットキー用）。
+        キャッシュに Worksheet があればそれを使い、無ければ次回の接続時に title で解決する。
+        戻り値の世代番号を confirm_sheet() に渡して、後から非同期に確認する。
+        """
+        worksheet = self._cached_worksheet(title)
+        with self._worksheets_lock:
+            self._sheet_generation += 1
+            generation = self._sheet_generation
+        self.sheet_title = title
+        self.sheet = worksheet
+        return generation
+
+    def confirm_sheet(self, title: str, generation: int) -> Optional[bool]:
+        """
+        select_sheet_optimistic() の結果を確認する。
+        True: 存在を確認 / False: シートが無かったので先頭シートに戻した / None: オフライン等で未確認
+        """
+        if self._worksheets_fresh() and self._cached_worksheet(title) is not None:
             return True
+
+        try:
+            if not self.spreadsheet or self.sheet is None:
+                if not self._ensure_connected():
+                    return None
+            else:
+                self._refresh_worksheets()
         except Exception as e:
-            print(f"Failed to select sheet '{title}': {e}")
+            print(f"Failed to confirm sheet '{title}': {e}")
+            return None
+
+        with self._worksheets_lock:
+            if generation != self._sheet_generation:
+                # その後さらに切り替えられているので、この確認結果は使わない
+                return None
+        worksheet = self._cached_worksheet(title)
+        if worksheet is None:
+            fallback = self._first_worksheet()
+            if fallback is None:
+                return None
+            self.sheet = fallback
+            self.sheet_title = fallback.title
             return False
+        self.sheet = worksheet
+        return True
 
     def append_log(self, text):
-        if not self.sheet:
-            if not self.connect_sheet():
-                print("Connection failed. Adding to offline queue.")
-                self.queue.add(text)
-                return False
+        """
+        1件を書き込む。実際の送信は BatchWriter が短時間分まとめて行い、
+        この呼び出しはその行の成否が確定するまで待つ。
+        書き込み先は呼び出した時点のシート（送信までにシートを切り替えても変わらない）。
+        """
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with metrics.timer("sheets.submit_to_row"):
+            return self.batch_writer.submit((self.sheet_title, [timestamp, text])).result()
+
+    async def append_log_async(self, text) -> bool:
+        """append_log の coroutine 版。行の成否をスレッドを占有せずにイベントループ上で待つ"""
+        import asyncio
+
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with metrics.timer("sheets.submit_to_row"):
+            return await asyncio.wrap_future(
+                self.batch_writer.submit((self.sheet_title, [timestamp, text]))
+            )
+
+    def _worksheet_for(self, title: Optional[str]):
+        """行の書き込み先。シート名が無い（旧形式のキュー）・見つからない場合は現在のシート"""
+        if not title:
+            return self.sheet
+        worksheet = self._cached_worksheet(title)
+        if worksheet is None and not self._worksheets_fresh():
+            self._refresh_worksheets()
+            worksheet = self._cached_worksheet(title)
+        if worksheet is None:
+            print(f"Sheet '{title}' not found. Writing to '{self.sheet_title}' instead.")
+            return self.sheet
+        return worksheet
+
+    def _write_rows(self, entries):
+        """
+        entries の (シート名, 行) をシートごとにまとめ、spreadsheet.batch_update 1回
+        （シートごとの appendCells）で書き込む。複数シート分でも HTTP は1回で、全件成功か全件失敗になる。
+        """
+        groups = {}
+        for title, row in entries:
+            worksheet = self._worksheet_for(title)
+            groups.setdefault(worksheet.id, []).append(row)
+        self._call(
+            "sheets",
+            self.spreadsheet.batch_update,
+            {
+                "requests": [
+                    {
+                        "appendCells": {
+                            "sheetId": sheet_id,
+                            "rows": [_row_data(row) for row in rows],
+                            "fields": "userEnteredValue",
+                        }
+                    }
+                    for sheet_id, rows in groups.items()
+                ]
+            }
+        )
+
+    def _append_rows(self, rows) -> bool:
+        """BatchWriter から呼ばれる。(シート名, 行) をまとめて1回で送信し、失敗時はキューへ退避する"""
+        if not self._ensure_connected():
+            print("Connection failed. Adding to offline queue.")
+            self._enqueue_rows(rows)
+            return False
 
-        now = datetime.now()
-        timestamp = now.strftime("%Y-%m-%d %H:%M:%S")
         try:
-            self.sheet.append_row([timestamp, text])
-            # 成功したら、溜まっているキューも処理を試みる（別スレッドが良いが、ここでは簡易的に呼ぶ）
-            # 実際にはレスポンス低下を防ぐため、スレッドで呼ぶべき
-            threading.Thread(target=self.process_queue, daemon=True).start()
+            with metrics.timer("sheets.append_rows"):
+                self._write_rows(rows)
+            metrics.incr("sheets.rows_written", len(rows))
+            # 成功＝オンラインなので、溜まっているキューの再送をワーカーに任せる
+            self.sync_worker.wake(reset_backoff=True)
             return True
         except Exception as e:
-            print(f"Error appending row: {e}")
+            print(f"Error appending rows: {e}")
             # Try to reconnect once
             if self.connect_sheet():
                 try:
-                    self.sheet.append_row([timestamp, text])
-                    threading.Thread(target=self.process_queue, daemon=True).start()
+                    with metrics.timer("sheets.append_rows"):
+                        self._write_rows(rows)
+                    metrics.incr("sheets.rows_written", len(rows))
+                    self.sync_worker.wake(reset_backoff=True)
                     return True
-                except:
+                except Exception:
                     pass
-            
+
             # If all else fails, add to queue
-            print("Failed to send. Adding to offline queue.")
-            self.queue.add(text, timestamp)
+            print(f"Failed to send {len(rows)} row(s). Adding to offline queue.")
+            self._enqueue_rows(rows)
             return False
 
-    def process_queue(self):
-        """queued items の再送を試みる"""
+    def _enqueue_rows(self, rows):
+        metrics.incr("sheets.rows_queued", len(rows))
+        for sheet, (timestamp, text) in rows:
+            self.queue.add(text, timestamp, sheet)
+        # オフライン中の再試行はワーカーがバックオフしながら行う
+        self.sync_worker.wake()
+
+    def process_queue(self) -> bool:
+        """
+        queued items の再送を試みる（通常は sync_worker からのみ呼ばれる）。
+        先頭から chunk 単位で、行ごとの書き込み先シートに分けて1回の batch_update で送り、
+        送信が確定した chunk だけ ack する。
+        キューを空にできたら True、接続失敗などで中断したら False を返す。
+        """
         if self.queue.is_empty():
-            return
+            return True
 
-        if not self.sheet:
-             if not self.connect_sheet():
-                 return
-
-        # キューの先頭から順に処理
-        print(f"Processing offline queue ({len(self.queue.get_all())} items)...")
-        while not self.queue.is_empty():
-            item = self.queue.peek()
-            if not item:
-                break
-            
+        if not self._ensure_connected():
+            return False
+
+        print(f"Processing offline queue ({self.queue.size()} items)...")
+        # chunk は縮めない（縮めると1行あたりのリクエスト数が増え、クォータを使い切っているときほど逆効果）。
+        # 待ち時間は RateLimiter が Retry-After とレートの引き下げで決める
+        quota_errors = 0
+        while True:
+            items = self.queue.peek_many(config.DRAIN_CHUNK_SIZE)
+            if not items:
+                return True
+
+            # タイムスタンプと書き込み先シートは追加したときのものを使用
+            rows = [(item.get("sheet"), [item["timestamp"], item["text"]]) for item in items]
             try:
-                # タイムスタンプは元のものを使用
-                self.sheet.append_row([item["timestamp"], item["text"]])
-                print(f"Recovered item sent: {item['text'][:10]}...")
-                self.queue.pop() # 成功したら消す
-                time.sleep(1) # API制限考慮
+                with metrics.timer("sync.drain_chunk"):
+                    self._write_rows(rows)
             except Exception as e:
+                metrics.incr("sync.drain_errors")
+                if is_quota_error(e):
+                    quota_errors += 1
+                    if quota_errors <= DRAIN_MAX_QUOTA_ERRORS:
+                        # RateLimiter の再試行でも足りなかった。バケットは止まっている/遅くなっているので、同じ chunk で送り直す
+                        print(f"Quota exceeded while draining. Retrying ({quota_errors}/{DRAIN_MAX_QUOTA_ERRORS})")
+                        continue
                 print(f"Retry failed: {e}")
                 # 接続切れなどの場合はループを抜けて次回に持ち越し
-                break
-
-    def upload_file_to_drive(self, file_path: str) -> str:
-        """
-        指定ファイルをGoogle Driveへアップロードし、webViewLink(URL) を返す。
-        - 共有権限は変更しない（既定：自分のみ閲覧）
-        - config.DRIVE_FOLDER_ID が空でなければそのフォルダ配下へ保存
-        """
-        if not self.is_authenticated:
-            if not self.authenticate():
-                raise RuntimeError("Google authentication failed")
+                return False
 
-        if not self.drive:
-            raise RuntimeError("Drive service is not initialized")
+            self.queue.ack(items)
+            quota_errors = 0
+            metrics.incr("sync.rows_recovered", len(items))
+            self._record_sync_lag(items[0]["timestamp"])
+            print(f"Recovered {len(items)} item(s) sent.")
 
-        if not os.path.exists(file_path):
-            raise FileNotFoundError(file_path)
-
-        file_name = os.path.basename(file_path)
-        metadata = {"name": file_name}
+    def _record_sync_lag(self, timestamp: str):
+        """再送できた行のうち最も古いものが、キューに入ってから書き込まれるまでの時間を記録する"""
+        try:
+            queued_at = datetime.strptime(timestamp, "%Y-%m-%d %H:%M:%S").timestamp()
+        except (TypeError, ValueError):
+            return
+        metrics.gauge("sync.last_lag_s", max(0.0, time.time() - queued_at))
+        metrics.gauge("sync.last_success_at", time.time())
 
+    def _resolve_drive_folder(self) -> str:
+        """
+        アップロード先フォルダIDを返す。存在/権限チェックはセッション中1回
+        （drive_folder_cache_ttl > 0 ならその秒数ごと）だけ行い、結果をキャッシュする。
+        確認中に呼ばれた分は確認が終わるのを待ってキャッシュを使う（同時に files().get を送らない）。
+        """
         folder_id_raw = getattr(config, "DRIVE_FOLDER_ID", "") or ""
+        ttl = config.DRIVE_FOLDER_CACHE_TTL
+        with self._drive_folder_validate_lock:
+            with self._drive_folder_lock:
+                if (
+                    self._drive_folder_source == folder_id_raw
+                    and self._drive_folder_id is not None
+                    and (ttl <= 0 or time.time() - self._drive_folder_checked_at < ttl)
+                ):
+                    self._drive_folder_stats["hits"] += 1
+                    return self._drive_folder_id
+                self._drive_folder_stats["misses"] += 1
+            return self._validate_drive_folder(folder_id_raw)
+
+    def _validate_drive_folder(self, folder_id_raw: str) -> str:
         folder_id = _normalize_drive_folder_id(folder_id_raw)
         if folder_id:
             # フォルダが存在し、アクセス可能かを事前にチェック（URL/IDの貼り間違いの原因特定用）
             try:
-                self.drive.files().get(
-                    fileId=folder_id,
-                    fields="id",
-                    supportsAllDrives=True,
-                ).execute()
+                self._call(
+                    "drive",
+                    self._thread_drive().files().get(
+                        fileId=folder_id,
+                        fields="id",
+                        supportsAllDrives=True,
+                    ).execute,
+                )
             except Exception as e:
                 raise RuntimeError(
                     "DRIVE_FOLDER_ID のフォルダが見つからないか、アクセス権がありません。"
                     " Driveの共有設定/権限、またはフォルダURL/IDを確認してください。"
                 ) from e
-            metadata["parents"] = [folder_id]
 
-        media = MediaFileUpload(file_path, resumable=True)
-        created = (
-            self.drive.files()
-            .create(
-                body=metadata,
-                media_body=media,
-                fields="id, webViewLink",
-                supportsAllDrives=True,
-            )
-            .execute()
+        with self._drive_folder_lock:
+            self._drive_folder_source = folder_id_raw
+            self._drive_folder_id = folder_id
+            self._drive_folder_checked_at = time.time()
+        return folder_id
+
+    def invalidate_drive_folder_cache(self):
+        with self._drive_folder_lock:
+            self._drive_folder_id = None
+
+    def drive_folder_cache_stats(self) -> dict:
+        with self._drive_folder_lock:
+            return dict(self._drive_folder_stats)
+
+    def _thread_drive(self):
+        """呼び出しスレッド専用の Drive サービスを返す（認証し直した場合は transport ごと作り直される）"""
+        return self.transport.drive_service()
+
+    def _create_drive_file(self, metadata: dict, media, key: Optional[str], progress_callback=None):
+        """
+        next_chunk() でチャンクごとに送信する。チャンクを送るたびにセッションURIと確定済みバイト数を
+        保存しておき、同じファイルの前回のセッションが残っていればその続きから再開する。
+        key が None のとき（メモリ上のデータ）はセッションを保存しない。
+        """
+        import httplib2
+        from googleapiclient.errors import HttpError
+
+        request = self._thread_drive().files().create(
+            body=metadata,
+            media_body=media,
+            fields="id, webViewLink",
+            supportsAllDrives=True,
+        )
+        parents = metadata.get("parents") or []
+
+        saved = self.upload_sessions.get(key) if key else None
+        resumed = bool(saved) and saved.get("parents", []) == parents
+        if resumed:
+            request.resumable_uri = saved["uri"]
+            request.resumable_progress = saved.get("progress", 0)
+            # 最初にサーバーへ確定済みの位置を問い合わせてから続きを送らせる
+            request._in_error_state = True
+            print(f"Resuming upload of {metadata['name']} from {request.resumable_progress} bytes")
+        elif saved:
+            self.upload_sessions.remove(key)
+
+        retries = 0
+        response = None
+        while response is None:
+            try:
+                status, response = self._call("drive", request.next_chunk)
+            except HttpError as e:
+                code = getattr(getattr(e, "resp", None), "status", None)
+                if resumed and code in (404, 410):
+                    # セッションが失効していたら最初からやり直す
+                    print(f"Upload session expired for {metadata['name']}. Restarting.")
+                    self.upload_sessions.remove(key)
+                    return self._create_drive_file(metadata, media, key, progress_callback)
+                if (code is None or code < 500) and not is_quota_error(e):
+                    if key:
+                        self.upload_sessions.remove(key)
+                    raise
+                retries = self._wait_chunk_retry(retries, e)
+                continue
+            except (OSError, httplib2.HttpLib2Error) as e:
+                # 通信断など。セッションは保存済みなので、再試行を使い切ってもアプリ再起動後に続きから送れる
+                if request.resumable_uri is None:
+                    raise
+                retries = self._wait_chunk_retry(retries, e)
+                request._in_error_state = True
+                continue
+
+            retries = 0
+            if status is not None:
+                if key:
+                    self.upload_sessions.put(
+                        key, request.resumable_uri, status.resumable_progress, parents
+                    )
+                if progress_callback:
+                    progress_callback(status.progress())
+
+        if key:
+            self.upload_sessions.remove(key)
+        if progress_callback:
+            progress_callback(1.0)
+        return response
+
+    def _wait_chunk_retry(self, retries: int, error: Exception) -> int:
+        retries += 1
+        if retries > config.UPLOAD_CHUNK_RETRIES:
+            raise error
+        delay = min(2 ** retries, 32)
+        print(f"Upload chunk failed ({error}). Retrying in {delay}s ({retries}/{config.UPLOAD_CHUNK_RETRIES})")
+        time.sleep(delay)
+        return retries
+
+    def upload_file_to_drive(self, file_path: str, progress_callback=None) -> str:
+        """
+        指定ファイルをGoogle Driveへアップロードし、webViewLink(URL) を返す。
+        - 共有権限は変更しない（既定：自分のみ閲覧）
+        - config.DRIVE_FOLDER_ID が空でなければそのフォルダ配下へ保存
+        - upload_chunk_size_mb ごとに送信し、中断しても次回は続きから再開する
+        - progress_callback が指定されていれば進捗(0.0〜1.0)を通知する
+        """
+        if not os.path.exists(file_path):
+            raise FileNotFoundError(file_path)
+
+        from googleapiclient.http import MediaFileUpload
+
+        digest = hash_file(file_path) if config.UPLOAD_DEDUP else None
+        media = MediaFileUpload(file_path, chunksize=config.UPLOAD_CHUNK_SIZE, resumable=True)
+        return self._upload_to_drive(
+            os.path.basename(file_path),
+            media,
+            session_key(file_path),
+            digest,
+            os.path.getsize(file_path),
+            progress_callback,
         )
 
-        file_id = created.get("id")
-        return (
-            created.get("webViewLink")
-            or f"https://drive.google.com/file/d/{file_id}/view"
+    def upload_bytes_to_drive(
+        self, data: bytes, file_name: str, mimetype: str, progress_callback=None
+    ) -> str:
+        """
+        メモリ上のデータ（貼り付け画像など）を一時ファイルを作らずにアップロードし、webViewLink を返す。
+        データはプロセス内にしか無いので、アプリ再起動をまたいだ再開は行わない。
+        """
+        from googleapiclient.http import MediaIoBaseUpload
+
+        digest = hash_bytes(data) if config.UPLOAD_DEDUP else None
+        media = MediaIoBaseUpload(
+            io.BytesIO(data), mimetype=mimetype, chunksize=config.UPLOAD_CHUNK_SIZE, resumable=True
         )
+        return self._upload_to_drive(file_name, media, None, digest, len(data), progress_callback)
 
+    def _upload_to_drive(
+        self, file_name: str, media, key: Optional[str], digest: Optional[str], size: int,
+        progress_callback=None,
+    ) -> str:
+        if not self._ensure_authenticated():
+            raise RuntimeError("Google authentication failed")
+
+        if not self.drive:
+            raise RuntimeError("Drive service is not initialized")
+
+        metadata = {"name": file_name}
+
+        folder_id = self._resolve_drive_folder()
+        if folder_id:
+            metadata["parents"] = [folder_id]
+
+        if digest:
+            link = self._find_uploaded(digest, folder_id)
+            if link:
+                metrics.incr("drive.dedup_hits")
+                print(f"Skipped upload of {file_name}: same content already uploaded")
+                if progress_callback:
+                    progress_callback(1.0)
+                return link
+
+        started = time.perf_counter()
+        try:
+            created = self._create_drive_file(metadata, media, key, progress_callback)
+        except Exception as e:
+            if not folder_id or not _is_drive_parent_error(e):
+                metrics.incr("drive.upload_errors")
+                raise
+            # フォルダが削除/権限変更された可能性があるので、検証し直してから1回だけ再試行
+            print(f"Upload to cached folder failed ({e}). Re-validating folder.")
+            self.invalidate_drive_folder_cache()
+            folder_id = self._resolve_drive_folder()
+            metadata["parents"] = [folder_id]
+            created = self._create_drive_file(metadata, media, key, progress_callback)
+
+        metrics.observe("drive.upload", (time.perf_counter() - started) * 1000)
+        metrics.incr("drive.upload_bytes", size)
+
+        file_id = created.get("id")
+        link = created.get("webViewLink") or f"https://drive.google.com/file/d/{file_id}/view"
+        if digest:
+            self.upload_index.put(digest, file_id, link, file_name, size, folder_id)
+        return link
+
+    def _find_uploaded(self, digest: str, folder_id: str) -> Optional[str]:
+        """
+        同じ内容のアップロード済みファイルがあればそのリンクを返す。
+        upload_dedup_verify が有効なら、ゴミ箱行き/削除済みでないかをメタデータだけ取得して確認する。
+        """
+        entry = self.upload_index.get(digest, folder_id)
+        if not entry:
+            return None
+        if not config.UPLOAD_DEDUP_VERIFY:
+            return entry["link"]
+
+        try:
+            meta = self._call(
+                "drive",
+                self._thread_drive().files()
+                .get(fileId=entry["id"], fields="id,trashed", supportsAllDrives=True)
+                .execute,
+            )
+        except Exception as e:
+            code = getattr(getattr(e, "resp", None), "status", None)
+            if code not in (403, 404):
+                # 通信エラーなどでは判断できないので、索引は残したまま通常どおりアップロードする
+                print(f"Failed to verify uploaded file ({e}). Uploading again.")
+                return None
+            meta = None
+
+        if not meta or meta.get("trashed"):
+            self.upload_index.remove(digest)
+            return None
+        return entry["link"]
 
 if __name__ == "__main__":
     # simple test
@@ -0,0 +1,59 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+# このモジュールが最初に import された時刻を起動時刻とみなす（main.py の先頭で import する）
+_T0 = time.perf_counter()
+
+
+class StartupReport:
+    """
+    起動処理の所要時間を記録し、python -X importtime 風の一覧で出力する。
+    - section(): import や初期化など、区間の所要時間
+    - mark(): 起動開始からの経過時間（例: ホットキー受付開始）
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sections: List[Tuple[str, float, float, str]] = []
+        self._marks: List[Tuple[str, float]] = []
+
+    @contextmanager
+    def section(self, name: str):
+        started = time.perf_counter()
+        thread = threading.current_thread().name
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            with self._lock:
+                self._sections.append((name, started - _T0, finished - started, thread))
+
+    def mark(self, name: str) -> float:
+        elapsed = time.perf_counter() - _T0
+        with self._lock:
+            self._marks.append((name, elapsed))
+        return elapsed
+
+    def elapsed(self, name: str) -> float:
+        with self._lock:
+            for mark_name, elapsed in self._marks:
+                if mark_name == name:
+                    return elapsed
+        return -1.0
+
+    def report(self) -> str:
+        with self._lock:
+            sections = list(self._sections)
+            marks = list(self._marks)
+
+        lines = ["startup: start [ms] | self [ms] | thread | step"]
+        for name, start, duration, thread in sorted(sections, key=lambda s: s[1]):
+            lines.append(f"startup: {start * 1000:10.1f} | {duration * 1000:9.1f} | {thread} | {name}")
+        for name, elapsed in marks:
+            lines.append(f"startup: {elapsed * 1000:10.1f} | {'':9} | {'':6} | * {name}")
+        return "\n".join(lines)
+
+
+startup = StartupReport()
@@ -0,0 +1,147 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, List
+
+# 1つの trigram について走査するポスティングの上限（新しい方から）
+MAX_POSTINGS_SCAN = 3000
+# 候補集めに使う trigram の数（出現頻度の低い順）
+MAX_QUERY_GRAMS = 8
+# 精査する候補数
+MAX_CANDIDATES = 60
+# クエリの trigram のうち、この割合以上を含むものだけを候補にする
+MIN_GRAM_RATIO = 0.5
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _trigrams(text: str) -> Iterable[str]:
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class SuggestionIndex:
+    """
+    入力補完用のメモリ内インデックス（同じ本文は1件にまとめる）。
+    - 3文字以上のクエリ: trigram のポスティングから候補を集め、部分一致/あいまい一致で順位付け
+    - 1〜2文字のクエリ: ソート済みリストの二分探索で前方一致
+    add() は1件ずつ差分で索引を更新する。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._texts: List[str] = []
+        self._normalized: List[str] = []
+        self._doc_by_text: Dict[str, int] = {}
+        # doc → 最後に使われた順番（大きいほど新しい）
+        self._recency = array("Q")
+        self._seq = 0
+        self._grams: Dict[str, array] = {}
+        # 前方一致用: (正規化テキスト, doc) のソート済みリスト
+        self._sorted: List[tuple] = []
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._texts)
+
+    def add(self, text: str):
+        if not text:
+            return
+        with self._lock:
+            self._add_locked(text)
+
+    def add_many(self, texts: Iterable[str]):
+        """古い順に渡す。前方一致リストは最後にまとめてソートする"""
+        with self._lock:
+            for text in texts:
+                if text:
+                    self._add_locked(text, keep_sorted=False)
+            self._sorted.sort()
+
+    def _add_locked(self, text: str, keep_sorted: bool = True):
+        self._seq += 1
+        doc = self._doc_by_text.get(text)
+        if doc is not None:
+            self._recency[doc] = self._seq
+            return
+
+        doc = len(self._texts)
+        normalized = _normalize(text)
+        self._texts.append(text)
+        self._normalized.append(normalized)
+        self._doc_by_text[text] = doc
+        self._recency.append(self._seq)
+        for gram in _trigrams(normalized):
+            postings = self._grams.get(gram)
+            if postings is None:
+                postings = self._grams[gram] = array("I")
+            postings.append(doc)
+
+        entry = (normalized, doc)
+        if keep_sorted:
+            self._sorted.insert(bisect_left(self._sorted, entry), entry)
+        else:
+            self._sorted.append(entry)
+
+    def search(self, query: str, limit: int = 5) -> List[str]:
+        q = _normalize(query or "")
+        if not q:
+            return []
+        with self._lock:
+            if len(q) < 3:
+                return self._prefix_search(q, limit)
+            return self._gram_search(q, limit)
+
+    def _prefix_search(self, q: str, limit: int) -> List[str]:
+        start = bisect_left(self._sorted, (q,))
+        candidates = []
+        for normalized, doc in self._sorted[start : start + MAX_POSTINGS_SCAN]:
+            if not normalized.startswith(q):
+                break
+            if normalized != q:
+                candidates.append(doc)
+        best = heapq.nlargest(limit, candidates, key=lambda d: self._recency[d])
+        return [self._texts[d] for d in best]
+
+    def _gram_search(self, q: str, limit: int) -> List[str]:
+        query_grams = list(_trigrams(q))
+        postings_list = [self._grams.get(g) for g in query_grams]
+        present = sorted((p for p in postings_list if p), key=len)
+        if not present:
+            return []
+
+        # 出現頻度の低い trigram から、新しい順に一定数だけ数え上げる
+        counts: Dict[int, int] = {}
+        for postings in present[:MAX_QUERY_GRAMS]:
+            for i in range(len(postings) - 1, max(-1, len(postings) - 1 - MAX_POSTINGS_SCAN), -1):
+                doc = postings[i]
+                counts[doc] = counts.get(doc, 0) + 1
+
+        recency = self._recency
+        candidates = heapq.nlargest(
+            MAX_CANDIDATES, counts, key=lambda d: (counts[d], recency[d])
+        )
+
+        min_hits = max(1, int(len(query_grams) * MIN_GRAM_RATIO + 0.5))
+        scored = []
+        for doc in candidates:
+            normalized = self._normalized[doc]
+            if normalized == q:
+                # 入力済みの内容そのものは候補に出さない
+                continue
+            if q in normalized:
+                # 前方一致 > 部分一致 > あいまい一致
+                rank = 3 if normalized.startswith(q) else 2
+                hits = len(query_grams)
+            else:
+                hits = sum(1 for g in query_grams if g in normalized)
+                if hits < min_hits:
+                    continue
+                rank = 1
+            scored.append((rank, hits, recency[doc], doc))
+
+        best = heapq.nlargest(limit, scored)
+        return [self._texts[doc] for _, _, _, doc in best]
+
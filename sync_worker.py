@@ -0,0 +1,130 @@
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+IDLE = "idle"
+DRAINING = "draining"
+BACKING_OFF = "backing_off"
+
+
+class SyncWorker:
+    """
+    オフラインキューを再送する常駐スレッド（1本だけ）。
+    - wake() で起こされたときだけキューを処理する（同時に複数の再送が走らない）
+    - 失敗したら指数バックオフ＋ジッターで待ってから再試行する
+    - status() で現在の状態（idle / draining / backing_off と次回再試行時刻）を返す
+    """
+
+    def __init__(
+        self,
+        drain_func: Callable[[], bool],
+        has_work: Callable[[], bool],
+        base_delay: float = 2.0,
+        max_delay: float = 300.0,
+    ):
+        self._drain_func = drain_func
+        self._has_work = has_work
+        self._base_delay = max(0.1, float(base_delay))
+        self._max_delay = max(self._base_delay, float(max_delay))
+        # 状態が変わるたびに status() を渡して呼ばれる（トレイ表示の更新用）
+        self.on_state_change: Optional[Callable[[Dict], None]] = None
+
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._reset_backoff = False
+        self._state = IDLE
+        self._attempts = 0
+        self._next_retry_at: Optional[float] = None
+        self._last_success_at: Optional[float] = None
+        self._thread = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def wake(self, reset_backoff: bool = False):
+        """
+        キューに仕事が来たことを知らせる。
+        reset_backoff=True（直前の送信が成功した＝オンラインに戻った）ならバックオフを打ち切る。
+        """
+        if reset_backoff:
+            with self._lock:
+                self._reset_backoff = True
+        self._event.set()
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self._state,
+                "attempts": self._attempts,
+                "next_retry_at": self._next_retry_at,
+                "last_success_at": self._last_success_at,
+            }
+
+    def _set_state(self, state: str, next_retry_at: Optional[float] = None):
+        with self._lock:
+            changed = state != self._state or next_retry_at != self._next_retry_at
+            self._state = state
+            self._next_retry_at = next_retry_at
+        if changed and self.on_state_change:
+            try:
+                self.on_state_change(self.status())
+            except Exception as e:
+                print(f"Sync state callback error: {e}")
+
+    def _backoff_delay(self) -> float:
+        # equal jitter: 上限の半分は必ず待ち、残り半分をランダムにする
+        ceiling = min(self._max_delay, self._base_delay * (2 ** (self._attempts - 1)))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def _run(self):
+        while True:
+            timeout = None
+            with self._lock:
+                if self._state == BACKING_OFF and self._next_retry_at is not None:
+                    timeout = max(0.0, self._next_retry_at - time.time())
+            self._event.wait(timeout)
+            self._event.clear()
+
+            with self._lock:
+                reset = self._reset_backoff
+                self._reset_backoff = False
+                waiting = (
+                    self._state == BACKING_OFF
+                    and self._next_retry_at is not None
+                    and time.time() < self._next_retry_at
+                )
+            if waiting and not reset:
+                continue
+
+            if not self._has_work():
+                with self._lock:
+                    self._attempts = 0
+                self._set_state(IDLE)
+                continue
+
+            self._set_state(DRAINING)
+            try:
+                ok = self._drain_func()
+            except Exception as e:
+                print(f"Sync worker error: {e}")
+                ok = False
+
+            if ok:
+                with self._lock:
+                    self._attempts = 0
+                    self._last_success_at = time.time()
+                self._set_state(IDLE)
+                # 処理中に追加された分があればもう一周する
+                if self._has_work():
+                    self._event.set()
+            else:
+                with self._lock:
+                    self._attempts += 1
+                delay = self._backoff_delay()
+                print(f"Sync failed. Retrying in {delay:.1f}s")
+                self._set_state(BACKING_OFF, time.time() + delay)
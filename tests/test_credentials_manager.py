@@ -0,0 +1,134 @@
+"""
+refresh_token が失効したとき（RefreshError）に、認証情報と SheetManager の接続が捨てられ、
+次の利用でブラウザ再認証からやり直すことを確認する。
+
+    python -m pytest -q tests
+"""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from google.auth.exceptions import RefreshError
+
+from credentials_manager import CredentialsManager
+from sheet_manager import SheetManager
+
+
+class RevokedCreds:
+    """refresh() が常に RefreshError になる（refresh_token が取り消された）資格情報"""
+
+    def __init__(self, expired: bool = False):
+        self.token = "access"
+        self.refresh_token = "refresh"
+        self.expiry = datetime.utcnow() + (timedelta(seconds=-1) if expired else timedelta(hours=1))
+        self.refresh_calls = 0
+
+    @property
+    def valid(self):
+        return self.expiry > datetime.utcnow()
+
+    def refresh(self, request):
+        self.refresh_calls += 1
+        raise RefreshError("invalid_grant: Token has been expired or revoked.")
+
+    def to_json(self):
+        return "{}"
+
+
+class FreshCreds(RevokedCreds):
+    def to_json(self):
+        return '{"token": "new"}'
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    m = CredentialsManager(str(tmp_path / "token.json"), str(tmp_path / "credentials.json"), ["scope"], 300)
+    flows = []
+
+    def run_flow():
+        flows.append(1)
+        return FreshCreds()
+
+    monkeypatch.setattr(m, "_run_flow", run_flow)
+    monkeypatch.setattr(m, "_load", lambda: pytest.fail("revoked token.json must not be reloaded"))
+    m.flows = flows
+    return m
+
+
+def test_background_refresh_failure_drops_creds_and_reauthenticates(manager):
+    revoked = threading.Event()
+    manager.on_revoked = revoked.set
+    creds = RevokedCreds()
+    creds.expiry = datetime.utcnow() + timedelta(seconds=1)
+    manager.creds = creds
+
+    # 期限の 300 秒前を過ぎているので、バックグラウンド更新がすぐ走って RefreshError になる
+    manager._start_refresher()
+
+    assert revoked.wait(5)
+    assert creds.refresh_calls == 1
+    assert manager.creds is None
+    assert manager.revoked
+
+    new_creds = manager.get_credentials()
+    assert isinstance(new_creds, FreshCreds)
+    assert manager.flows == [1]
+    assert not manager.revoked
+
+
+def test_refresh_failure_in_get_credentials_runs_flow(manager):
+    manager.creds = RevokedCreds(expired=True)
+
+    assert isinstance(manager.get_credentials(), FreshCreds)
+    assert manager.flows == [1]
+    assert not manager.revoked
+
+
+class PassThroughLimiter:
+    def call(self, api, func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+
+class FakeTransport:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_sheet_manager_reconnects_after_refresh_error(manager):
+    sm = SheetManager.__new__(SheetManager)
+    sm._connect_lock = threading.RLock()
+    sm.rate_limiter = PassThroughLimiter()
+    sm.credentials = manager
+    manager.on_revoked = sm._on_credentials_revoked
+    manager.creds = RevokedCreds()
+    transport = FakeTransport()
+    sm.creds = manager.creds
+    sm.transport = transport
+    sm.client = sm.spreadsheet = sm.sheet = sm.drive = object()
+    sm.is_authenticated = True
+
+    def append():
+        # gspread の AuthorizedSession が送信直前にトークンを更新して失敗した場合
+        raise RefreshError("invalid_grant")
+
+    with pytest.raises(RefreshError):
+        sm._call("sheets", append)
+
+    assert manager.revoked and manager.creds is None
+    assert not sm.is_authenticated
+    assert sm.sheet is None and sm.client is None and sm.drive is None
+    assert transport.closed and sm.transport is None
+
+    authenticated = []
+
+    def authenticate():
+        authenticated.append(manager.get_credentials())
+        sm.is_authenticated = True
+        return True
+
+    sm._authenticate = authenticate
+    assert sm._ensure_authenticated()
+    assert isinstance(authenticated[0], FreshCreds)
+    assert manager.flows == [1]
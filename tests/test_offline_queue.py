@@ -0,0 +1,209 @@
+"""
+offline_queue.py のジャーナルの復旧と、旧形式（offline_queue.json）からの移行を確認する。
+
+    python -m pytest -q tests
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+import offline_queue
+from offline_queue import OfflineQueue
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def queue_files(tmp_path, monkeypatch):
+    legacy = str(tmp_path / "offline_queue.json")
+    journal = str(tmp_path / "offline_queue.journal")
+    monkeypatch.setattr(offline_queue, "QUEUE_FILE", legacy)
+    monkeypatch.setattr(offline_queue, "JOURNAL_FILE", journal)
+    return legacy, journal
+
+
+def texts(queue):
+    return [item["text"] for item in queue.get_all()]
+
+
+def write_legacy(path, items):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(
+            [{"text": t, "timestamp": "2026-01-01 00:00:00", "added_at": 0} for t in items],
+            f,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+# 子プロセスで add / pop を繰り返し、fsync まで終わった操作を1行ずつ stderr で親に知らせる
+CHILD = textwrap.dedent(
+    """
+    import sys
+    sys.path.insert(0, {root!r})
+    import offline_queue
+    offline_queue.QUEUE_FILE = {legacy!r}
+    offline_queue.JOURNAL_FILE = {journal!r}
+    offline_queue.COMPACT_THRESHOLD = 16
+    q = offline_queue.OfflineQueue()
+    i = 0
+    while True:
+        q.add("item-%d" % i + "x" * 2000, "2026-01-01 00:00:00")
+        print("add", i, file=sys.stderr, flush=True)
+        if i % 3 == 2:
+            item = q.pop()
+            print("pop", item["text"].split("x")[0], file=sys.stderr, flush=True)
+        i += 1
+    """
+)
+
+
+@pytest.mark.parametrize("kill_after", [5, 40, 137, 400])
+def test_recovers_after_kill_during_write(queue_files, kill_after):
+    legacy, journal = queue_files
+    script = CHILD.format(root=ROOT, legacy=legacy, journal=journal)
+    env = dict(os.environ, SUPANIKKI_HOME=os.path.dirname(journal))
+    proc = subprocess.Popen(
+        [sys.executable, "-c", script],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        env=env,
+    )
+    added, popped = [], set()
+    try:
+        while len(added) < kill_after:
+            line = proc.stderr.readline()
+            assert line, "child exited early"
+            op, name = line.split()
+            if op == "add":
+                added.append(f"item-{name}")
+            else:
+                popped.add(name)
+        # 次の書き込みの途中で止める
+        os.kill(proc.pid, signal.SIGKILL)
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+        proc.wait()
+        proc.stderr.close()
+
+    queue = OfflineQueue()
+    recovered = [t.split("x")[0] for t in texts(queue)]
+    live = [t for t in added if t not in popped]
+    # 確定した add は残る。ただし書き込み中だった pop で先頭が外れている場合と、
+    # 書き込み中だった add が最後まで書けていた場合がある
+    assert set(live[1:]) <= set(recovered)
+    assert set(recovered) <= set(live) | {f"item-{len(added)}"}
+    assert recovered == sorted(recovered, key=lambda t: int(t.split("-")[1]))
+    assert all(t.endswith("x" * 2000) for t in texts(queue))
+
+    # 復旧後も続けて追記でき、読み直せる
+    queue.add("after-crash")
+    queue._journal.close()
+    assert texts(OfflineQueue())[-1] == "after-crash"
+
+
+def test_discards_torn_trailing_line(queue_files):
+    _, journal = queue_files
+    queue = OfflineQueue()
+    queue.add("first")
+    queue.add("second")
+    queue._journal.close()
+    with open(journal, "ab") as f:
+        f.write(b'{"op": "add", "id": 3, "text": "thi')
+
+    queue = OfflineQueue()
+    assert texts(queue) == ["first", "second"]
+    # 壊れた末尾は切り落とされ、次の追記は行の先頭から始まる
+    queue.add("third")
+    queue._journal.close()
+    assert texts(OfflineQueue()) == ["first", "second", "third"]
+
+
+def test_drain_keeps_journal_bounded(queue_files, monkeypatch):
+    _, journal = queue_files
+    monkeypatch.setattr(offline_queue, "COMPACT_THRESHOLD", 50)
+    written = []
+    write_snapshot = OfflineQueue._write_snapshot
+
+    def counting_snapshot(self):
+        written.append(len(self._queue))
+        write_snapshot(self)
+
+    monkeypatch.setattr(OfflineQueue, "_write_snapshot", counting_snapshot)
+
+    backlog = 5000
+    queue = OfflineQueue()
+    for i in range(backlog):
+        queue.add(f"item-{i}")
+    while not queue.is_empty():
+        live = queue.size()
+        queue.ack(queue.peek_many(100))
+        with open(journal, "rb") as f:
+            records = f.read().count(b"\n")
+        # 生きている add ＋ 詰め直し待ちの add/ack（それぞれ max(閾値, 残り件数) 未満）＋ 今回の1回分
+        assert records <= live + 2 * (max(50, live) + 100)
+
+    # 詰め直しで書き直した件数の合計は backlog の数倍に収まる（閾値ごとに全件書き直すと約 N²/100）
+    assert sum(written) <= backlog
+    queue._journal.close()
+    assert OfflineQueue().is_empty()
+
+
+def test_migrates_legacy_file(queue_files):
+    legacy, journal = queue_files
+    write_legacy(legacy, ["old-1", "old-2"])
+
+    queue = OfflineQueue()
+    assert texts(queue) == ["old-1", "old-2"]
+    assert not os.path.exists(legacy)
+    assert os.path.exists(legacy + ".migrated")
+    queue.add("new")
+    queue.ack(queue.peek_many(1))
+    queue._journal.close()
+
+    assert texts(OfflineQueue()) == ["old-2", "new"]
+
+
+def test_retries_migration_after_failed_snapshot(queue_files, monkeypatch):
+    legacy, journal = queue_files
+    write_legacy(legacy, ["old-1", "old-2"])
+
+    def fail():
+        raise OSError("disk full")
+
+    with monkeypatch.context() as m:
+        m.setattr(OfflineQueue, "_write_snapshot", lambda self: fail())
+        queue = OfflineQueue()
+        # 移行に失敗しても、その後の追記でジャーナルは作られる
+        queue.add("new")
+        queue._journal.close()
+    assert os.path.exists(journal)
+    assert os.path.exists(legacy)
+
+    # 次回起動時はジャーナルがあっても旧ファイルを取り込む（旧形式の分が先）
+    queue = OfflineQueue()
+    assert texts(queue) == ["old-1", "old-2", "new"]
+    queue._journal.close()
+    assert texts(OfflineQueue()) == ["old-1", "old-2", "new"]
+
+
+def test_does_not_migrate_twice_when_rename_fails(queue_files, monkeypatch):
+    legacy, _ = queue_files
+    write_legacy(legacy, ["old-1"])
+
+    with monkeypatch.context() as m:
+        m.setattr(OfflineQueue, "_retire_legacy_file", lambda self: None)
+        queue = OfflineQueue()
+        queue._journal.close()
+    assert os.path.exists(legacy)
+
+    queue = OfflineQueue()
+    assert texts(queue) == ["old-1"]
+    assert not os.path.exists(legacy)
@@ -0,0 +1,165 @@
+import time
+import tkinter.font as tkfont
+from typing import Callable, Optional
+
+# 高さの反映は1フレーム（約60fps）に1回まで
+FRAME_MS = 16
+
+
+def _count_result(res) -> int:
+    """Text.count の戻り値（int / tuple / None）を int にそろえる"""
+    if res is None:
+        return 0
+    if isinstance(res, (tuple, list)):
+        return int(res[0]) if res else 0
+    return int(res)
+
+
+class InputLayout:
+    """
+    入力欄とウィンドウの高さを決める。
+    - 行数は Tk の displaylines（折り返し込み）で数え、本文を Python 側にコピーしない
+    - 論理行数だけで上限に達していれば displaylines は数えない（10k 行の貼り付けでも一定時間）
+    - 行の高さはフォントのメトリクスから求め、フォントごとにキャッシュする
+    - request() を何度呼んでも反映は1フレームに1回まで。行数が変わっていなければ geometry を触らない
+    """
+
+    # フォント指定 → linespace(px)
+    _linespace_cache = {}
+
+    def __init__(
+        self,
+        root,
+        entry,
+        apply_geometry: Callable[[int], None],
+        min_height: int,
+        max_height: int,
+        window_min_height: int,
+        window_max_height: int,
+        chrome_height: int = 40,
+        history_line_px: int = 30,
+        history_padding: int = 20,
+    ):
+        self.root = root
+        self.entry = entry
+        # CTkTextbox は内部に tk.Text を持つので、行数はそちらで数える
+        self.text = getattr(entry, "_textbox", entry)
+        self.apply_geometry = apply_geometry
+        self.min_height = min_height
+        self.max_height = max_height
+        self.window_min_height = window_min_height
+        self.window_max_height = window_max_height
+        self.chrome_height = chrome_height
+        self.history_line_px = history_line_px
+        self.history_padding = history_padding
+
+        self._after_id = None
+        self._last_flush = 0.0
+        self._line_height: Optional[float] = None
+        self._lines = 1
+        self._history_lines = 0
+        self._entry_height = min_height
+        self._window_height: Optional[int] = None
+        self.flushes = 0
+        self.geometry_updates = 0
+
+    def line_height(self) -> float:
+        """1行の高さ（CTk の単位。画面スケーリング分を割り戻す）"""
+        if self._line_height is None:
+            try:
+                spec = self.text.cget("font")
+                key = str(spec)
+                linespace = self._linespace_cache.get(key)
+                if linespace is None:
+                    linespace = tkfont.Font(root=self.text, font=spec).metrics("linespace")
+                    self._linespace_cache[key] = linespace
+                spacing = int(self.text.cget("spacing1") or 0) + int(self.text.cget("spacing3") or 0)
+                scaling = getattr(self.entry, "_get_widget_scaling", lambda: 1.0)() or 1.0
+                self._line_height = (linespace + spacing) / scaling
+            except Exception as e:
+                print(f"Failed to read font metrics: {e}")
+                self._line_height = 30.0
+        return self._line_height
+
+    def max_lines(self) -> int:
+        """入力欄が上限の高さに達する行数"""
+        return int((self.max_height - self.min_height) // self.line_height()) + 1
+
+    def count_lines(self) -> int:
+        text = self.text
+        logical = int(text.index("end-1c").split(".")[0])
+        # 表示行は論理行以上なので、論理行で上限を超えていれば数える必要がない
+        if logical >= self.max_lines():
+            return logical
+        # 幅が決まる前（非表示中など）は折り返しを計算できない
+        if text.winfo_width() <= 1:
+            return logical
+        return _count_result(text.count("1.0", "end-1c", "update", "displaylines")) + 1
+
+    def set_history_lines(self, lines: int):
+        if lines != self._history_lines:
+            self._history_lines = lines
+            self.request()
+
+    def request(self):
+        """高さの再計算を予約する。直前の反映から1フレーム経っていなければ次のフレームにまとめる"""
+        if self._after_id is not None:
+            return
+        wait = FRAME_MS - (time.perf_counter() - self._last_flush) * 1000
+        if wait <= 0:
+            self._after_id = self.root.after_idle(self._flush)
+        else:
+            self._after_id = self.root.after(int(wait) + 1, self._flush)
+
+    def cancel(self):
+        if self._after_id is not None:
+            try:
+                self.root.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+
+    def reset(self):
+        """入力欄を空にしたときの状態（1行・最小の高さ）に戻し、ウィンドウの高さは次のフレームで合わせ直す"""
+        self.cancel()
+        self._lines = 1
+        if self._entry_height != self.min_height:
+            self._entry_height = self.min_height
+            self.entry.configure(height=self.min_height)
+        self._window_height = None
+        self.request()
+
+    def flush(self):
+        """予約を待たずに今すぐ反映する"""
+        self.cancel()
+        self._flush()
+
+    def _flush(self):
+        self._after_id = None
+        self._last_flush = time.perf_counter()
+        self.flushes += 1
+        try:
+            lines = self.count_lines()
+        except Exception:
+            return
+
+        entry_height = self.min_height + (lines - 1) * self.line_height()
+        entry_height = int(max(self.min_height, min(self.max_height, entry_height)))
+        history_height = 0
+        if self._history_lines > 0:
+            history_height = self._history_lines * self.history_line_px + self.history_padding
+        window_height = entry_height + self.chrome_height + history_height
+        window_height = max(self.window_min_height, min(self.window_max_height, window_height))
+
+        self._lines = lines
+        if entry_height != self._entry_height:
+            self._entry_height = entry_height
+            self.entry.configure(height=entry_height)
+        if window_height != self._window_height:
+            self._window_height = window_height
+            self.geometry_updates += 1
+            self.apply_geometry(window_height)
+
+    @property
+    def lines(self) -> int:
+        return self._lines
@@ -1,18 +1,60 @@
 import os
 import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
-import tempfile
-from PIL import ImageGrab
 import customtkinter as ctk
 from tkinterdnd2 import DND_FILES, TkinterDnD
 
+from metrics import metrics
+from text_layout import InputLayout
+
+# 入力補完で表示する候補数と、補完対象にする入力の最大長
+SUGGESTION_LIMIT = 5
+SUGGESTION_MAX_QUERY = 200
+# instant_show で待機させるときの画面外の位置
+PARK_POSITION = (-32000, -32000)
+# 候補の再計算をしないキー（カーソル移動・修飾キーなど）
+_SUGGESTION_IGNORED_KEYS = {
+    "Up", "Down", "Left", "Right", "Return", "Escape", "Tab", "Home", "End",
+    "Shift_L", "Shift_R", "Control_L", "Control_R", "Alt_L", "Alt_R",
+}
+
 
 class InputWindow:
-    def __init__(self, submit_callback, upload_callback=None, history_manager=None, sheet_name_provider=None):
+    def __init__(
+        self,
+        submit_callback,
+        upload_callback=None,
+        history_manager=None,
+        sheet_name_provider=None,
+        upload_concurrency=3,
+        image_upload_callback=None,
+        clipboard_image_options=None,
+        io_executor=None,
+        upload_executor=None,
+        instant_show=False,
+    ):
         self.submit_callback = submit_callback
         self.upload_callback = upload_callback
+        # 貼り付け画像は image_upload_callback(data, name, mimetype, progress_callback=...) でメモリから送る
+        self.image_upload_callback = image_upload_callback
+        self.clipboard_image_options = dict(clipboard_image_options or {})
+        self.upload_concurrency = max(1, int(upload_concurrency))
+        # 送信・アップロードの実行先（submit(fn, *args) で Future を返すもの）。
+        # 未指定なら送信ごとにスレッドを作り、アップロードは専用のスレッドプールで行う。
+        # アップロードは送信と別の枠で実行する（大きなファイルが送信を待たせないように）
+        self._io_executor = io_executor
+        self._upload_executor = upload_executor
+        self._upload_pool = None
+        self._upload_seq = 0
+        self._upload_started = {}
+        self._pending_uploads = 0
         self.history_manager = history_manager
         self.sheet_name_provider = sheet_name_provider
+        # instant_show: 非表示の間もウィンドウを描画済みのまま画面外に置いておき、表示を移動とフォーカスだけにする
+        self.instant_show = bool(instant_show)
+        self._rendered_history = None
 
         ctk.set_appearance_mode("System")
         ctk.set_default_color_theme("blue")
@@ -31,7 +73,11 @@ class InputWindow:
         self._alpha_visible = 0.9
         self.root.attributes("-alpha", self._alpha_visible)
         # Make the background color fully transparent (for rounded corners)
-        self.root.attributes("-transparentcolor", self._transparent_key)
+        try:
+            self.root.attributes("-transparentcolor", self._transparent_key)
+        except Exception:
+            # -transparentcolor は Windows 専用（他の環境では角の外側が背景色のまま表示される）
+            pass
 
         # Dimensions
         self.width = 680
@@ -43,6 +89,7 @@ class InputWindow:
         x = (screen_width // 2) - (self.width // 2)
         y = screen_height // 3
 
+        self._position = (int(x), int(y))
         self.root.geometry(f"{self.width}x{self.height}+{int(x)}+{int(y)}")
 
         # Layout
@@ -145,19 +192,37 @@ class InputWindow:
         # Dynamic resize settings
         self._min_height = 50  # Match new widget height
         self._max_height = 280
-        self._line_height_px = 30  # Adjusted for larger font
-        self._resize_after_id = None
+        # 行数の数え方と geometry 反映の間引きは InputLayout に任せる
+        self._layout = InputLayout(
+            self.root,
+            self.entry,
+            self._apply_window_height,
+            min_height=self._min_height,
+            max_height=self._max_height,
+            window_min_height=self.height,
+            window_max_height=600,
+        )
         try:
             drop_target.bind("<<Modified>>", self.on_text_modified)
         except Exception:
             drop_target.bind("<KeyRelease>", self.on_text_modified)
 
+        # 入力補完（ローカル履歴からの候補を ↑↓ で選ぶ）
+        self._suggestions = []
+        self._suggestion_pos = -1
+        self._suggestion_query = ""
+        self.entry.bind("<KeyRelease>", self.on_key_release)
+        self.entry.bind("<Down>", self.on_suggestion_next)
+        self.entry.bind("<Up>", self.on_suggestion_prev)
+
         # Keep window on top
         self.root.attributes("-topmost", True)
         self.root.protocol("WM_DELETE_WINDOW", self.hide)
         self.root.withdraw()  # Hide initially
 
         self.is_visible = False
+        if self.instant_show:
+            self.root.after(0, self._park)
 
     def on_enter(self, event):
         # Check if Shift is pressed
@@ -175,22 +240,23 @@ class InputWindow:
         self._submit_and_close()
 
     def _submit_and_close(self):
+        if not self.is_visible:
+            # 隠れているウィンドウに届いた Enter では送信しない
+            return
         text = self.entry.get("0.0", "end")
         stripped_text = text.strip()
         if stripped_text:
-            threading.Thread(
-                target=self.submit_callback, args=(stripped_text,), daemon=True
-            ).start()
+            if self._io_executor is not None:
+                self._io_executor.submit(self.submit_callback, stripped_text)
+            else:
+                threading.Thread(
+                    target=self.submit_callback, args=(stripped_text,), daemon=True
+                ).start()
             self.entry.delete("0.0", "end")
         self.hide()
 
     def on_text_modified(self, event=None):
-        if self._resize_after_id:
-            try:
-                self.root.after_cancel(self._resize_after_id)
-            except Exception:
-                pass
-        self._resize_after_id = self.root.after(80, self._adjust_height)
+        self._adjust_height()
 
         drop_target = getattr(self.entry, "_textbox", self.entry)
         try:
@@ -198,92 +264,98 @@ class InputWindow:
         except Exception:
             pass
 
-    def _adjust_height(self):
-        try:
-            content = self.entry.get("0.0", "end-1c")
-        except Exception:
+    def on_key_release(self, event=None):
+        if event is not None and getattr(event, "keysym", "") in _SUGGESTION_IGNORED_KEYS:
             return
+        self._update_suggestions()
 
-        line_count = max(1, content.count("\n") + 1)
-        target_height = self._min_height + (line_count - 1) * self._line_height_px
-        target_height = max(self._min_height, min(self._max_height, target_height))
+    def _update_suggestions(self):
+        if not self.history_manager or not hasattr(self.history_manager, "suggest"):
+            return
 
-        if int(self.entry.cget("height")) != int(target_height):
-            self.entry.configure(height=target_height)
-        
-        # Calculate total window height including history
-        history_height = 0
-        # Use grid_info to check if it's managed, as ismapped is unreliable during rapid updates
-        if self.history_frame.grid_info():
-            # Estimate history height (label height + padding)
-            lines = 0
-            if self.history_label.cget("text"):
-                 lines = self.history_label.cget("text").count("\n") + 1
-            if lines > 0:
-                history_height = lines * 30 + 20 # Increased line height estimate
-        
-        # Add padding for window height (20 + 20 = 40) + history
-        new_window_height = int(target_height) + 40 + history_height
-        new_window_height = max(self.height, min(600, new_window_height)) # increased max height
-        
-        print(f"DEBUG: target_entry_height={target_height}, history_height={history_height}, total={new_window_height}")
+        # 複数行・長文は補完しない（入力のたびに全文をコピーしないよう行数を先に見る）
+        query = ""
+        if self.entry.index("end-1c").split(".")[0] == "1":
+            query = self.entry.get("1.0", "end-1c")
+            if len(query) > SUGGESTION_MAX_QUERY:
+                query = ""
+        query = query.strip()
+        if query == self._suggestion_query:
+            return
 
-        self.root.geometry(
-            f"{self.width}x{new_window_height}+{self.root.winfo_x()}+{self.root.winfo_y()}"
+        self._suggestion_query = query
+        self._suggestion_pos = -1
+        self._suggestions = (
+            self.history_manager.suggest(query, SUGGESTION_LIMIT) if query else []
         )
+        self._render_suggestions()
 
-    def on_drop_files(self, event):
-        # upload_callback が無ければ何もしない
-        if not self.upload_callback:
-            return "break"
+    def _render_suggestions(self):
+        if not self._suggestions:
+            self.update_history_display()
+            return
 
-        # event.data は複数パスが来ることがある（スペースを含む場合は{}で囲われる）
-        paths = self.root.tk.splitlist(event.data)
+        lines = []
+        for i, text in enumerate(self._suggestions):
+            one_line = " ".join(text.split())
+            if len(one_line) > 60:
+                one_line = one_line[:59] + "…"
+            marker = "▶" if i == self._suggestion_pos else "•"
+            lines.append(f"{marker} {one_line}")
+        self.history_label.configure(text="\n".join(lines), text_color=("gray40", "gray80"))
+        self._rendered_history = None
+        self.history_frame.grid()
+        self._layout.set_history_lines(len(lines))
+
+    def _move_suggestion(self, step: int):
+        if not self._suggestions:
+            return None  # 候補が無ければ通常のカーソル移動
+
+        pos = self._suggestion_pos + step
+        if pos >= len(self._suggestions):
+            pos = -1
+        elif pos < -1:
+            pos = len(self._suggestions) - 1
+        self._suggestion_pos = pos
+
+        # 選択中の候補を入力欄へ反映（-1 は入力していた文字列に戻す）
+        text = self._suggestions[pos] if pos >= 0 else self._suggestion_query
+        self.entry.delete("1.0", "end")
+        self.entry.insert("1.0", text)
+        self._render_suggestions()
+        return "break"
 
-        # すぐに「アップロード中」表示を入れてユーザーに進行を見せる
-        placeholder_start = self.entry.index("end-1c")
-        display_names = [os.path.basename(p) for p in paths]
-        placeholder_text = "アップロード中: " + ", ".join(display_names) + "\n"
-        self.entry.insert("end", placeholder_text)
-        self.entry.see("end")
-        self._adjust_height()
-        placeholder_end = self.entry.index("end-1c")
+    def on_suggestion_next(self, event=None):
+        return self._move_suggestion(1)
 
-        # アップロード中は送信を誤って押せないように一時無効化
-        try:
-            self.send_button.configure(state="disabled")
-        except Exception:
-            pass
+    def on_suggestion_prev(self, event=None):
+        return self._move_suggestion(-1)
 
-        def worker():
-            urls = []
-            for path in paths:
-                try:
-                    url = self.upload_callback(path)
-                    urls.append(url)
-                except Exception as e:
-                    urls.append(f"[upload failed] {path} ({e})")
+    def _reset_suggestions(self):
+        self._suggestions = []
+        self._suggestion_pos = -1
+        self._suggestion_query = ""
 
-            def insert_urls():
-                # プレースホルダを削除して結果に置き換え
-                try:
-                    self.entry.delete(placeholder_start, placeholder_end)
-                except Exception:
-                    # 失敗しても末尾に追記する
-                    pass
-                # 複数ファイルは改行で追記
-                block = "\n".join(urls) + "\n"
-                self.entry.insert("end", block)
-                self.entry.see("end")
-                self._adjust_height()
-                try:
-                    self.send_button.configure(state="normal")
-                except Exception:
-                    pass
+    def _adjust_height(self):
+        # 次のフレームでまとめて反映する（連続した入力・貼り付けでも geometry は1フレーム1回まで）
+        self._layout.request()
 
-            self.root.after(0, insert_urls)
+    def _apply_window_height(self, height):
+        if self.instant_show and not self.is_visible:
+            # 待機中は画面外の位置のまま高さだけ合わせる
+            x, y = PARK_POSITION
+        else:
+            x, y = self.root.winfo_x(), self.root.winfo_y()
+        self.root.geometry(f"{self.width}x{height}+{x}+{y}")
+
+    def on_drop_files(self, event):
+        # upload_callback が無ければ何もしない
+        if not self.upload_callback:
+            return "break"
 
-        threading.Thread(target=worker, daemon=True).start()
+        # event.data は複数パスが来ることがある（スペースを含む場合は{}で囲われる）
+        paths = self.root.tk.splitlist(event.data)
+        self._handle_file_upload(paths)
         return "break"
 
     def update_sheet_name(self, name: str):
@@ -296,14 +368,14 @@ class InputWindow:
             pass
 
     def show(self):
-        if not self.is_visible:
+        if not self.is_visible and self.instant_show:
+            self._show_parked()
+        elif not self.is_visible:
+            started = time.perf_counter()
             # Clear previous content to prevent flash
             try:
                 self.entry.delete("0.0", "end")
-                self.entry.configure(height=self._min_height)
-                if self._resize_after_id:
-                    self.root.after_cancel(self._resize_after_id)
-                    self._resize_after_id = None
+                self._layout.reset()
             except Exception:
                 pass
 
@@ -323,6 +395,7 @@ class InputWindow:
                     pass
 
             # Update history
+            self._reset_suggestions()
             self.update_history_display()
             
             # AGGRESSIVE FOCUS LOGIC
@@ -349,6 +422,59 @@ class InputWindow:
             self.root.after(150, self._delayed_focus)
             
             self.is_visible = True
+            metrics.observe("window.show", (time.perf_counter() - started) * 1000)
+            # ホットキー押下（main.toggle_window）から表示までの時間
+            metrics.end("hotkey_to_visible")
+
+    def _show_parked(self):
+        """
+        描画済みで隠してあるウィンドウを、画面内の位置に戻して表示しフォーカスするだけで表示する。
+        待機中は入力欄を無効にしてあるので、入力を受け付けるようにするのはここだけ。
+        """
+        started = time.perf_counter()
+        # 待機中に送信された分があれば履歴だけ描き直す（変わっていなければ何もしない）
+        self.update_history_display(only_if_changed=True)
+        x, y = self._position
+        try:
+            self.root.geometry(f"+{x}+{y}")
+            self.root.attributes("-alpha", self._alpha_visible)
+            self.entry.configure(state="normal")
+            self.root.deiconify()
+            self.root.lift()
+            self.root.focus_force()
+            self.entry.focus_force()
+        except Exception:
+            pass
+        self.is_visible = True
+        metrics.observe("window.show", (time.perf_counter() - started) * 1000)
+        metrics.end("hotkey_to_visible")
+
+    def _park(self):
+        """
+        instant_show 用。次回の表示内容（空の入力欄・シート名・履歴）を透明・画面外で描画し終えてから
+        withdraw しておく（表示時はレイアウトの計算が要らず、マップし直すだけ）。
+        隠している間にキー入力が入らないよう、入力欄は無効にしてフォーカスも手放す。
+        """
+        if self.is_visible:
+            return
+        try:
+            self.root.attributes("-alpha", 0.0)
+            self.root.geometry(f"{self.width}x{self.height}+{PARK_POSITION[0]}+{PARK_POSITION[1]}")
+            self.entry.configure(state="normal")
+            self.entry.delete("0.0", "end")
+            self.entry.configure(state="disabled")
+            self.root.deiconify()
+            self.root.attributes("-topmost", True)
+            self._layout.reset()
+            if self.sheet_name_provider:
+                self.update_sheet_name(self.sheet_name_provider() or "")
+            self._reset_suggestions()
+            self.update_history_display()
+            self.root.update_idletasks()
+        except Exception as e:
+            print(f"Failed to prepare window for instant show: {e}")
+        # withdraw でフォーカスは直前のアプリに戻る
+        self.root.withdraw()
 
     def _delayed_focus(self):
         """Force focus again slightly later to override other apps."""
@@ -361,14 +487,14 @@ class InputWindow:
             pass
 
     def hide(self):
-        if self.is_visible:
+        if self.is_visible and self.instant_show:
+            self.is_visible = False
+            self._park()
+        elif self.is_visible:
             # 次回表示時のフラッシュ防止のため、隠す前に内容と高さをリセット
             try:
                 self.entry.delete("0.0", "end")
-                self.entry.configure(height=self._min_height)
-                if self._resize_after_id:
-                    self.root.after_cancel(self._resize_after_id)
-                    self._resize_after_id = None
+                self._layout.reset()
                 # ウィンドウ高さも元に戻す
                 self.root.geometry(
                     f"{self.width}x{self.height}+{self.root.winfo_x()}+{self.root.winfo_y()}"
@@ -395,85 +521,153 @@ class InputWindow:
 
     def on_paste(self, event):
         try:
+            from PIL import ImageGrab
+
             # Check for image in clipboard
             img = ImageGrab.grabclipboard()
-            if img:
-                # It's an image! Save to temp file and upload
-                # Create a temp file
-                with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmp:
-                    img.save(tmp.name, "PNG")
-                    tmp_path = tmp.name
-                
-                # Mock a drop event-like behavior
-                # Using the existing file upload logic
-                # We can reuse the logic from on_drop_files if we refactor it, 
-                # or just call the worker directly. 
-                # Let's repurpose the logic by calling a helper
-                self._handle_file_upload([tmp_path])
+            if isinstance(img, list):
+                # エクスプローラーでコピーしたファイルはパスの一覧で返る
+                paths = [p for p in img if os.path.isfile(p)]
+                if paths and self.upload_callback:
+                    self._handle_file_upload(paths)
+                    return "break"
+            elif img is not None and self.image_upload_callback:
+                # エンコードは重いので、Tk スレッドでは取得だけしてアップロード用スレッドで行う
+                from clipboard_image import clipboard_file_name
+
+                options = self.clipboard_image_options
+                name = clipboard_file_name(options.get("format", "png"))
+                self._start_upload(
+                    name, "画像アップロード中", lambda progress: self._upload_image(img, name, progress)
+                )
                 return "break" # Prevent default paste
         except Exception as e:
             print(f"Paste error: {e}")
             pass
         return None # Allow default paste for text
 
-    def _handle_file_upload(self, paths):
-        if not self.upload_callback:
+    def _upload_image(self, img, name, progress_callback):
+        from clipboard_image import encode_image
+
+        options = self.clipboard_image_options
+        data, mimetype = encode_image(
+            img,
+            options.get("format", "png"),
+            options.get("quality", 85),
+            options.get("max_dimension", 0),
+        )
+        return self.image_upload_callback(data, name, mimetype, progress_callback=progress_callback)
+
+    def _handle_file_upload(self, paths, label="アップロード中"):
+        """
+        paths を並列にアップロードする（同時数は upload_concurrency まで）。
+        ファイルごとに「アップロード中: 名前」の行を入れ、完了したものから順にその行を URL に置き換える。
+        """
+        if not self.upload_callback or not paths:
             return
 
-        # Insert placeholder
-        placeholder_start = self.entry.index("end-1c")
-        display_names = [os.path.basename(p) for p in paths]
-        placeholder_text = "画像アップロード中... " + "\n"
-        self.entry.insert("end", placeholder_text)
+        for path in paths:
+            self._start_upload(
+                os.path.basename(path),
+                label,
+                lambda progress, path=path: self.upload_callback(path, progress_callback=progress),
+            )
+
+    def _start_upload(self, name, label, job):
+        """プレースホルダ行を入れ、job(progress_callback) をアップロード用スレッドで実行する"""
+        if self._upload_pool is None:
+            self._upload_pool = self._upload_executor or ThreadPoolExecutor(
+                max_workers=self.upload_concurrency, thread_name_prefix="upload"
+            )
+
+        text = getattr(self.entry, "_textbox", self.entry)
+        self._upload_seq += 1
+        # 行の位置は他の行の追加・置換で変わるので、タグで追跡する
+        tag = f"upload_{self._upload_seq}"
+        self._upload_started[tag] = time.perf_counter()
+        text.insert("end", f"{label}: {name}\n", (tag,))
+        self._pending_uploads += 1
+        self._upload_pool.submit(self._upload_worker, tag, name, label, job)
+
         self.entry.see("end")
         self._adjust_height()
-        placeholder_end = self.entry.index("end-1c")
 
+        # アップロード中は送信を誤って押せないように一時無効化
         try:
             self.send_button.configure(state="disabled")
         except Exception:
             pass
 
-        def worker():
-            urls = []
-            for path in paths:
-                try:
-                    url = self.upload_callback(path)
-                    urls.append(url)
-                    # Cleanup temp file if it was generated by us (rudimentary check: starts with temp)
-                    if path.startswith(tempfile.gettempdir()):
-                         try:
-                             os.remove(path)
-                         except:
-                             pass
-                except Exception as e:
-                    urls.append(f"[upload failed] {path} ({e})")
-
-            def insert_urls():
-                try:
-                    self.entry.delete(placeholder_start, placeholder_end)
-                except Exception:
-                    pass
-                block = "\n".join(urls) + "\n"
-                self.entry.insert("end", block)
-                self.entry.see("end")
-                self._adjust_height()
-                try:
-                    self.send_button.configure(state="normal")
-                except Exception:
-                    pass
+    def _upload_worker(self, tag, name, label, job):
+        last_percent = [-1]
+
+        def on_progress(fraction):
+            # 同じ%での再描画を避ける
+            percent = int(fraction * 100)
+            if percent == last_percent[0]:
+                return
+            last_percent[0] = percent
+            line = f"{label}: {name} {percent}%"
+            self.root.after(0, lambda: self._update_upload_line(tag, line))
+
+        try:
+            result = job(on_progress)
+        except Exception as e:
+            result = f"[upload failed] {name} ({e})"
+        self.root.after(0, lambda: self._finish_upload(tag, result))
 
-            self.root.after(0, insert_urls)
+    def _update_upload_line(self, tag, line):
+        text = getattr(self.entry, "_textbox", self.entry)
+        try:
+            ranges = text.tag_ranges(tag)
+            if not ranges:
+                return
+            start = str(ranges[0])
+            text.delete(start, str(ranges[-1]))
+            text.insert(start, line + "\n", (tag,))
+        except Exception as e:
+            print(f"Failed to update upload progress: {e}")
+
+    def _finish_upload(self, tag, result):
+        started = self._upload_started.pop(tag, None)
+        if started is not None:
+            # ドロップ/貼り付けからリンクが入るまでの時間
+            metrics.observe("upload.drop_to_link", (time.perf_counter() - started) * 1000)
+        text = getattr(self.entry, "_textbox", self.entry)
+        try:
+            ranges = text.tag_ranges(tag)
+            if ranges:
+                # プレースホルダ行を結果（URL）に置き換え
+                start = str(ranges[0])
+                text.delete(start, str(ranges[-1]))
+                text.insert(start, result + "\n")
+            else:
+                # プレースホルダが消えていても末尾に追記する
+                text.insert("end", result + "\n")
+            text.tag_delete(tag)
+        except Exception as e:
+            print(f"Failed to insert upload result: {e}")
 
-        threading.Thread(target=worker, daemon=True).start()
+        self.entry.see("end")
+        self._adjust_height()
+        self._pending_uploads = max(0, self._pending_uploads - 1)
+        if self._pending_uploads == 0:
+            try:
+                self.send_button.configure(state="normal")
+            except Exception:
+                pass
 
-    def update_history_display(self):
+    def update_history_display(self, only_if_changed=False):
         if not self.history_manager:
             return
 
         latest = self.history_manager.get_latest(3)
+        if only_if_changed and latest == self._rendered_history:
+            return
+        self._rendered_history = latest
         if not latest:
             self.history_frame.grid_remove()
+            self._layout.set_history_lines(0)
             return
 
         # Simple text representation for now
@@ -483,5 +677,6 @@ class InputWindow:
         # Show the frame
         self.history_frame.grid()
         self.history_frame.configure(border_width=0)
-        
-        self._adjust_height()
+
+        # ラベルを読み直さず、組み立てた文字列から行数を渡す
+        self._layout.set_history_lines(history_text.count("\n") + 1)
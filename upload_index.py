@@ -0,0 +1,85 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import config
+
+INDEX_FILE = os.path.join(config.BASE_DIR, "upload_index.json")
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def hash_file(file_path: str) -> str:
+    """ファイル全体を読み込まずに、ブロック単位で SHA-256 を計算する"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def hash_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class UploadIndex:
+    """
+    アップロード済みファイルの内容ハッシュ → Drive ファイル(id / webViewLink) の対応を保存する。
+    同じ内容のファイルを再度アップロードしようとしたときは、保存済みのリンクを返して重複を防ぐ。
+    """
+
+    def __init__(self, path: str = INDEX_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return {k: v for k, v in data.items() if isinstance(v, dict) and v.get("id")}
+        except Exception as e:
+            print(f"Failed to load upload index: {e}")
+            return {}
+
+    def _save_locked(self):
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._entries, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Failed to save upload index: {e}")
+
+    def get(self, digest: str, folder_id: str = "") -> Optional[dict]:
+        """同じ内容・同じ保存先フォルダでアップロード済みならその情報を返す"""
+        with self._lock:
+            entry = self._entries.get(digest)
+            if not entry or entry.get("folder_id", "") != (folder_id or ""):
+                return None
+            return dict(entry)
+
+    def put(self, digest: str, file_id: str, link: str, name: str, size: int, folder_id: str = ""):
+        with self._lock:
+            self._entries[digest] = {
+                "id": file_id,
+                "link": link,
+                "name": name,
+                "size": int(size),
+                "folder_id": folder_id or "",
+                "uploaded_at": time.time(),
+            }
+            self._save_locked()
+
+    def remove(self, digest: str):
+        with self._lock:
+            if self._entries.pop(digest, None) is not None:
+                self._save_locked()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
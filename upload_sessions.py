@@ -0,0 +1,76 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import config
+
+SESSIONS_FILE = os.path.join(config.BASE_DIR, "upload_sessions.json")
+# Drive の再開可能セッションは約1週間で失効するので、それより少し短い期間で捨てる
+SESSION_MAX_AGE = 6 * 24 * 60 * 60
+
+
+def session_key(file_path: str) -> str:
+    """同じファイル（パス・サイズ・更新時刻が一致）のときだけ再開できるようにするキー"""
+    st = os.stat(file_path)
+    return f"{os.path.abspath(file_path)}|{st.st_size}|{st.st_mtime_ns}"
+
+
+class UploadSessionStore:
+    """
+    再開可能アップロードのセッションURIと確定済みバイト数をローカルに保存する。
+    通信断やアプリ再起動の後に同じファイルをアップロードすると、続きから送信できる。
+    """
+
+    def __init__(self, path: str = SESSIONS_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Failed to load upload sessions: {e}")
+            return {}
+        now = time.time()
+        return {
+            key: s
+            for key, s in data.items()
+            if isinstance(s, dict) and s.get("uri") and now - s.get("updated_at", 0) < SESSION_MAX_AGE
+        }
+
+    def _save_locked(self):
+        try:
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._sessions, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"Failed to save upload sessions: {e}")
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            session = self._sessions.get(key)
+            return dict(session) if session else None
+
+    def put(self, key: str, uri: str, progress: int, parents=None):
+        with self._lock:
+            self._sessions[key] = {
+                "uri": uri,
+                "progress": int(progress),
+                "parents": list(parents or []),
+                "updated_at": time.time(),
+            }
+            self._save_locked()
+
+    def remove(self, key: str):
+        with self._lock:
+            if self._sessions.pop(key, None) is not None:
+                self._save_locked()